@@ -1,5 +1,7 @@
 from __future__ import division, absolute_import, print_function
 
+import hashlib
+
 import numpy as np
 import scipy
 import scipy.stats
@@ -18,6 +20,249 @@ def _root_squared_mean(array):
     return np.sqrt(np.sum(array**2)) / len(array)
 
 
+def _normalize_crossspectrum(unnorm_power, tseg, n, nphots1, nphots2,
+                             meancounts1, meancounts2, norm):
+    """
+    Normalize the real part of the cross spectrum to Leahy, absolute rms^2,
+    fractional rms^2 normalization, or not at all.
+
+    All the arguments after ``unnorm_power`` can also be arrays that
+    broadcast against it, so that the spectra of many segments (one per row
+    of ``unnorm_power``) are normalized at once.
+
+    Parameters
+    ----------
+    unnorm_power: numpy.ndarray
+        The unnormalized cross spectrum.
+
+    tseg: float
+        The length of the Fourier segment, in seconds.
+
+    n: int
+        The number of bins in the Fourier segment.
+
+    nphots1, nphots2: float
+        The total number of photons in the two light curves.
+
+    meancounts1, meancounts2: float
+        The mean counts per bin in the two light curves.
+
+    norm: {'frac', 'abs', 'leahy', 'none'}
+        The normalization.
+
+    Returns
+    -------
+    power: numpy.nd.array
+        The normalized co-spectrum (real part of the cross spectrum). For
+        'none' normalization, imaginary part is returned as well.
+    """
+
+    # The "effective" counts/bin is the geometrical mean of the counts/bin
+    # of the two light curves
+
+    log_nphots1 = np.log(nphots1)
+    log_nphots2 = np.log(nphots2)
+
+    actual_nphots = np.float64(np.sqrt(np.exp(log_nphots1 + log_nphots2)))
+    actual_mean = np.sqrt(meancounts1 * meancounts2)
+
+    assert np.all(actual_mean > 0.0), \
+        "Mean count rate is <= 0. Something went wrong."
+
+    if norm.lower() == 'leahy':
+        c = unnorm_power.real
+        power = c * 2. / actual_nphots
+
+    elif norm.lower() == 'frac':
+        c = unnorm_power.real / np.float(n**2.)
+        power = c * 2. * tseg / (actual_mean**2.0)
+
+    elif norm.lower() == 'abs':
+        c = unnorm_power.real / np.float(n**2.)
+        power = c * (2. * tseg)
+
+    elif norm.lower() == 'none':
+        power = unnorm_power
+
+    else:
+        raise Exception("Normalization not recognized!")
+
+    return power
+
+
+def _rfft_positive(counts, nfreq):
+    """Real FFT along the last axis, keeping the first nfreq positive freqs.
+
+    Like ``scipy.fftpack``, we work in double precision (numpy's FFT does not
+    support longdoubles).
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    return np.fft.rfft(counts, axis=-1)[..., 1:nfreq + 1]
+
+
+def _sum_spectrum_objects(cs_all):
+    """Sum the spectra of a list of single-segment spectrum objects.
+
+    Gives the same output as ``AveragedCrossspectrum._sum_segment_spectra``.
+    """
+    power_sum = np.zeros_like(cs_all[0].power)
+    power_err_sum = np.zeros_like(cs_all[0].power_err)
+    unnorm_power_sum = np.zeros_like(cs_all[0].unnorm_power)
+    for cs in cs_all:
+        power_sum += cs.power
+        power_err_sum += (cs.power_err)**2
+        unnorm_power_sum += cs.unnorm_power
+
+    return {"freq": cs_all[0].freq, "df": cs_all[0].df, "n": cs_all[0].n,
+            "m": len(cs_all), "power": power_sum,
+            "power_err": power_err_sum, "unnorm_power": unnorm_power_sum}
+
+
+def _log_rebin_edges(minfreq, maxfreq, df, first_width, f):
+    """Edges of logarithmically spaced frequency bins.
+
+    The first bin is ``df`` wide, the second ``first_width * (1 + f)``, and
+    each of the following is ``1 + f`` times wider than the previous one,
+    until the edges go past ``maxfreq``.
+    """
+    def edges_until(k):
+        # Closed-form sum of the geometric series of bin widths
+        k = np.arange(1, k + 1)
+        if f == 0:
+            widths = first_width * (k - 1)
+        else:
+            widths = first_width * (1 + f) * \
+                np.expm1((k - 1) * np.log1p(f)) / f
+        return np.concatenate([[minfreq], minfreq + df + widths])
+
+    # Estimate the number of edges, then make sure that the last one is
+    # beyond maxfreq
+    if f == 0:
+        nedges = (maxfreq - minfreq - df) / first_width
+    else:
+        nedges = np.log1p((maxfreq - minfreq - df) * f /
+                          (first_width * (1 + f))) / np.log1p(f)
+    nedges = max(int(nedges), 0) + 2
+
+    edges = edges_until(nedges)
+    while edges[-1] <= maxfreq:
+        nedges *= 2
+        edges = edges_until(nedges)
+
+    return edges[:np.searchsorted(edges, maxfreq, side="right") + 1]
+
+
+class _LogRebinPlan(object):
+    """Mapping of a frequency grid onto logarithmically spaced bins.
+
+    The edges and the bin of each frequency only depend on the frequency
+    grid and on ``f``, so that the same plan can be used to rebin any number
+    of spectra sharing the same frequencies.
+
+    Parameters
+    ----------
+    freq: numpy.ndarray
+        The frequency grid
+
+    df: float
+        The frequency resolution
+
+    f: float
+        The factor steering the width of the new bins, as in
+        ``Crossspectrum.rebin_log``
+    """
+    def __init__(self, freq, df, f):
+        freq = np.asarray(freq, dtype=np.double)
+
+        self.edges = _log_rebin_edges(freq[1] * 0.5, freq[-1], df, freq[1], f)
+        nbins = len(self.edges) - 1
+
+        # Bins are closed on the left. Edges often fall exactly on frequencies
+        # of the grid: a small tolerance makes sure that, whatever the
+        # rounding, these frequencies always go to the upper bin.
+        bin_idx = np.searchsorted(self.edges - 1e-6 * df, freq,
+                                  side="right") - 1
+        self.good = (bin_idx >= 0) & (bin_idx < nbins)
+        self.bin_idx = bin_idx[self.good]
+        self.nsamples = np.bincount(self.bin_idx, minlength=nbins)
+
+        # The centers of the new bins
+        self.binfreq = self.edges[:-1] + np.diff(self.edges) / 2
+
+    def _bin_sum(self, values):
+        values = np.asarray(values, dtype=np.double)[self.good]
+        return np.bincount(self.bin_idx, weights=values,
+                           minlength=len(self.nsamples))
+
+    def mean(self, values):
+        """Average the values in each bin (NaN for empty bins)."""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return self._bin_sum(values) / self.nsamples
+
+    def root_squared_mean(self, values):
+        """Square root of the sum of squares over the number of values."""
+        values = np.asarray(values, dtype=np.double)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.sqrt(self._bin_sum(values ** 2)) / self.nsamples
+
+
+_LOG_REBIN_PLANS = {}
+
+
+def _get_log_rebin_plan(freq, df, f):
+    """Get the rebin plan for a frequency grid, reusing it when possible."""
+    # The plan works on doubles; hashing them also avoids the padding bytes
+    # of long doubles
+    freq = np.ascontiguousarray(freq, dtype=np.double)
+    key = (len(freq), hashlib.sha1(freq.tobytes()).hexdigest(), df, f)
+
+    if key not in _LOG_REBIN_PLANS:
+        # Keep the cache small: spectra usually share very few grids
+        if len(_LOG_REBIN_PLANS) >= 16:
+            _LOG_REBIN_PLANS.clear()
+        _LOG_REBIN_PLANS[key] = _LogRebinPlan(freq, df, f)
+
+    return _LOG_REBIN_PLANS[key]
+
+
+def _lightcurve_pairs(lc1, lc2):
+    """Pair single light curves, or the elements of two iterables of them."""
+    if isinstance(lc1, Lightcurve) and isinstance(lc2, Lightcurve):
+        return [(lc1, lc2)]
+
+    # TODO: should be using izip from iterables if lc1 or lc2 could
+    # be long
+    return zip(lc1, lc2)
+
+
+def _segment_blocks(lc1, lc2, start_inds, end_inds, dt):
+    """Iterate over blocks of equal-length segments of two light curves.
+
+    Yields
+    ------
+    counts1, counts2: 2-d arrays
+        The counts of the segments, one segment per row. If ``lc1`` and
+        ``lc2`` are the same object, they are the same array.
+
+    tseg: array
+        The duration of each segment
+    """
+    n = end_inds[0] - start_inds[0]
+    bins = np.arange(n)
+
+    # Each block of segments is at most ~4 million bins long
+    block_size = max(1, 2 ** 22 // n)
+    for i in range(0, len(start_inds), block_size):
+        starts = start_inds[i:i + block_size]
+        idx = starts[:, np.newaxis] + bins
+
+        counts1 = lc1.counts[idx]
+        counts2 = counts1 if lc1 is lc2 else lc2.counts[idx]
+        tseg = lc1.time[starts + n - 1] - lc1.time[starts] + dt
+
+        yield counts1, counts2, tseg
+
+
 def coherence(lc1, lc2):
     """
     Estimate coherence function of two light curves.
@@ -319,37 +564,10 @@ class Crossspectrum(object):
             'none' normalization, imaginary part is returned as well.
         """
 
-        # The "effective" counts/bin is the geometrical mean of the counts/bin
-        # of the two light curves
-
-        log_nphots1 = np.log(self.nphots1)
-        log_nphots2 = np.log(self.nphots2)
-
-        actual_nphots = np.float64(np.sqrt(np.exp(log_nphots1 + log_nphots2)))
-        actual_mean = np.sqrt(self.meancounts1 * self.meancounts2)
-
-        assert actual_mean > 0.0, \
-            "Mean count rate is <= 0. Something went wrong."
-
-        if self.norm.lower() == 'leahy':
-            c = unnorm_power.real
-            power = c * 2. / actual_nphots
-
-        elif self.norm.lower() == 'frac':
-            c = unnorm_power.real / np.float(self.n**2.)
-            power = c * 2. * tseg / (actual_mean**2.0)
-
-        elif self.norm.lower() == 'abs':
-            c = unnorm_power.real / np.float(self.n**2.)
-            power = c * (2. * tseg)
-
-        elif self.norm.lower() == 'none':
-            power = unnorm_power
-
-        else:
-            raise Exception("Normalization not recognized!")
-
-        return power
+        return _normalize_crossspectrum(unnorm_power, tseg, self.n,
+                                        self.nphots1, self.nphots2,
+                                        self.meancounts1, self.meancounts2,
+                                        self.norm)
 
     def rebin_log(self, f=0.01):
         """
@@ -381,39 +599,19 @@ class Crossspectrum(object):
             frequency bin
         """
 
-        minfreq = self.freq[1] * 0.5  # frequency to start from
-        maxfreq = self.freq[-1]  # maximum frequency to end
-        binfreq = [minfreq, minfreq + self.df]  # first
-        df = self.freq[1]  # the frequency resolution of the first bin
-
-        # until we reach the maximum frequency, increase the width of each
-        # frequency bin by f
-        while binfreq[-1] <= maxfreq:
-            binfreq.append(binfreq[-1] + df*(1.0+f))
-            df = binfreq[-1] - binfreq[-2]
+        # The bins only depend on the frequency grid: the mapping of the
+        # frequencies onto them is computed once, and reused for all spectra
+        # with the same frequencies
+        plan = _get_log_rebin_plan(self.freq, self.df, f)
 
         # compute the mean of the powers that fall into each new frequency bin.
-        # we cast to np.double due to scipy's bad handling of longdoubles
-        binpower, bin_edges, binno = scipy.stats.binned_statistic(
-            self.freq.astype(np.double), self.power.astype(np.double),
-            statistic="mean", bins=binfreq)
-
-        binpower_err, bin_edges, binno = scipy.stats.binned_statistic(
-            self.freq.astype(np.double), self.power_err.astype(np.double),
-            statistic=_root_squared_mean, bins=binfreq)
-
-        # compute the number of powers in each frequency bin
-        nsamples = np.array([len(binno[np.where(binno == i)[0]])
-                             for i in range(np.max(binno))])
-
-        # the frequency resolution
-        df = np.diff(binfreq)
-
-        # shift the lower bin edges to the middle of the bin and drop the
-        # last right bin edge
-        binfreq = binfreq[:-1] + df/2
+        # we cast to np.double due to the bad handling of longdoubles
+        binpower = plan.mean(self.power.astype(np.double))
+        binpower_err = plan.root_squared_mean(self.power_err.astype(np.double))
 
-        return binfreq, binpower, binpower_err, nsamples
+        # Copies, so that the shared plan cannot be altered by the caller
+        return plan.binfreq.copy(), binpower, binpower_err, \
+            plan.nsamples.copy()
 
     def coherence(self):
         """
@@ -459,7 +657,7 @@ class Crossspectrum(object):
 class AveragedCrossspectrum(Crossspectrum):
 
     def __init__(self, lc1=None, lc2=None, segment_size=None,
-                 norm='none', gti=None):
+                 norm='none', gti=None, save_all=False):
         """
         Make an averaged cross spectrum from a light curve by segmenting two
         light curves, Fourier-transforming each segment and then averaging the
@@ -494,6 +692,15 @@ class AveragedCrossspectrum(Crossspectrum):
             This choice overrides the GTIs in the single light curves. Use with
             care!
 
+        save_all: bool, default False
+            If True, make a full ``Crossspectrum`` object for each segment and
+            save them all in the ``cs_all`` attribute. Otherwise, all segments
+            are stacked and Fourier-transformed at once, and only running sums
+            over the segments are kept. This is much faster for many segments,
+            and the memory usage does not grow with the number of segments.
+            The single spectra are still available on request, through
+            ``segment_spectra`` and ``segment_powers``.
+
         Attributes
         ----------
         freq: numpy.ndarray
@@ -502,6 +709,17 @@ class AveragedCrossspectrum(Crossspectrum):
         power: numpy.ndarray
             The array of cross spectra
 
+        unnorm_power: numpy.ndarray
+            The averaged unnormalized cross spectrum
+
+        unnorm_power1, unnorm_power2: numpy.ndarray
+            The averaged unnormalized power spectra of the two light curves,
+            used to compute the coherence
+
+        cs_all: list of ``Crossspectrum`` objects
+            The cross spectra of the single segments. Only available if
+            ``save_all`` is True. Otherwise, use ``segment_spectra``.
+
         power_err: numpy.ndarray
             The uncertainties of `power`.
             An approximation for each bin given by "power_err= power/Sqrt(m)".
@@ -537,12 +755,14 @@ class AveragedCrossspectrum(Crossspectrum):
                 raise ValueError("segment_size must be finite")
 
         self.segment_size = segment_size
+        self.save_all = save_all
 
         Crossspectrum.__init__(self, lc1, lc2, norm, gti=gti)
 
         return
 
-    def _make_segment_spectrum(self, lc1, lc2, segment_size):
+    def _segment_intervals(self, lc1, lc2, segment_size):
+        """Check the two light curves and find the segments to average."""
 
         # TODO: need to update this for making cross spectra.
         assert isinstance(lc1, Lightcurve)
@@ -564,106 +784,348 @@ class AveragedCrossspectrum(Crossspectrum):
 
         check_gtis(self.gti)
 
-        cs_all = []
-        nphots1_all = []
-        nphots2_all = []
+        return bin_intervals_from_gtis(self.gti, segment_size, lc1.time,
+                                       dt=lc1.dt)
+
+    def _make_segment_spectrum(self, lc1, lc2, segment_size):
+
+        cs_all = list(self._segment_spectrum_objects(lc1, lc2, segment_size))
+        nphots1_all = [cs.nphots1 for cs in cs_all]
+        nphots2_all = [cs.nphots2 for cs in cs_all]
+
+        return cs_all, nphots1_all, nphots2_all
 
+    def _segment_spectrum_objects(self, lc1, lc2, segment_size):
+        """Iterate over the ``Crossspectrum`` objects of single segments."""
         start_inds, end_inds = \
-            bin_intervals_from_gtis(self.gti, segment_size, lc1.time,
-                                    dt=lc1.dt)
+            self._segment_intervals(lc1, lc2, segment_size)
 
         for start_ind, end_ind in zip(start_inds, end_inds):
-            time_1 = lc1.time[start_ind:end_ind]
-            counts_1 = lc1.counts[start_ind:end_ind]
-            counts_1_err = lc1.counts_err[start_ind:end_ind]
-            time_2 = lc2.time[start_ind:end_ind]
-            counts_2 = lc2.counts[start_ind:end_ind]
-            counts_2_err = lc2.counts_err[start_ind:end_ind]
-            lc1_seg = Lightcurve(time_1, counts_1, err=counts_1_err,
-                                 err_dist=lc1.err_dist,
-                                 gti=[[time_1[0] - lc1.dt/2,
-                                       time_1[-1] + lc1.dt / 2]],
-                                 dt=lc1.dt)
-            lc2_seg = Lightcurve(time_2, counts_2, err=counts_2_err,
-                                 err_dist=lc2.err_dist,
-                                 gti=[[time_2[0] - lc2.dt/2,
-                                       time_2[-1] + lc2.dt / 2]],
-                                 dt=lc2.dt)
-            cs_seg = Crossspectrum(lc1_seg, lc2_seg, norm=self.norm)
-            cs_all.append(cs_seg)
-            nphots1_all.append(np.sum(lc1_seg.counts))
-            nphots2_all.append(np.sum(lc2_seg.counts))
-        return cs_all, nphots1_all, nphots2_all
+            lc1_seg = lc1._slice(start_ind, end_ind)
+            lc2_seg = lc2._slice(start_ind, end_ind)
+            yield Crossspectrum(lc1_seg, lc2_seg, norm=self.norm)
 
-    def _make_crossspectrum(self, lc1, lc2):
+    def _make_segment_spectrum_batch(self, lc1, lc2, segment_size):
+        """Sum the cross spectra of all segments, without making objects.
 
-        # chop light curves into segments
-        if isinstance(lc1, Lightcurve) and \
-                isinstance(lc2, Lightcurve):
+        See ``_sum_segment_spectra`` for the format of the output.
+        """
+        start_inds, end_inds = \
+            self._segment_intervals(lc1, lc2, segment_size)
 
-            if self.type == "crossspectrum":
-                self.cs_all, nphots1_all, nphots2_all = \
-                    self._make_segment_spectrum(lc1, lc2, self.segment_size)
+        return self._sum_segment_spectra(lc1, lc2, start_inds, end_inds,
+                                         lc1.dt)
 
-            elif self.type == "powerspectrum":
-                self.cs_all, nphots1_all = \
-                    self._make_segment_spectrum(lc1, self.segment_size)
+    def _sum_segment_spectra(self, lc1, lc2, start_inds, end_inds, dt):
+        """Fourier-transform many light curve segments at once.
 
-            else:
-                raise ValueError("Type of spectrum not recognized!")
+        The segments are stacked in a 2-D array (one segment per row) and
+        Fourier-transformed with a single real-input FFT along the last axis.
+        Every segment is normalized exactly as a single ``Crossspectrum``
+        would be, and the results are summed over the segments.
+        To limit the memory usage, segments are processed in blocks.
+
+        Parameters
+        ----------
+        lc1, lc2: lightcurve.Lightcurve objects
+            The two light curves. For power spectra, they are the same object.
+
+        start_inds, end_inds: array of ints
+            Start and end bins of the segments, all with the same length.
+
+        dt: float
+            The time resolution of the light curves.
+
+        Returns
+        -------
+        sums: dict
+            ``freq``, ``df`` and ``n`` of the segment spectra, the number of
+            segments ``m``, and the sums over the segments of ``power``,
+            ``power_err`` squared and ``unnorm_power``.
+
+        nphots1_all, nphots2_all: numpy.ndarray
+            The number of photons in each segment of the two light curves
+        """
+        if lc1.err_dist.lower() != lc2.err_dist.lower():
+            simon("Your lightcurves have different statistics."
+                  "The errors in the Crossspectrum will be incorrect.")
+        elif lc1.err_dist.lower() != "poisson":
+            simon("Looks like your lightcurve statistic is not poisson."
+                  "The errors in the Powerspectrum will be incorrect.")
+
+        if self.type == "crossspectrum":
+            simon("Errorbars on cross spectra are not thoroughly tested. "
+                  "Please report any inconsistencies.")
+
+        sums = self._empty_segment_sums(end_inds[0] - start_inds[0], dt)
+
+        for counts1, counts2, tseg in _segment_blocks(lc1, lc2, start_inds,
+                                                      end_inds, dt):
+            self._add_segment_spectra(sums, counts1, counts2, tseg)
 
+        return sums, np.hstack(sums.pop("nphots1")), \
+            np.hstack(sums.pop("nphots2"))
+
+    def _empty_segment_sums(self, n, dt):
+        """Make empty accumulators for the spectra of segments of n bins."""
+        freqs = scipy.fftpack.fftfreq(n, dt)
+
+        # Same frequencies as _fourier_cross: positive ones, without Nyquist
+        return {"freq": freqs[freqs > 0], "df": None, "n": n, "m": 0,
+                "power": 0, "power_err": 0, "unnorm_power": 0,
+                "unnorm_power1": 0, "unnorm_power2": 0,
+                "nphots1": [], "nphots2": []}
+
+    def _add_segment_spectra(self, sums, counts1, counts2, tseg):
+        """Fourier-transform a block of segments and add them to the sums.
+
+        Parameters
+        ----------
+        sums: dict
+            The accumulators, as created by ``_empty_segment_sums``
+
+        counts1, counts2: 2-d arrays
+            The counts of the segments, one segment per row. For power
+            spectra, they are the same object.
+
+        tseg: array
+            The duration of each segment
+        """
+        spectra = self._segment_block_spectra(counts1, counts2, tseg,
+                                              len(sums["freq"]))
+
+        if sums["df"] is None:
+            sums["df"] = 1.0 / tseg[0]
+        sums["m"] += len(tseg)
+        sums["power_err"] = \
+            sums["power_err"] + np.sum(spectra["power_err"]**2, axis=0)
+        for key in ["power", "unnorm_power", "unnorm_power1",
+                    "unnorm_power2"]:
+            sums[key] = sums[key] + np.sum(spectra[key], axis=0)
+        sums["nphots1"].append(spectra["nphots1"])
+        sums["nphots2"].append(spectra["nphots2"])
+
+    def _segment_block_spectra(self, counts1, counts2, tseg, nfreq):
+        """Compute the spectra of a block of segments, one per row.
+
+        Returns a dictionary with the unnormalized and normalized spectra
+        (``unnorm_power`` and ``power``), the errors on the latter
+        (``power_err``), the unnormalized power spectra of the two light
+        curves (``unnorm_power1`` and ``unnorm_power2``) and the number of
+        photons in each segment of the two light curves (``nphots1`` and
+        ``nphots2``).
+        """
+        n = counts1.shape[1]
+
+        fourier_1 = _rfft_positive(counts1, nfreq)
+        nphots1 = np.sum(counts1, axis=1).astype(np.float64)
+        meancounts1 = np.mean(counts1, axis=1)
+        if counts1 is counts2:
+            fourier_2, nphots2, meancounts2 = fourier_1, nphots1, meancounts1
         else:
-            self.cs_all, nphots1_all, nphots2_all = [], [], []
-            # TODO: should be using izip from iterables if lc1 or lc2 could
-            # be long
-            for lc1_seg, lc2_seg in zip(lc1, lc2):
+            fourier_2 = _rfft_positive(counts2, nfreq)
+            nphots2 = np.sum(counts2, axis=1).astype(np.float64)
+            meancounts2 = np.mean(counts2, axis=1)
 
-                if self.type == "crossspectrum":
-                    cs_sep, nphots1_sep, nphots2_sep = \
-                        self._make_segment_spectrum(lc1_seg, lc2_seg,
-                                                    self.segment_size)
-                    nphots2_all.append(nphots2_sep)
-                elif self.type == "powerspectrum":
-                    cs_sep, nphots1_sep = \
-                        self._make_segment_spectrum(lc1_seg, self.segment_size)
+        unnorm_power = fourier_1 * np.conj(fourier_2)
 
-                else:
-                    raise ValueError("Type of spectrum not recognized!")
+        # The power spectra of the single light curves, used by coherence()
+        unnorm_power1 = np.abs(fourier_1) ** 2
+        if fourier_1 is fourier_2:
+            unnorm_power2 = unnorm_power1
+        else:
+            unnorm_power2 = np.abs(fourier_2) ** 2
+        tseg = np.asarray(tseg)
 
-                self.cs_all.append(cs_sep)
-                nphots1_all.append(nphots1_sep)
+        # One value per segment, broadcasting against the spectra
+        norm_args = [tseg[:, np.newaxis], n,
+                     nphots1[:, np.newaxis], nphots2[:, np.newaxis],
+                     meancounts1[:, np.newaxis],
+                     meancounts2[:, np.newaxis], self.norm]
 
-            self.cs_all = np.hstack(self.cs_all)
-            nphots1_all = np.hstack(nphots1_all)
+        power = _normalize_crossspectrum(unnorm_power, *norm_args)
+
+        if self.type == "powerspectrum":
+            power_err = power
+        else:
+            # The same wild approximation as in Crossspectrum
+            unnorm_power_err = np.sqrt(2)  # Leahy-like
+            unnorm_power_err /= (2 / np.sqrt(nphots1 * nphots2))
+            unnorm_power_err = unnorm_power_err[:, np.newaxis] + \
+                np.zeros_like(power)
+            power_err = _normalize_crossspectrum(unnorm_power_err,
+                                                 *norm_args)
+
+        return {"unnorm_power": unnorm_power, "power": power,
+                "power_err": power_err, "unnorm_power1": unnorm_power1,
+                "unnorm_power2": unnorm_power2, "nphots1": nphots1,
+                "nphots2": nphots2}
+
+    def _make_crossspectrum(self, lc1, lc2):
+
+        if self.type not in ["crossspectrum", "powerspectrum"]:
+            raise ValueError("Type of spectrum not recognized!")
+
+        # chop light curves into segments
+        lc_pairs = _lightcurve_pairs(lc1, lc2)
+
+        if self.save_all:
+            self.cs_all = []
+            make_segment_spectrum = self._make_segment_spectrum
+        else:
+            make_segment_spectrum = self._make_segment_spectrum_batch
+
+        all_sums, nphots1_all, nphots2_all = [], [], []
+        for lc1_seg, lc2_seg in lc_pairs:
 
             if self.type == "crossspectrum":
-                nphots2_all = np.hstack(nphots2_all)
+                seg_out, nphots1_seg, nphots2_seg = \
+                    make_segment_spectrum(lc1_seg, lc2_seg, self.segment_size)
+                nphots2_all.append(nphots2_seg)
+            else:
+                seg_out, nphots1_seg = \
+                    make_segment_spectrum(lc1_seg, self.segment_size)
+
+            nphots1_all.append(nphots1_seg)
 
-        m = len(self.cs_all)
-        nphots1 = np.mean(nphots1_all)
+            if self.save_all:
+                self.cs_all.extend(seg_out)
+            else:
+                all_sums.append(seg_out)
+
+        if self.save_all:
+            all_sums = [_sum_spectrum_objects(self.cs_all)]
+
+        self._set_averaged_spectrum(all_sums, nphots1_all, nphots2_all)
+
+    def _set_averaged_spectrum(self, all_sums, nphots1_all, nphots2_all):
+        """Set the averaged spectrum from sums over groups of segments.
+
+        Parameters
+        ----------
+        all_sums: list of dicts
+            The sums over the segment spectra, e.g. one per light curve
 
-        power_avg = np.zeros_like(self.cs_all[0].power)
-        power_err_avg = np.zeros_like(self.cs_all[0].power_err)
-        for cs in self.cs_all:
-            power_avg += cs.power
-            power_err_avg += (cs.power_err)**2
+        nphots1_all, nphots2_all: lists of arrays
+            The number of photons in each segment
+        """
+        m = np.sum([sums["m"] for sums in all_sums])
+        power_avg = np.sum([sums["power"] for sums in all_sums], axis=0)
+        power_err_avg = \
+            np.sum([sums["power_err"] for sums in all_sums], axis=0)
+        unnorm_power_avg = \
+            np.sum([sums["unnorm_power"] for sums in all_sums], axis=0)
 
         power_avg /= np.float(m)
         power_err_avg = np.sqrt(power_err_avg) / m
+        unnorm_power_avg /= np.float(m)
 
-        self.freq = self.cs_all[0].freq
+        self.freq = all_sums[0]["freq"]
         self.power = power_avg
+        self.unnorm_power = unnorm_power_avg
         self.m = m
         self.power_err = power_err_avg
-        self.df = self.cs_all[0].df
-        self.n = self.cs_all[0].n
-        self.nphots1 = nphots1
+        self.df = all_sums[0]["df"]
+        self.n = all_sums[0]["n"]
+        self.nphots1 = np.mean(np.hstack(nphots1_all))
 
         if self.type == "crossspectrum":
-            self.nphots1 = nphots1
-            nphots2 = np.mean(nphots2_all)
+            self.nphots2 = np.mean(np.hstack(nphots2_all))
+
+            # Spectrum objects of single segments only have cross spectra,
+            # so the power spectra are left to be computed by coherence()
+            if np.all(["unnorm_power1" in sums for sums in all_sums]):
+                self.unnorm_power1 = np.sum(
+                    [sums["unnorm_power1"] for sums in all_sums], axis=0) / m
+                self.unnorm_power2 = np.sum(
+                    [sums["unnorm_power2"] for sums in all_sums], axis=0) / m
+
+    def _check_segments_available(self):
+        """Check that the single segments can be recomputed."""
+        if getattr(self, "lc1", None) is None:
+            raise ValueError("The light curves used to make this spectrum "
+                             "are not available")
+
+    def segment_spectra(self):
+        """
+        Iterate over the spectra of the single segments.
+
+        Unless they were saved with ``save_all``, the spectra are recomputed
+        from the light curves one at a time, so that they never need to be
+        all in memory at the same time.
+
+        Yields
+        ------
+        spec: ``Crossspectrum`` object (``Powerspectrum`` for averaged power
+            spectra)
+            The spectrum of a single segment
+        """
+        if self.save_all:
+            for spec in self.cs_all:
+                yield spec
+            return
 
-            self.nphots2 = nphots2
+        self._check_segments_available()
+
+        for lc1, lc2 in _lightcurve_pairs(self.lc1, self.lc2):
+            if self.type == "crossspectrum":
+                spectra = self._segment_spectrum_objects(lc1, lc2,
+                                                         self.segment_size)
+            else:
+                spectra = self._segment_spectrum_objects(lc1,
+                                                         self.segment_size)
+            for spec in spectra:
+                yield spec
+
+    def segment_powers(self, filename=None):
+        """
+        Compute the normalized spectra of all single segments as a 2-d array.
+
+        The segments are Fourier-transformed in blocks, as when making the
+        averaged spectrum.
+
+        Parameters
+        ----------
+        filename: str, default None
+            If given, the array is a ``numpy.memmap`` backed by a ``.npy``
+            file with this name, so that the spectra of very many segments
+            do not need to fit in memory. It can be reopened later with
+            ``numpy.load(filename, mmap_mode='r')``.
+
+        Returns
+        -------
+        powers: 2-d array of shape (m, len(freq))
+            The normalized spectrum of each segment, one per row
+        """
+        self._check_segments_available()
+
+        # Same type as the averaged spectrum (complex or real, depending on
+        # the normalization)
+        dtype = self.power.dtype
+        shape = (self.m, len(self.freq))
+        if filename is None:
+            powers = np.zeros(shape, dtype=dtype)
+        else:
+            powers = np.lib.format.open_memmap(filename, mode="w+",
+                                               dtype=dtype, shape=shape)
+
+        first = 0
+        for lc1, lc2 in _lightcurve_pairs(self.lc1, self.lc2):
+            if self.type == "crossspectrum":
+                start_inds, end_inds = \
+                    self._segment_intervals(lc1, lc2, self.segment_size)
+            else:
+                start_inds, end_inds = \
+                    self._segment_intervals(lc1, self.segment_size)
+
+            for counts1, counts2, tseg in _segment_blocks(
+                    lc1, lc2, start_inds, end_inds, lc1.dt):
+                power = self._segment_block_spectra(counts1, counts2, tseg,
+                                                    shape[1])["power"]
+                powers[first:first + len(tseg)] = power
+                first += len(tseg)
+
+        return powers
 
     def coherence(self):
         """
@@ -691,31 +1153,20 @@ class AveragedCrossspectrum(Crossspectrum):
                   "expected statistical distributions.")
 
         # Calculate average coherence
-        unnorm_power_avg = np.zeros_like(self.cs_all[0].unnorm_power)
-        for cs in self.cs_all:
-            unnorm_power_avg += cs.unnorm_power
-
-        unnorm_power_avg /= self.m
-        num = np.absolute(unnorm_power_avg)**2
-
-        # this computes the averaged power spectrum, but using the
-        # cross spectrum code to avoid circular imports
-        aps1 = AveragedCrossspectrum(self.lc1, self.lc1,
-                                     segment_size=self.segment_size)
-        aps2 = AveragedCrossspectrum(self.lc2, self.lc2,
-                                     segment_size=self.segment_size)
-
-        unnorm_powers_avg_1 = np.zeros_like(aps1.cs_all[0].unnorm_power.real)
-        for ps in aps1.cs_all:
-            unnorm_powers_avg_1 += ps.unnorm_power.real
-        unnorm_powers_avg_1 /= aps1.m
-
-        unnorm_powers_avg_2 = np.zeros_like(aps2.cs_all[0].unnorm_power.real)
-        for ps in aps2.cs_all:
-            unnorm_powers_avg_2 += ps.unnorm_power.real
-        unnorm_powers_avg_2 /= aps2.m
-
-        coh = num / (unnorm_powers_avg_1 * unnorm_powers_avg_2)
+        num = np.absolute(self.unnorm_power)**2
+
+        # The averaged power spectra are normally accumulated together with
+        # the cross spectrum. If they are not (e.g. with save_all), compute
+        # them once, using the cross spectrum code to avoid circular imports
+        if getattr(self, "unnorm_power1", None) is None:
+            aps1 = AveragedCrossspectrum(self.lc1, self.lc1,
+                                         segment_size=self.segment_size)
+            aps2 = AveragedCrossspectrum(self.lc2, self.lc2,
+                                         segment_size=self.segment_size)
+            self.unnorm_power1 = aps1.unnorm_power.real
+            self.unnorm_power2 = aps2.unnorm_power.real
+
+        coh = num / (self.unnorm_power1 * self.unnorm_power2)
 
         # Calculate uncertainty
         uncertainty = (2**0.5 * coh * (1 - coh)) / (np.abs(coh) * self.m**0.5)
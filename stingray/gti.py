@@ -3,6 +3,8 @@ from __future__ import (absolute_import, unicode_literals, division,
 
 import numpy as np
 import logging
+import hashlib
+import os
 
 from astropy.io import fits
 from .io import assign_value_if_none
@@ -62,6 +64,10 @@ def check_gtis(gti):
     ValueError
         If GTIs have overlapping or displaced values
     """
+    if isinstance(gti, GTI):
+        # Already checked when created
+        return
+
     gti = np.asarray(gti)
     if len(gti) != gti.shape[0] or len(gti.shape) != 2 or \
                     len(gti) != gti.shape[0]:
@@ -71,7 +77,7 @@ def check_gtis(gti):
     gti_start = gti[:, 0]
     gti_end = gti[:, 1]
 
-    logging.debug('-- GTI: ' + repr(gti))
+    logging.debug('-- GTI: %r', gti)
     # Check that GTIs are well-behaved
     if not np.all(gti_end >= gti_start):
         raise ValueError('This GTI end times must be larger than '
@@ -89,7 +95,8 @@ def create_gti_mask(time, gtis, safe_interval=0, min_length=0,
                     return_new_gtis=False, dt=None, epsilon=0.001):
     """Create GTI mask.
 
-    Assumes that no overlaps are present between GTIs
+    Assumes that no overlaps are present between GTIs. If the times are
+    sorted, the mask is created in ``O(N_time + N_gti log N_time)`` time.
 
     Parameters
     ----------
@@ -109,54 +116,107 @@ def create_gti_mask(time, gtis, safe_interval=0, min_length=0,
     min_length : float
     return_new_gtis : bool
     dt : float
+        Half of the bin width. Default: half of the median difference
+        between consecutive times
     epsilon : float
         fraction of dt that is tolerated at the borders of a GTI
     """
     import collections
 
     check_gtis(gtis)
+    gtis = np.asarray(gtis)
+    time = np.asarray(time)
 
-    dt = assign_value_if_none(dt,
-                              np.zeros_like(time) +
-                              np.median(np.diff(time)) / 2)
+    dt = assign_value_if_none(dt, np.median(np.diff(time)) / 2)
 
     mask = np.zeros(len(time), dtype=bool)
 
     if not isinstance(safe_interval, collections.Iterable):
         safe_interval = [safe_interval, safe_interval]
 
+    limmin = gtis[:, 0] + safe_interval[0]
+    limmax = gtis[:, 1] - safe_interval[1]
     newgtis = np.zeros_like(gtis)
+    newgtis[:, 0] = limmin
+    newgtis[:, 1] = limmax
     # Whose GTIs, including safe intervals, are longer than min_length
-    newgtimask = np.zeros(len(newgtis), dtype=np.bool)
-
-    for ig, gti in enumerate(gtis):
-        limmin, limmax = gti
-        limmin += safe_interval[0]
-        limmax -= safe_interval[1]
-        if limmax - limmin >= min_length:
-            newgtis[ig][:] = [limmin, limmax]
-            cond1 = time - dt + epsilon*dt >= limmin
-            cond2 = time + dt - epsilon*dt <= limmax
-            good = np.logical_and(cond1, cond2)
-            mask[good] = True
-            newgtimask[ig] = True
+    newgtimask = limmax - limmin >= min_length
+    limmin = limmin[newgtimask]
+    limmax = limmax[newgtimask]
+
+    # Bins are good if they are fully inside a GTI
+    bin_start = time - dt + epsilon*dt
+    bin_stop = time + dt - epsilon*dt
+
+    if np.all(np.diff(bin_start) >= 0) and np.all(np.diff(bin_stop) >= 0):
+        # The bins are sorted: each GTI corresponds to a range of indices,
+        # found with a binary search
+        first = np.searchsorted(bin_start, limmin, 'left')
+        last = np.searchsorted(bin_stop, limmax, 'right')
+        nonempty = first < last
+        # Mark the beginning and end of each range, then fill them in
+        marks = np.bincount(first[nonempty], minlength=len(time) + 1) - \
+            np.bincount(last[nonempty], minlength=len(time) + 1)
+        mask = np.cumsum(marks[:-1]) > 0
+    else:
+        for lmin, lmax in zip(limmin, limmax):
+            mask[(bin_start >= lmin) & (bin_stop <= lmax)] = True
 
     res = mask
     if return_new_gtis:
         res = [res, newgtis[newgtimask]]
     return res
 
+
+def _combine_conditions(condition, combine="and"):
+    """Combine one or more boolean conditions in a single mask.
+
+    Only one output mask is created: all conditions are combined into it in
+    place.
+    """
+    if isinstance(condition, dict):
+        named_conditions = list(condition.items())
+    elif isinstance(condition, (list, tuple)) and len(condition) > 0 and \
+            np.ndim(condition[0]) > 0:
+        named_conditions = [(str(i), c) for i, c in enumerate(condition)]
+    else:
+        return np.asarray(condition, dtype=bool)
+
+    if combine == "and":
+        operation = np.logical_and
+    elif combine == "or":
+        operation = np.logical_or
+    else:
+        raise ValueError("combine must be 'and' or 'or'")
+
+    mask = None
+    for name, cond in named_conditions:
+        cond = np.asarray(cond)
+        if mask is None:
+            mask = cond.astype(bool)
+        elif cond.shape != mask.shape:
+            raise StingrayError("Condition '{}' has a different "
+                                "length".format(name))
+        else:
+            operation(mask, cond, out=mask)
+    return mask
+
+
 def create_gti_from_condition(time, condition,
-                              safe_interval=0, dt=None):
+                              safe_interval=0, dt=None, min_length=0,
+                              combine="and"):
     """Create a GTI list from a time array and a boolean mask ("condition").
 
     Parameters
     ----------
     time : array-like
         Array containing times
-    condition : array-like
+    condition : array-like, or list or dict of array-likes
         An array of bools, of the same length of time.
         A possible condition can be, e.g., the result of lc > 0.
+        Multiple conditions can be given as a list or a dictionary of named
+        conditions (e.g. ``{"rate": lc.counts < 100, "flare": ...}``). They
+        are combined according to ``combine``.
 
     Returns
     -------
@@ -168,11 +228,19 @@ def create_gti_from_condition(time, condition,
     safe_interval : float or [float, float]
         A safe interval to exclude at both ends (if single float) or the start
         and the end (if pair of values) of GTIs.
-    dt : float
-        The width (in sec) of each bin of the time array. Can be irregular.
+    dt : float or array of floats
+        Half of the width (in sec) of each bin of the time array. Can be
+        irregular. Default: half of the first time step
+    min_length : float
+        Minimum length of the GTIs, after removing the safe intervals
+    combine : {"and", "or"}
+        How to combine multiple conditions: the times are good if all
+        (``"and"``) or any (``"or"``) of the conditions are True
     """
     import collections
 
+    condition = _combine_conditions(condition, combine)
+
     if len(time) != len(condition):
         raise StingrayError('The length of the condition and '
                             'time arrays must be the same.')
@@ -182,21 +250,60 @@ def create_gti_from_condition(time, condition,
     if not isinstance(safe_interval, collections.Iterable):
         safe_interval = [safe_interval, safe_interval]
 
-    dt = assign_value_if_none(dt,
-                               np.zeros_like(time) + (time[1] - time[0]) / 2)
+    time = np.asarray(time)
+    dt = assign_value_if_none(dt, (time[1] - time[0]) / 2)
 
-    gtis = []
-    for idx in idxs:
-        logging.debug(idx)
-        startidx = idx[0]
-        stopidx = idx[1] - 1
+    startidx = idxs[:, 0]
+    stopidx = idxs[:, 1] - 1
+    if np.size(dt) > 1:
+        dt = np.asarray(dt)
+        dt_start, dt_stop = dt[startidx], dt[stopidx]
+    else:
+        dt_start = dt_stop = dt
 
-        t0 = time[startidx] - dt[startidx] + safe_interval[0]
-        t1 = time[stopidx] + dt[stopidx] - safe_interval[1]
-        if t1 - t0 < 0:
-            continue
-        gtis.append([t0, t1])
-    return np.array(gtis)
+    t0 = time[startidx] - dt_start + safe_interval[0]
+    t1 = time[stopidx] + dt_stop - safe_interval[1]
+    good = t1 - t0 >= np.maximum(min_length, 0)
+
+    return np.array([t0[good], t1[good]]).T
+
+
+def _cross_gti_arrays(gti_list):
+    """Intersect any number of (checked) GTI arrays in a single pass.
+
+    All the GTI boundaries are sorted together, splitting the time axis in
+    elementary segments. A segment is in the result if it is covered by a GTI
+    of every list, which is found with a binary search in each list.
+    Consecutive good segments are merged, as long as they belong to the same
+    GTIs in all lists (so that the result is the same as intersecting all
+    the GTIs one by one). Intersections of zero length are discarded.
+    """
+    dtype = np.result_type(*gti_list)
+    boundaries = np.unique(np.concatenate([g.ravel() for g in gti_list]))
+    if len(boundaries) < 2:
+        return np.zeros((0, 2), dtype=dtype)
+
+    seg_start = boundaries[:-1]
+    seg_stop = boundaries[1:]
+
+    good = np.ones(len(seg_start), dtype=bool)
+    new_gti = np.zeros(len(seg_start), dtype=bool)
+    for gti in gti_list:
+        # Last GTI starting before each segment
+        idx = np.searchsorted(gti[:, 0], seg_start, 'right') - 1
+        good &= (idx >= 0) & (gti[np.maximum(idx, 0), 1] >= seg_stop)
+        new_gti[1:] |= idx[1:] != idx[:-1]
+
+    previous_good = np.concatenate(([False], good[:-1]))
+    next_good = np.concatenate((good[1:], [False]))
+    next_new = np.concatenate((new_gti[1:], [True]))
+    first_segments = good & (~previous_good | new_gti)
+    last_segments = good & (~next_good | next_new)
+
+    final_gti = np.zeros((np.count_nonzero(first_segments), 2), dtype=dtype)
+    final_gti[:, 0] = seg_start[first_segments]
+    final_gti[:, 1] = seg_stop[last_segments]
+    return final_gti
 
 
 def cross_two_gtis(gti0, gti1):
@@ -216,79 +323,29 @@ def cross_two_gtis(gti0, gti1):
     --------
     cross_gtis : From multiple GTI lists, extract common intervals *EXACTLY*
 
+    Examples
+    --------
+    >>> gti1 = np.array([[1, 2], [4, 5], [7, 10]])
+    >>> gti2 = np.array([[1.5, 4.5], [6, 8], [9, 11]])
+    >>> np.all(cross_two_gtis(gti1, gti2) == [[1.5, 2], [4, 4.5], [7, 8],
+    ...                                       [9, 10]])
+    True
     """
-    gti0 = np.asarray(gti0)
-    gti1 = np.asarray(gti1)
     # Check GTIs
     check_gtis(gti0)
     check_gtis(gti1)
+    gti0 = np.asarray(gti0)
+    gti1 = np.asarray(gti1)
 
-    gti0_start = gti0[:, 0]
-    gti0_end = gti0[:, 1]
-    gti1_start = gti1[:, 0]
-    gti1_end = gti1[:, 1]
-
-    # Create a list that references to the two start and end series
-    gti_start = [gti0_start, gti1_start]
-    gti_end = [gti0_end, gti1_end]
-
-    # Concatenate the series, while keeping track of the correct origin of
-    # each start and end time
-    gti0_tag = np.array([0 for g in gti0_start], dtype=bool)
-    gti1_tag = np.array([1 for g in gti1_start], dtype=bool)
-    conc_start = np.concatenate((gti0_start, gti1_start))
-    conc_end = np.concatenate((gti0_end, gti1_end))
-    conc_tag = np.concatenate((gti0_tag, gti1_tag))
-
-    # Put in time order
-    order = np.argsort(conc_end)
-    conc_start = conc_start[order]
-    conc_end = conc_end[order]
-    conc_tag = conc_tag[order]
-
-    last_end = conc_start[0] - 1
-    final_gti = []
-    for ie, e in enumerate(conc_end):
-        # Is this ending in series 0 or 1?
-        this_series = conc_tag[ie]
-        other_series = not this_series
-
-        # Check that this closes intervals in both series.
-        # 1. Check that there is an opening in both series 0 and 1 lower than e
-        try:
-            st_pos = \
-                np.argmax(gti_start[this_series][gti_start[this_series] < e])
-            so_pos = \
-                np.argmax(gti_start[other_series][gti_start[other_series] < e])
-            st = gti_start[this_series][st_pos]
-            so = gti_start[other_series][so_pos]
-
-            s = max([st, so])
-        except:  # pragma: no cover
-            continue
-
-        # If this start is inside the last interval (It can happen for equal
-        # GTI start times between the two series), then skip!
-        if s <= last_end:
-            continue
-        # 2. Check that there is no closing before e in the "other series",
-        # from intervals starting either after s, or starting and ending
-        # between the last closed interval and this one
-        cond1 = (gti_end[other_series] > s) * (gti_end[other_series] < e)
-        cond2 = gti_end[other_series][so_pos] < s
-        condition = np.any(np.logical_or(cond1, cond2))
-        # Well, if none of the conditions at point 2 apply, then you can
-        # create the new gti!
-        if not condition:
-            final_gti.append([s, e])
-            last_end = e
-
-    return np.array(final_gti)
+    return _cross_gti_arrays([gti0, gti1])
 
 
 def cross_gtis(gti_list):
     """From multiple GTI lists, extract the common intervals *EXACTLY*.
 
+    All the lists are intersected at once, in ``O(n log n)`` time for ``n``
+    GTIs in total.
+
     Parameters
     ----------
     gti_list : array-like
@@ -305,53 +362,51 @@ def cross_gtis(gti_list):
     --------
     cross_two_gtis : Extract the common intervals from two GTI lists *EXACTLY*
     """
-    gti_list = np.asarray(gti_list)
     for g in gti_list:
         check_gtis(g)
+    gti_list = [np.asarray(g) for g in gti_list]
 
     ninst = len(gti_list)
     if ninst == 1:
         return gti_list[0]
 
-    gti0 = gti_list[0]
-
-    for gti in gti_list[1:]:
-        gti0 = cross_two_gtis(gti0, gti)
-
-    return gti0
+    return _cross_gti_arrays(gti_list)
 
 
 def get_btis(gtis, start_time=None, stop_time=None):
     """From GTIs, obtain bad time intervals.
 
     GTIs have to be well-behaved, in the sense that they have to pass
-    `check_gtis`.
+    `check_gtis`. The BTIs of several GTI lists can be obtained with
+    ``get_btis(join_gtis(gti0, gti1, ...))``.
     """
     # Check GTIs
     if len(gtis) == 0:
-        if not start_time or not stop_time:
+        if start_time is None or stop_time is None:
             raise ValueError('Empty GTI and no valid start_time '
                              'and stop_time. BAD!')
 
         return np.asarray([[start_time, stop_time]])
     check_gtis(gtis)
+    gtis = np.asarray(gtis)
 
     start_time = assign_value_if_none(start_time, gtis[0][0])
     stop_time = assign_value_if_none(stop_time, gtis[-1][1])
 
-    if gtis[0][0] - start_time <= 0:
-        btis = []
-    else:
-        btis = [[gtis[0][0] - start_time]]
-    # Transform GTI list in
-    flat_gtis = gtis.flatten()
-    new_flat_btis = zip(flat_gtis[1:-2:2], flat_gtis[2:-1:2])
-    btis.extend(new_flat_btis)
-
+    # The bad intervals are between the end of a GTI and the start of the
+    # next one...
+    bti_start = [gtis[:-1, 1]]
+    bti_stop = [gtis[1:, 0]]
+    # ...and at the borders, if start_time and stop_time are outside the GTIs
+    if gtis[0][0] - start_time > 0:
+        bti_start.insert(0, [start_time])
+        bti_stop.insert(0, [gtis[0][0]])
     if stop_time - gtis[-1][1] > 0:
-        btis.extend([[gtis[0][0] - stop_time]])
+        bti_start.append([gtis[-1][1]])
+        bti_stop.append([stop_time])
 
-    return np.asarray(btis)
+    return np.array([np.concatenate(bti_start),
+                     np.concatenate(bti_stop)]).T
 
 
 def gti_len(gti):
@@ -394,8 +449,23 @@ def check_separate(gti0, gti1):
     else:
         return False
 
-def append_gtis(gti0, gti1):
-    """Union of two non-overlapping GTIs.
+def _nonempty_gti_list(gti_list):
+    """Check the GTIs in a list and convert them to arrays, removing empty
+    ones."""
+    new_list = []
+    for gti in gti_list:
+        if len(gti) == 0:
+            continue
+        check_gtis(gti)
+        new_list.append(np.asarray(gti))
+    return new_list
+
+
+def append_gtis(gti0, gti1, *other_gtis):
+    """Union of non-overlapping GTIs.
+
+    Any number of GTI lists can be appended at once. The result is sorted
+    in time, whatever the order of the input GTIs.
 
     Parameters
     ----------
@@ -405,45 +475,45 @@ def append_gtis(gti0, gti1):
     gti1: 2-d float array
         [[gti0_0, gti0_1], [gti1_0, gti1_1], ...]
 
+    other_gtis: 2-d float arrays
+        Other GTIs to append, in the same format
+
     Returns
     -------
     gti: 2-d float array
         The newly created GTI
     """
-
-    gti0 = np.asarray(gti0)
-    gti1 = np.asarray(gti1)
-
     # Check if independently GTIs are well behaved.
-    check_gtis(gti0)
-    check_gtis(gti1)
+    gti_list = _nonempty_gti_list([gti0, gti1] + list(other_gtis))
+    if len(gti_list) == 0:
+        return np.zeros((0, 2))
 
-    # Check if GTIs are mutually exclusive.
-    if not check_separate(gti0, gti1):
-        raise ValueError('In order to append, GTIs must be mutually'
-            'exclusive.')
+    gti_list.sort(key=lambda gti: gti[0, 0])
 
-    return np.concatenate([gti0, gti1])
+    # Check if GTIs are mutually exclusive.
+    for gti_before, gti_after in zip(gti_list[:-1], gti_list[1:]):
+        if gti_before[-1, 1] > gti_after[0, 0]:
+            raise ValueError('In order to append, GTIs must be mutually'
+                             'exclusive.')
 
+    return np.concatenate(gti_list)
 
-def join_gtis(gti0, gti1):
-    """Union of two GTIs.
 
-    If GTIs are mutually exclusive, it calls `append_gtis`. Otherwise we put the
-    extremes of partially overlapping GTIs on an ideal line and look at the
-    number of opened and closed intervals. When the number of closed and opened
-    intervals is the same, the full GTI is complete and we close it.
+def join_gtis(gti0, gti1, *other_gtis):
+    """Union of GTIs.
 
-    In practice, we assign to each opening time of a GTI the value -1, and
-    the value 1 to each closing time; when the cumulative sum is zero, the
-    GTI has ended. The timestamp after each closed GTI is the start of a new
-    one.
+    Any number of GTI lists can be joined at once. All the intervals are
+    sorted by start time; going through them in order, an interval starts a
+    new GTI if it starts after the end of all the previous ones (the
+    cumulative maximum of their stop times, equivalent to counting the open
+    intervals). Otherwise it is merged into the current GTI.
 
-    (cumsum)   -1   -2         -1   0   -1 -2           -1  -2  -1        0
     GTI A      |-----:----------|   :    |--:------------|   |---:--------|
     FINAL GTI  |-----:--------------|    |--:--------------------:--------|
     GTI B            |--------------|       |--------------------|
 
+    Intervals that just touch each other are merged.
+
     Parameters
     ----------
     gti0: 2-d float array
@@ -452,53 +522,132 @@ def join_gtis(gti0, gti1):
     gti1: 2-d float array
         [[gti0_0, gti0_1], [gti1_0, gti1_1], ...]
 
+    other_gtis: 2-d float arrays
+        Other GTIs to join, in the same format
+
     Returns
     -------
     gti: 2-d float array
         The newly created GTI
     """
+    # Check if independently GTIs are well behaved.
+    gti_list = _nonempty_gti_list([gti0, gti1] + list(other_gtis))
+    if len(gti_list) == 0:
+        return np.zeros((0, 2))
 
-    gti0 = np.asarray(gti0)
-    gti1 = np.asarray(gti1)
+    return _merge_intervals(np.concatenate(gti_list))
 
-    # Check if independently GTIs are well behaved.
-    check_gtis(gti0)
-    check_gtis(gti1)
 
-    if check_separate(gti0, gti1):
-        return append_gtis(gti0, gti1)
+def _merge_intervals(gtis):
+    """Merge overlapping and touching intervals.
 
-    g0 = gti0.flatten()
-    # Opening GTI: type = 1; Closing: type = -1
-    g0_type = np.asarray(list(zip(-np.ones(int(len(g0) / 2)),
-                                  np.ones(int(len(g0) / 2)))))
-    g1 = gti1.flatten()
-    g1_type = np.asarray(list(zip(-np.ones(int(len(g1) / 2)),
-                                  np.ones(int(len(g1) / 2)))))
+    The intervals are sorted by start time; going through them in order, an
+    interval starts a new GTI if it starts after the end of all the previous
+    ones (the cumulative maximum of their stop times). Otherwise it is
+    merged into the current GTI.
 
-    g_all = np.append(g0, g1)
-    g_type_all = np.append(g0_type, g1_type)
-    order = np.argsort(g_all)
-    g_all = g_all[order]
-    g_type_all = g_type_all[order]
+    Parameters
+    ----------
+    gtis: 2-d float array
+        [[gti0_0, gti0_1], [gti1_0, gti1_1], ...], in any order
 
-    sums = np.cumsum(g_type_all)
+    Returns
+    -------
+    gti: 2-d float array
+        The merged, sorted intervals
+    """
+    gtis = np.asarray(gtis)
+    if len(gtis) == 0:
+        return np.zeros((0, 2))
+
+    order = np.lexsort((gtis[:, 1], gtis[:, 0]))
+    start = gtis[order, 0]
+    max_stop = np.maximum.accumulate(gtis[order, 1])
+
+    new_gti = np.concatenate(([True], start[1:] > max_stop[:-1]))
+    last = np.concatenate((np.flatnonzero(new_gti)[1:], [len(start)])) - 1
+
+    return np.array([start[new_gti], max_stop[last]]).T
+
+
+def _arange_in_intervals(first, nsteps, step):
+    """Concatenate ``first[i] + step * np.arange(nsteps[i])`` for all ``i``.
+    """
+    nsteps = np.asarray(nsteps, dtype=np.int64)
+    # Position of each element inside its own interval
+    index = np.arange(np.sum(nsteps)) - \
+        np.repeat(np.cumsum(nsteps) - nsteps, nsteps)
+    return np.repeat(first, nsteps) + index * step
+
+
+def _searchsorted_shifted(time, shift, values, side='left'):
+    """Same as ``np.searchsorted(time + shift, values, side)``.
+
+    The shifted array is never created: the search is done on ``time``, and
+    the indices are then corrected for the rounding of ``time + shift``.
+    """
+    values = np.asarray(values)
+    n = len(time)
+    idx = np.searchsorted(time, values - shift, side)
+
+    def before(t, v):
+        return t < v if side == 'left' else t <= v
 
-    # Where the cumulative sum is zero, we close the GTI
-    closing_bins = sums == 0
-    # The next element in the sequence is the start of the new GTI. In the case
-    # of the last element, the next is the first. Numpy.roll gives this for
-    # free.
-    starting_bins = np.roll(closing_bins, 1)
+    while True:
+        move = idx < n
+        move[move] = before(time[idx[move]] + shift, values[move])
+        if not np.any(move):
+            break
+        idx[move] += 1
+    while True:
+        move = idx > 0
+        move[move] = ~before(time[idx[move] - 1] + shift, values[move])
+        if not np.any(move):
+            break
+        idx[move] -= 1
 
-    starting_times = g_all[starting_bins]
-    closing_times = g_all[closing_bins]
+    return idx
 
-    final_gti = []
-    for start, stop in zip(starting_times, closing_times):
-        final_gti.append([start, stop])
 
-    return np.sort(final_gti, axis=0)
+def _border_bins(gtis, time, dt, epsilon, tolerance=0):
+    """Border bins of all GTIs, see ``gti_border_bins``.
+
+    All GTIs are treated at once, with binary searches on the (sorted) time
+    array, without creating any array as long as ``time``.
+
+    Returns
+    -------
+    startbin, stopbin : arrays of ints
+        The first bin of each GTI, and the one after the last
+    good : array of bools
+        True for GTIs containing at least one full bin (within ``tolerance``)
+    """
+    time = np.asarray(time)
+    gti_start = gtis[:, 0]
+    gti_stop = gtis[:, 1]
+    nbins = len(time)
+
+    first = _searchsorted_shifted(time, -dt / 2, gti_start - tolerance)
+    first_in = np.minimum(first, nbins - 1)
+    good = (first < nbins) & (time[first_in] + dt / 2 <= gti_stop + tolerance)
+
+    # The bin whose lower edge is closest to the start of the GTI...
+    closest = _searchsorted_shifted(time, -dt / 2, gti_start)
+    closest_in = np.minimum(closest, nbins - 1)
+    previous = np.maximum(closest - 1, 0)
+    closest_previous = np.abs(time[previous] - dt / 2 - gti_start) <= \
+        np.abs(time[closest_in] - dt / 2 - gti_start)
+    startbin = np.where(closest_previous, previous, closest_in)
+    stopbin = _searchsorted_shifted(time, dt / 2, gti_stop, 'right') + 1
+    stopbin = np.minimum(stopbin, nbins)
+
+    # ...unless it starts before the GTI.
+    startbin[time[startbin] < gti_start + dt/2 - epsilon*dt] += 1
+    # Would be g[1] - dt/2, but stopbin is the end of an interval
+    # so one has to add one bin
+    stopbin[time[stopbin - 1] > gti_stop - dt/2 + epsilon*dt] -= 1
+
+    return startbin.astype(np.long), stopbin.astype(np.long), good
 
 
 def time_intervals_from_gtis(gtis, chunk_length):
@@ -523,17 +672,22 @@ def time_intervals_from_gtis(gtis, chunk_length):
         List of end times to use in the spectral calculations.
 
     """
-    spectrum_start_times = np.array([], dtype=np.longdouble)
-    for g in gtis:
-        if g[1] - g[0] < chunk_length:
-            continue
-
-        newtimes = np.arange(g[0], g[1] - chunk_length,
-                             np.longdouble(chunk_length),
-                             dtype=np.longdouble)
-        spectrum_start_times = \
-            np.append(spectrum_start_times,
-                      newtimes)
+    gtis = np.asarray(gtis)
+    chunk_length = np.longdouble(chunk_length)
+    gti_start = gtis[:, 0]
+    gti_stop = gtis[:, 1]
+
+    # Same number of intervals as np.arange(g[0], g[1] - chunk_length,
+    # chunk_length) for each GTI
+    nchunks = np.ceil(((gti_stop - chunk_length) - gti_start) / chunk_length)
+    nchunks[gti_stop - gti_start < chunk_length] = 0
+    nchunks = np.maximum(nchunks, 0).astype(np.int64)
+
+    # As in np.arange, the step is calculated from the first two elements
+    first = gti_start.astype(np.longdouble)
+    step = (first + chunk_length) - first
+    spectrum_start_times = \
+        _arange_in_intervals(first, nchunks, np.repeat(step, nchunks))
 
     assert len(spectrum_start_times) > 0, \
         ("No GTIs are equal to or longer than chunk_length.")
@@ -595,37 +749,25 @@ def bin_intervals_from_gtis(gtis, chunk_length, time, dt=None, epsilon=0.001):
     if dt is None:
         dt = np.median(np.diff(time))
     nbin = np.long(chunk_length / dt)
+    if nbin < 1:
+        raise ValueError("chunk_length must be longer than the bin time")
 
     if time[-1] < np.min(gtis) or time[0] > np.max(gtis):
         raise ValueError("Invalid time interval for the given GTIs")
 
-    spectrum_start_bins = np.array([], dtype=np.long)
-    for g in gtis:
-        if g[1] - g[0] + epsilon * dt < chunk_length:
-            continue
-        good_low = time - dt / 2 >= g[0] - epsilon * dt
-        good_up = time + dt / 2 <= g[1] + epsilon * dt
-        good = good_low & good_up
-        t_good = time[good]
-        if len(t_good) == 0:
-            continue
-        startbin = np.argmin(np.abs(time - dt / 2 - g[0]))
-        stopbin = np.searchsorted(time + dt / 2, g[1], 'right') + 1
-        if stopbin > len(time):
-            stopbin = len(time)
-
-        if time[startbin] < g[0] + dt/2 - epsilon*dt:
-            startbin += 1
-        # Would be g[1] - dt/2, but stopbin is the end of an interval
-        # so one has to add one bin
-        if time[stopbin - 1] > g[1] - dt/2 + epsilon*dt:
-            stopbin -= 1
-
-        newbins = np.arange(startbin, stopbin - nbin + 1, nbin,
-                            dtype=np.long)
-        spectrum_start_bins = \
-            np.append(spectrum_start_bins,
-                      newbins)
+    if isinstance(gtis, GTI):
+        startbin, stopbin, good = \
+            gtis._border_bins(time, dt, epsilon, tolerance=epsilon * dt)
+    else:
+        gtis = np.asarray(gtis)
+        startbin, stopbin, good = \
+            _border_bins(gtis, time, dt, epsilon, tolerance=epsilon * dt)
+    good = good & (gtis[:, 1] - gtis[:, 0] + epsilon * dt >= chunk_length)
+
+    nchunks = np.maximum((stopbin - startbin) // nbin, 0)
+    nchunks[~good] = 0
+    spectrum_start_bins = _arange_in_intervals(startbin, nchunks, nbin)
+
     assert len(spectrum_start_bins) > 0, \
         ("No GTIs are equal to or longer than chunk_length.")
     return spectrum_start_bins, spectrum_start_bins + nbin
@@ -671,30 +813,477 @@ def gti_border_bins(gtis, time, dt=None, epsilon=0.001):
     if dt is None:
         dt = np.median(np.diff(time))
 
-    spectrum_start_bins = np.array([], dtype=np.long)
-    spectrum_stop_bins = np.array([], dtype=np.long)
-    for g in gtis:
-        good = (time - dt / 2 >= g[0])&(time + dt / 2 <= g[1])
-        t_good = time[good]
-        if len(t_good) == 0:
-            continue
-        startbin = np.argmin(np.abs(time - dt / 2 - g[0]))
-        stopbin = np.searchsorted(time + dt / 2, g[1], 'right') + 1
-        if stopbin > len(time):
-            stopbin = len(time)
-
-        if time[startbin] < g[0] + dt/2 - epsilon*dt:
-            startbin += 1
-        # Would be g[1] - dt/2, but stopbin is the end of an interval
-        # so one has to add one bin
-        if time[stopbin - 1] > g[1] - dt/2 + epsilon*dt:
-            stopbin -= 1
-        spectrum_start_bins = \
-            np.append(spectrum_start_bins,
-                      [startbin])
-        spectrum_stop_bins = \
-            np.append(spectrum_stop_bins,
-                      [stopbin])
+    if isinstance(gtis, GTI):
+        return gtis.border_bins(time, dt=dt, epsilon=epsilon)
+
+    startbin, stopbin, good = _border_bins(np.asarray(gtis), time, dt,
+                                           epsilon)
+
+    spectrum_start_bins = startbin[good]
+    spectrum_stop_bins = stopbin[good]
     assert len(spectrum_start_bins) > 0, \
         ("No GTIs are equal to or longer than chunk_length.")
     return spectrum_start_bins, spectrum_stop_bins
+
+
+class GTI(np.ndarray):
+    """
+    Good Time Intervals, validated once and read-only.
+
+    A ``GTI`` object is an ``(n, 2)`` array of sorted, non-overlapping
+    intervals ``[[gti0_0, gti0_1], [gti1_0, gti1_1], ...]``, and can be used
+    wherever GTIs are accepted as arrays. Being immutable, it is only checked
+    when created (see `check_gtis`), and the quantities derived from it
+    (exposure, bad time intervals, border bins in a time array) are cached.
+    The results of calculations with it (e.g. ``gti + 10``) and its slices
+    are plain arrays.
+
+    Parameters
+    ----------
+    gti : [[gti0_0, gti0_1], [gti1_0, gti1_1], ...]
+        The Good Time Intervals
+
+    Examples
+    --------
+    >>> gti = GTI([[0, 2], [4, 6]])
+    >>> gti.exposure
+    4
+    >>> np.all(gti.contains([1, 3, 6]) == [True, False, True])
+    True
+    >>> np.all(gti.intersection([[1, 5]]) == [[1, 2], [4, 5]])
+    True
+    >>> np.all(gti.union([[2, 3]]) == [[0, 3], [4, 6]])
+    True
+    >>> np.all(gti.difference([[1, 5]]) == [[0, 1], [5, 6]])
+    True
+    """
+    def __new__(cls, gti):
+        if isinstance(gti, GTI):
+            return gti
+        gti = np.array(gti)
+        if gti.size == 0:
+            gti = gti.reshape(0, 2)
+        check_gtis(gti)
+        return cls._from_checked(gti)
+
+    @classmethod
+    def _from_checked(cls, gti):
+        """Make a GTI object from an array that is known to be valid."""
+        obj = np.asarray(gti).reshape(-1, 2).view(cls)
+        obj.flags.writeable = False
+        return obj
+
+    def __array_finalize__(self, obj):
+        self._cache = {}
+
+    def __array_wrap__(self, out_arr, context=None):
+        # The results of calculations are not GTIs anymore
+        out_arr = out_arr.view(np.ndarray)
+        if out_arr.ndim == 0:
+            return out_arr[()]
+        return out_arr
+
+    def __getitem__(self, item):
+        return self.view(np.ndarray)[item]
+
+    def __setstate__(self, state):
+        super(GTI, self).__setstate__(state)
+        self.flags.writeable = False
+
+    def copy(self, order='C'):
+        """A read-only copy of the GTIs, with no cached quantities."""
+        return GTI._from_checked(self.view(np.ndarray).copy(order))
+
+    def __copy__(self):
+        return self.copy()
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    def sort(self, axis=-1, kind=None, order=None):
+        """Do nothing: valid GTIs are already sorted along both axes."""
+        pass
+
+    @property
+    def T(self):
+        return self.view(np.ndarray).T
+
+    def _cached(self, name, function):
+        if name not in self._cache:
+            self._cache[name] = function()
+        return self._cache[name]
+
+    @property
+    def start(self):
+        """The start times of the intervals."""
+        return self[:, 0]
+
+    @property
+    def stop(self):
+        """The stop times of the intervals."""
+        return self[:, 1]
+
+    @property
+    def exposure(self):
+        """The total length of the intervals."""
+        return self._cached("exposure", lambda: gti_len(self))
+
+    @property
+    def btis(self):
+        """The bad time intervals between the GTIs, as a GTI object."""
+        return self._cached("btis", lambda: GTI(get_btis(self)))
+
+    def contains(self, time):
+        """
+        Check if times are inside the GTIs, with a binary search.
+
+        Parameters
+        ----------
+        time : float or array of floats
+
+        Returns
+        -------
+        inside : bool or array of bools
+            True for the times inside (or at the border of) a GTI
+        """
+        return self.covers(time, time)
+
+    def covers(self, start, stop):
+        """
+        Check if intervals are fully contained in a single GTI.
+
+        Parameters
+        ----------
+        start, stop : float or array of floats
+            The start and stop times of the intervals
+
+        Returns
+        -------
+        inside : bool or array of bools
+        """
+        start = np.asarray(start)
+        if len(self) == 0:
+            inside = np.zeros(start.shape, dtype=bool)
+        else:
+            idx = np.searchsorted(self.start, start, 'right') - 1
+            inside = (idx >= 0) & (self.stop[np.maximum(idx, 0)] >= stop)
+        return inside if inside.ndim > 0 else inside[()]
+
+    def intersection(self, *others):
+        """
+        The intervals common to these GTIs and all the other ones.
+
+        See `cross_gtis`.
+
+        Parameters
+        ----------
+        others : GTI objects or arrays
+
+        Returns
+        -------
+        gti : GTI object
+        """
+        gti_list = [self] + [GTI(other) for other in others]
+        return GTI._from_checked(
+            _cross_gti_arrays([g.view(np.ndarray) for g in gti_list]))
+
+    def union(self, *others):
+        """
+        The intervals contained in these GTIs or in any of the other ones.
+
+        Overlapping and touching intervals are merged.
+
+        Parameters
+        ----------
+        others : GTI objects or arrays
+
+        Returns
+        -------
+        gti : GTI object
+        """
+        gti = np.concatenate([self.view(np.ndarray)] +
+                             [GTI(other).view(np.ndarray)
+                              for other in others])
+        if len(gti) == 0:
+            return GTI._from_checked(gti)
+
+        return GTI._from_checked(_merge_intervals(gti))
+
+    def difference(self, other):
+        """
+        The intervals contained in these GTIs, but not in the other ones.
+
+        Parameters
+        ----------
+        other : GTI object or array
+
+        Returns
+        -------
+        gti : GTI object
+        """
+        other = GTI(other)
+        if len(other) == 0 or len(self) == 0:
+            return self
+        # Everything outside the other GTIs
+        complement = np.array([np.concatenate(([-np.inf], other.stop)),
+                               np.concatenate((other.start, [np.inf]))]).T
+        gti = _cross_gti_arrays([self.view(np.ndarray), complement])
+        return GTI._from_checked(gti.astype(np.result_type(self, other)))
+
+    def border_bins(self, time, dt=None, epsilon=0.001):
+        """
+        Find the bins in a time array corresponding to the borders of GTIs.
+
+        Same as `gti_border_bins`, but the result is cached for the last time
+        array used, if it is read-only.
+        """
+        if dt is None:
+            dt = np.median(np.diff(time))
+        startbin, stopbin, good = self._border_bins(time, dt, epsilon)
+        assert np.any(good), \
+            ("No GTIs are equal to or longer than chunk_length.")
+        return startbin[good], stopbin[good]
+
+    def _border_bins(self, time, dt, epsilon, tolerance=0):
+        """Cached version of the module-level ``_border_bins``."""
+        import weakref
+
+        key = ("border_bins", dt, epsilon, tolerance)
+        cached = self._cache.get(key)
+        if cached is not None and cached[0]() is time and \
+                cached[1] == len(time):
+            return cached[2]
+
+        result = _border_bins(self.view(np.ndarray), time, dt, epsilon,
+                              tolerance)
+        # Writeable arrays might change in place after being cached
+        if isinstance(time, np.ndarray) and not time.flags.writeable:
+            self._cache[key] = (weakref.ref(time), len(time), result)
+        return result
+
+
+def _plain_array_method(name):
+    """Make an ndarray method return plain arrays when called on a GTI."""
+    method = getattr(np.ndarray, name)
+
+    def wrapper(self, *args, **kwargs):
+        return method(self.view(np.ndarray), *args, **kwargs)
+
+    wrapper.__name__ = name
+    wrapper.__doc__ = "Same as `numpy.ndarray.{}`, returning plain " \
+        "arrays.".format(name)
+    return wrapper
+
+
+# The results of these methods are not valid GTIs in general (e.g. they are
+# flattened, or writeable)
+for _name in ['argsort', 'astype', 'byteswap', 'compress', 'diagonal',
+              'flatten', 'newbyteorder', 'ravel', 'repeat', 'reshape',
+              'squeeze', 'swapaxes', 'take', 'transpose']:
+    setattr(GTI, _name, _plain_array_method(_name))
+
+
+def _file_hash(fname, blocksize=2 ** 20):
+    """SHA1 hash of the content of a file."""
+    sha = hashlib.sha1()
+    with open(fname, 'rb') as fobj:
+        for block in iter(lambda: fobj.read(blocksize), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _rate_filter_gtis(time, gtis, bin_time, min_rate=None, max_rate=None):
+    """Select the parts of the GTIs where the count rate is within limits.
+
+    The events are binned in intervals of ``bin_time`` seconds. The rate in
+    each bin is calculated on the exposure inside the GTIs, so that bins
+    partially covered by GTIs are not penalized.
+    """
+    if len(gtis) == 0:
+        return gtis
+    t0 = gtis[0, 0]
+    # Relative times, so that the binning can be done in double precision
+    rel_gtis = np.asarray(gtis - t0, dtype=np.double)
+    edges = np.arange(0, rel_gtis[-1, 1] + bin_time, bin_time)
+    counts = np.histogram(np.asarray(time - t0, dtype=np.double),
+                          bins=edges)[0]
+
+    # The exposure accumulated from t0 grows linearly inside GTIs, and is
+    # constant outside them
+    cumexpo = np.concatenate(
+        [[0], np.cumsum(rel_gtis[:, 1] - rel_gtis[:, 0])])
+    expo = np.diff(np.interp(edges, rel_gtis.ravel(),
+                             np.array([cumexpo[:-1], cumexpo[1:]]).T.ravel()))
+
+    condition = expo > 0
+    rate = np.zeros_like(expo)
+    rate[condition] = counts[condition] / expo[condition]
+    if min_rate is not None:
+        condition &= rate >= min_rate
+    if max_rate is not None:
+        condition &= rate <= max_rate
+
+    if not np.any(condition):
+        return np.zeros((0, 2), dtype=gtis.dtype)
+    rate_gtis = create_gti_from_condition(edges[:-1] + bin_time / 2,
+                                          condition, dt=bin_time / 2)
+    return cross_two_gtis(gtis, rate_gtis + t0)
+
+
+class GTIScreening(object):
+    """
+    A reusable recipe to screen event lists with Good Time Intervals.
+
+    The recipe intersects the GTIs of the instrument with any number of custom
+    intervals, optionally keeps only the times where the count rate is within
+    given limits, and then removes safe intervals and short GTIs. It is applied
+    in a single pass, producing the final GTIs and the mask of good events.
+
+    When screening files with `screen_file`, the results can be cached on disk.
+    The cache is keyed by the content of the file and by the recipe, so that
+    screening an unchanged file again with the same recipe just loads the
+    result.
+
+    Parameters
+    ----------
+    intervals : list of [[gti0_0, gti0_1], [gti1_0, gti1_1], ...], optional
+        Custom intervals to intersect with the instrument GTIs
+    rate_bin : float, optional
+        Bin time (in s) of the light curve used to filter on the count rate.
+        If None, no filtering on the count rate is done
+    min_rate, max_rate : float, optional
+        The limits on the count rate (in counts/s). None means no limit
+    safe_interval : float or [float, float], default 0
+        A safe interval to exclude at both ends (if single float) or the start
+        and the end (if pair of values) of the final GTIs
+    min_length : float, default 0
+        Minimum length of the final GTIs, after removing the safe intervals
+    gtistring : str, default 'GTI,STDGTI'
+        Comma-separated accepted names of the GTI extension of event files
+    cache_dir : str, optional
+        Directory where the results of `screen_file` are cached. If None,
+        nothing is cached
+
+    Examples
+    --------
+    >>> times = np.arange(0, 10, 0.5)
+    >>> screening = GTIScreening(intervals=[[[2, 20]]], safe_interval=1)
+    >>> gtis, mask = screening.screen(times, [[0, 8]])
+    >>> np.all(gtis == [[3, 7]])
+    True
+    >>> np.all(times[mask] == np.arange(3, 7.5, 0.5))
+    True
+    """
+    _cache_version = 1
+
+    def __init__(self, intervals=None, rate_bin=None, min_rate=None,
+                 max_rate=None, safe_interval=0, min_length=0,
+                 gtistring='GTI,STDGTI', cache_dir=None):
+        self.intervals = [GTI(i) for i in assign_value_if_none(intervals, [])]
+        self.rate_bin = rate_bin
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.safe_interval = safe_interval
+        self.min_length = min_length
+        self.gtistring = gtistring
+        self.cache_dir = cache_dir
+
+    def recipe_hash(self):
+        """Hash identifying the recipe, used in the cache keys."""
+        sha = hashlib.sha1()
+        sha.update(repr((self._cache_version, self.rate_bin, self.min_rate,
+                         self.max_rate, self.safe_interval, self.min_length,
+                         self.gtistring)).encode())
+        for interval in self.intervals:
+            # The bytes of long doubles include padding, so the intervals are
+            # hashed as the sum of two doubles, which is exact
+            high = np.asarray(interval, dtype=np.double)
+            low = np.asarray(interval - high, dtype=np.double)
+            sha.update(repr(interval.shape).encode())
+            sha.update(high.tobytes())
+            sha.update(low.tobytes())
+        return sha.hexdigest()
+
+    def screen(self, time, gtis):
+        """Apply the recipe to a list of events.
+
+        Parameters
+        ----------
+        time : array-like
+            The sorted event times
+        gtis : [[gti0_0, gti0_1], [gti1_0, gti1_1], ...]
+            The instrument GTIs
+
+        Returns
+        -------
+        gtis : `GTI`
+            The screened GTIs
+        mask : array of bools
+            True for the events inside the screened GTIs
+        """
+        time = np.asarray(time)
+        gtis = cross_gtis([gtis] + self.intervals)
+
+        if self.rate_bin is not None:
+            gtis = _rate_filter_gtis(time, gtis, self.rate_bin,
+                                     min_rate=self.min_rate,
+                                     max_rate=self.max_rate)
+
+        if len(gtis) == 0:
+            return GTI(gtis), np.zeros(len(time), dtype=bool)
+
+        mask, gtis = create_gti_mask(time, gtis,
+                                     safe_interval=self.safe_interval,
+                                     min_length=self.min_length,
+                                     return_new_gtis=True, dt=0)
+        return GTI._from_checked(gtis), mask
+
+    def cache_file(self, fits_file):
+        """Path of the cache file for the screening of ``fits_file``."""
+        return os.path.join(self.cache_dir, '{0}_{1}.npz'.format(
+            _file_hash(fits_file), self.recipe_hash()))
+
+    def screen_file(self, fits_file):
+        """Apply the recipe to an event file.
+
+        If ``cache_dir`` is set and this file was already screened with the
+        same recipe, the cached result is returned.
+
+        Parameters
+        ----------
+        fits_file : str
+            The event file
+
+        Returns
+        -------
+        gtis : `GTI`
+            The screened GTIs
+        mask : array of bools
+            True for the (time-sorted) events inside the screened GTIs
+        """
+        import tempfile
+        from .io import load_events_and_gtis
+
+        cache_file = None
+        if self.cache_dir is not None:
+            cache_file = self.cache_file(fits_file)
+            if os.path.exists(cache_file):
+                logging.info("Loading screening of %s from cache %s",
+                             fits_file, cache_file)
+                with np.load(cache_file) as cached:
+                    return GTI._from_checked(cached['gtis']), cached['mask']
+
+        data = load_events_and_gtis(fits_file, gtistring=self.gtistring)
+        gtis, mask = self.screen(data.ev_list, data.gti_list)
+
+        if cache_file is not None:
+            if not os.path.exists(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            # Write to a temporary file first, so that an interrupted run
+            # does not leave an incomplete cache file
+            with tempfile.NamedTemporaryFile(dir=self.cache_dir,
+                                             delete=False) as fobj:
+                np.savez(fobj, gtis=gtis.view(np.ndarray), mask=mask)
+            os.rename(fobj.name, cache_file)
+
+        return gtis, mask
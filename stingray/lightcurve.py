@@ -19,6 +19,98 @@ __all__ = ["Lightcurve"]
 valid_statistics = ["poisson", "gauss", None]
 
 
+# Above this number of counts, the uncertainties are calculated with the
+# Gaussian approximation (see _poisson_symmetrical_errors)
+_POISSON_GAUSS_LIMIT = 1000
+
+# Uncertainties for 0, 1, 2, ... counts, extended when needed
+_poisson_err_table = np.zeros(0)
+
+
+def _poisson_half_widths(counts):
+    """Half-widths of the 1-sigma Poisson frequentist confidence intervals.
+    """
+    err_low, err_high = poisson_conf_interval(counts,
+        interval='frequentist-confidence', sigma=1)
+    return (err_high - err_low) / 2.0
+
+
+def _poisson_err_lookup(max_counts):
+    """
+    Get the table of uncertainties, covering at least up to max_counts.
+
+    The table is extended in powers of two, up to the Gaussian limit.
+    """
+    global _poisson_err_table
+
+    if max_counts >= len(_poisson_err_table):
+        size = 2 ** int(np.ceil(np.log2(max_counts + 1)))
+        size = min(max(size, 64), _POISSON_GAUSS_LIMIT)
+        _poisson_err_table = _poisson_half_widths(np.arange(size))
+
+    return _poisson_err_table
+
+
+def _poisson_symmetrical_errors(counts):
+    """
+    Approximately symmetrical 1-sigma uncertainties for Poisson counts.
+
+    They are the half-widths of the 1-sigma frequentist confidence intervals
+    for a Poisson distribution with mean equal to `counts`. For non-negative
+    integer counts (the usual case), they are gathered from a table that is
+    calculated once; above ``_POISSON_GAUSS_LIMIT`` counts, the Gaussian
+    approximation ``sqrt(n) + 1/2 + 1/(12 sqrt(n))`` (with corrections for
+    the asymmetry of the intervals, accurate to better than 1e-7) is used
+    instead. Other values are calculated once for each distinct value.
+    """
+    counts = np.asarray(counts)
+    if counts.size == 0:
+        return np.zeros(counts.shape)
+
+    is_integer = np.issubdtype(counts.dtype, np.integer) or \
+        np.all(np.mod(counts, 1) == 0)
+    if not is_integer or np.min(counts) < 0:
+        unique, inverse = np.unique(counts, return_inverse=True)
+        return _poisson_half_widths(unique)[inverse].reshape(counts.shape)
+
+    large = counts >= _POISSON_GAUSS_LIMIT
+    if not np.any(large):
+        table = _poisson_err_lookup(np.max(counts))
+        return table[counts.astype(np.int64)]
+
+    err = np.empty(counts.shape)
+    sqrt_counts = np.sqrt(counts[large].astype(np.double))
+    err[large] = sqrt_counts + 0.5 + 1 / (12 * sqrt_counts)
+
+    small = ~large
+    if np.any(small):
+        table = _poisson_err_lookup(np.max(counts[small]))
+        err[small] = table[counts[small].astype(np.int64)]
+
+    return err
+
+
+class _LazyAttribute(object):
+    """
+    Attribute computed by a method on first access.
+
+    The result is then stored in the instance dictionary, so that later
+    accesses see it as a normal attribute, and assigning to it works as
+    usual.
+    """
+    def __init__(self, method):
+        self.method = method
+        self.name = method.__name__
+        self.__doc__ = method.__doc__
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            return self
+        value = self.method(obj)
+        obj.__dict__[self.name] = value
+        return value
+
+
 class Lightcurve(object):
     def __init__(self, time, counts, err=None, input_counts=True,
                  gti=None, err_dist='poisson', mjdref=0, dt=None):
@@ -42,8 +134,8 @@ class Lightcurve(object):
             the bins defined in `time` (note: use `input_counts=False` to
             input the count rage, i.e. counts/second, otherwise use
             counts/bin). If None, we assume the data is poisson distributed
-            and calculate the error from the average of the lower and upper 
-            1-sigma confidence intervals for the Poissonian distribution with 
+            and calculate the error as the half-width of the 1-sigma
+            confidence interval for the Poissonian distribution with
             mean equal to `counts`.
 
         input_counts: bool, optional, default True
@@ -81,7 +173,8 @@ class Lightcurve(object):
             The counts per bin corresponding to the bins in `time`.
 
         counts_err: numpy.ndarray
-            The uncertainties corresponding to `counts`
+            The uncertainties corresponding to `counts`. If not given, they
+            are only computed when first needed.
 
         countrate: numpy.ndarray
             The counts per second in each of the bins defined in `time`.
@@ -152,18 +245,16 @@ class Lightcurve(object):
                                     "{}".format(valid_statistics))
             if err_dist.lower() == 'poisson':
                 # Instead of the simple square root, we use confidence
-                # intervals (should be valid for low fluxes too)
-                err_low, err_high = poisson_conf_interval(np.asarray(counts),
-                    interval='frequentist-confidence', sigma=1)
-                # calculate approximately symmetric uncertainties
-                err = (np.absolute(err_low) + np.absolute(err_high) -
-                       2 * np.asarray(counts))/2.0
+                # intervals (should be valid for low fluxes too).
+                # For input counts, this is deferred until the errors are
+                # actually used (see the counts_err attribute)
+                if not input_counts:
+                    err = _poisson_symmetrical_errors(counts)
                 # other estimators can be implemented for other statistics
             else:
                 simon("Stingray only uses poisson err_dist at the moment, "
                       "We are setting your errors to zero. "
                       "Sorry for the inconvenience.")
-                err = np.zeros_like(counts)
 
         self.mjdref = mjdref
         self.time = np.asarray(time)
@@ -172,36 +263,33 @@ class Lightcurve(object):
         else:
             self.dt = dt
 
-        self.bin_lo = self.time - 0.5 * self.dt
-        self.bin_hi = self.time + 0.5 * self.dt
-
         self.err_dist = err_dist
 
         self.tstart = self.time[0] - 0.5*self.dt
         self.tseg = self.time[-1] - self.time[0] + self.dt
 
         self.gti = \
-            np.asarray(assign_value_if_none(gti,
-                                            [[self.tstart,
-                                              self.tstart + self.tseg]]))
+            np.asanyarray(assign_value_if_none(gti,
+                                               [[self.tstart,
+                                                 self.tstart + self.tseg]]))
         check_gtis(self.gti)
 
         good = create_gti_mask(self.time, self.gti)
 
         self.time = self.time[good]
+
+        # Count rates, uncertainties and bin edges are only computed when
+        # first needed (see the _LazyAttribute attributes below)
         if input_counts:
             self.counts = np.asarray(counts)[good]
-            self.countrate = self.counts / self.dt
-            self.counts_err = np.asarray(err)[good]
-            self.countrate_err = np.asarray(err)[good] / self.dt
+            if err is not None:
+                self.counts_err = np.asarray(err)[good]
         else:
             self.countrate = np.asarray(counts)[good]
             self.counts = self.countrate * self.dt
-            self.counts_err = np.asarray(err)[good] * self.dt
-            self.countrate_err = np.asarray(err)[good]
+            if err is not None:
+                self.countrate_err = np.asarray(err)[good]
 
-        self.meanrate = np.mean(self.countrate)
-        self.meancounts = np.mean(self.counts)
         self.n = self.counts.shape[0]
 
         # Issue a warning if the input time iterable isn't regularly spaced,
@@ -213,6 +301,109 @@ class Lightcurve(object):
                   "Please make the input time evenly sampled.")
 
 
+    @_LazyAttribute
+    def countrate(self):
+        """The counts per second in each of the bins."""
+        return self.counts / self.dt
+
+    @_LazyAttribute
+    def counts_err(self):
+        """The uncertainties corresponding to `counts`."""
+        if "countrate_err" in self.__dict__:
+            return self.countrate_err * self.dt
+        if self.err_dist.lower() == 'poisson':
+            return _poisson_symmetrical_errors(self.counts)
+        return np.zeros_like(self.counts)
+
+    @_LazyAttribute
+    def countrate_err(self):
+        """The uncertainties corresponding to `countrate`."""
+        return self.counts_err / self.dt
+
+    @_LazyAttribute
+    def meanrate(self):
+        """The mean count rate of the light curve."""
+        return np.mean(self.countrate)
+
+    @_LazyAttribute
+    def meancounts(self):
+        """The mean counts of the light curve."""
+        return np.mean(self.counts)
+
+    @_LazyAttribute
+    def bin_lo(self):
+        """The lower edges of the time bins."""
+        return self.time - 0.5 * self.dt
+
+    @_LazyAttribute
+    def bin_hi(self):
+        """The upper edges of the time bins."""
+        return self.time + 0.5 * self.dt
+
+    def _slice(self, start, stop, gti=None):
+        """
+        Make a light curve with the bins from index ``start`` to ``stop``.
+
+        This is a lightweight alternative to the ``Lightcurve`` constructor,
+        for internal use on light curves that were already validated: the
+        arrays of the new light curve are views of the arrays of this one
+        (nothing is copied, checked or recomputed). Uncertainties and other
+        attributes that were already computed are sliced as well; the others
+        are computed when needed, as usual.
+
+        Parameters
+        ----------
+        start, stop: int
+            Indices of the first bin and of the bin after the last one
+
+        gti: 2-d float array, default None
+            Good Time Intervals of the new light curve. If None, a single
+            interval covering the new bins is used.
+
+        Returns
+        -------
+        lc_new: :class:`Lightcurve` object
+            The new light curve, sharing memory with this one.
+        """
+        lc_new = Lightcurve.__new__(Lightcurve)
+        lc_new.time = self.time[start:stop]
+        lc_new.counts = self.counts[start:stop]
+
+        if lc_new.time.size <= 1:
+            raise StingrayError("A single or no data points can not create "
+                                "a lightcurve!")
+
+        for attr in ["counts_err", "countrate", "countrate_err",
+                     "bin_lo", "bin_hi"]:
+            if attr in self.__dict__:
+                setattr(lc_new, attr, self.__dict__[attr][start:stop])
+
+        lc_new.mjdref = self.mjdref
+        lc_new.dt = self.dt
+        lc_new.err_dist = self.err_dist
+        lc_new.n = lc_new.counts.shape[0]
+        lc_new.tstart = lc_new.time[0] - 0.5 * self.dt
+        lc_new.tseg = lc_new.time[-1] - lc_new.time[0] + self.dt
+        lc_new.gti = \
+            np.asarray(assign_value_if_none(gti,
+                                            [[lc_new.tstart,
+                                              lc_new.tstart + lc_new.tseg]]))
+        return lc_new
+
+    def _counts_err_to_propagate(self):
+        """
+        Uncertainties to give to new light curves made from this one.
+
+        Default Poisson uncertainties that were never needed are not
+        computed: None is returned, and the new light curves will compute
+        them, if needed.
+        """
+        if self.err_dist.lower() == 'poisson' and \
+                "counts_err" not in self.__dict__ and \
+                "countrate_err" not in self.__dict__:
+            return None
+        return self.counts_err
+
     def change_mjdref(self, new_mjdref):
         """Change the MJDREF of the light curve.
 
@@ -645,11 +836,18 @@ class Lightcurve(object):
 
             new_time = np.concatenate([first_lc.time, second_lc.time])
             new_counts = np.concatenate([first_lc.counts, second_lc.counts])
-            new_counts_err = np.concatenate([first_lc.counts_err, second_lc.counts_err])
+            first_err = first_lc._counts_err_to_propagate()
+            second_err = second_lc._counts_err_to_propagate()
+            if first_err is None and second_err is None:
+                new_counts_err = None
+            else:
+                new_counts_err = np.concatenate([first_lc.counts_err,
+                                                 second_lc.counts_err])
 
         new_time = np.asarray(new_time)
         new_counts = np.asarray(new_counts)
-        new_counts_err = np.asarray(new_counts_err)
+        if new_counts_err is not None:
+            new_counts_err = np.asarray(new_counts_err)
         gti = join_gtis(self.gti, other.gti)
 
         lc_new = Lightcurve(new_time, new_counts, err=new_counts_err, gti=gti,
@@ -720,15 +918,12 @@ class Lightcurve(object):
     def _truncate_by_index(self, start, stop):
         """Private method for truncation using index values."""
         time_new = self.time[start:stop]
-        counts_new = self.counts[start:stop]
-        counts_err_new = self.counts_err[start:stop]
         gti = \
             cross_two_gtis(self.gti,
                            np.asarray([[self.time[start] - 0.5 * self.dt,
                                         time_new[-1] + 0.5 * self.dt]]))
 
-        return Lightcurve(time_new, counts_new, err=counts_err_new, gti=gti,
-                          dt=self.dt)
+        return self._slice(start, stop, gti=gti)
 
     def _truncate_by_time(self, start, stop):
         """Private method for truncation using time values."""
@@ -878,6 +1073,10 @@ class Lightcurve(object):
             io.write(self, filename, format_)
 
         elif format_ == 'hdf5':
+            # Compute the lazy attributes, so that they are saved as well
+            for attr in ["countrate", "counts_err", "countrate_err",
+                         "meanrate", "meancounts", "bin_lo", "bin_hi"]:
+                getattr(self, attr)
             io.write(self, filename, format_)
 
         else:
@@ -922,10 +1121,7 @@ class Lightcurve(object):
             start = start_bins[i]
             stop = stop_bins[i]
             # Note: GTIs are consistent with default in this case!
-            new_lc = Lightcurve(self.time[start:stop], self.counts[start:stop],
-                                err=self.counts_err[start:stop],
-                                mjdref=self.mjdref, gti=[self.gti[i]],
-                                dt=self.dt)
+            new_lc = self._slice(start, stop, gti=[self.gti[i]])
             list_of_lcs.append(new_lc)
 
         return list_of_lcs
@@ -4,19 +4,21 @@ import scipy
 import scipy.stats
 import scipy.fftpack
 import scipy.optimize
+import scipy.special
 import logging
 
 import stingray.lightcurve as lightcurve
 import stingray.utils as utils
 from stingray.gti import bin_intervals_from_gtis, check_gtis
-from stingray.utils import simon
+from stingray.gti import _arange_in_intervals
+from stingray.utils import assign_value_if_none
 from stingray.crossspectrum import Crossspectrum, AveragedCrossspectrum
 
 
 __all__ = ["Powerspectrum", "AveragedPowerspectrum"]
 
 
-def classical_pvalue(power, nspec):
+def classical_pvalue(power, nspec, return_log=False):
     """
     Compute the probability of detecting the current power under
     the assumption that there is no periodic oscillation in the data.
@@ -42,78 +44,195 @@ def classical_pvalue(power, nspec):
     Mathematical formulation in Groth, 1975.
     Original implementation in IDL by Anna L. Watts.
 
+    The p-value is the survival function of a chi-square distribution with
+    ``2 * nspec`` degrees of freedom, evaluated at ``power * nspec``. It is
+    computed for whole arrays of powers at once, and in log space where it
+    would underflow, so that it stays accurate in the far tail.
+
     Parameters
     ----------
-    power :  float
+    power :  float or array of floats
         The squared Fourier amplitude of a spectrum to be evaluated
 
-    nspec : int
+    nspec : int or array of ints
         The number of spectra or frequency bins averaged in `power`.
         This matters because averaging spectra or frequency bins increases
         the signal-to-noise ratio, i.e. makes the statistical distributions
         of the noise narrower, such that a smaller power might be very
         significant in averaged spectra even though it would not be in a single
-        power spectrum.
+        power spectrum. It must broadcast against `power`.
+
+    Other Parameters
+    ----------------
+    return_log : bool, default False
+        Return the natural logarithm of the p-value. Use this for very
+        significant powers, whose p-values are below the smallest positive
+        floating point number.
 
     Returns
     -------
-    pval : float
+    pval : float or array of floats
         The classical p-value of the observed power being consistent with
-        the null hypothesis of white noise
+        the null hypothesis of white noise (or its logarithm, if `return_log`
+        is True)
 
     """
-    if not np.isfinite(power):
+    power = np.asarray(power, dtype=np.double)
+    nspec = np.asarray(nspec, dtype=np.double)
+
+    if not np.all(np.isfinite(power)):
         raise ValueError("power must be a finite floating point number!")
 
-    if power < 0:
+    if np.any(power < 0):
         raise ValueError("power must be a positive real number!")
 
-    if not np.isfinite(nspec):
+    if not np.all(np.isfinite(nspec)):
         raise ValueError("nspec must be a finite integer number")
 
-    if nspec < 1:
+    if np.any(nspec < 1):
         raise ValueError("nspec must be larger or equal to 1")
 
-    if not np.isclose(nspec % 1, 0):
+    if not np.all(np.isclose(nspec % 1, 0)):
         raise ValueError("nspec must be an integer number!")
 
-    # If the power is really big, it's safe to say it's significant,
-    # and the p-value will be nearly zero
-    if (power*nspec) > 30000:
-        simon("Probability of no signal too miniscule to calculate.")
-        return 0.0
+    log_pval = _log_pavnosigfun(power, np.rint(nspec))
+
+    if not return_log:
+        log_pval = np.exp(log_pval)
+
+    if log_pval.ndim == 0:
+        return float(log_pval)
+
+    return log_pval
 
-    else:
-        pval = _pavnosigfun(power, nspec)
-        return pval
 
+def _log_pavnosigfun(power, nspec):
+    """
+    Helper function doing the actual calculation of the log of the p-value.
+
+    The p-value is the regularized upper incomplete gamma function
+    Q(nspec, x), with ``x = power * nspec / 2``. Where it underflows, its
+    logarithm is computed from the finite sum valid for integer nspec,
 
-def _pavnosigfun(power, nspec):
+        Q(nspec, x) = exp(-x) * sum_{m=0}^{nspec-1} x^m / m!,
+
+    after factoring out the largest term, x^(nspec-1) exp(-x) / (nspec-1)!.
     """
-    Helper function doing the actual calculation of the p-value.
+    nspec, x = np.broadcast_arrays(nspec, power * nspec / 2)
+    shape = x.shape
+    nspec = nspec.astype(np.double).ravel()
+    x = x.astype(np.double).ravel()
+
+    pval = scipy.special.gammaincc(nspec, x)
+    with np.errstate(divide="ignore"):
+        log_pval = np.log(pval)
+
+    # Below ~1e-300, gammaincc loses precision and then underflows. This
+    # only happens for x > nspec, where the sum converges quickly.
+    tail = pval < 1e-300
+    if np.any(tail):
+        a, xt = nspec[tail], x[tail]
+        term = np.ones_like(xt)
+        total = np.ones_like(xt)
+        for k in range(1, int(np.max(a))):
+            term *= np.clip(a - k, 0, None) / xt
+            total += term
+            if np.all(term < 1e-17 * total):
+                break
+
+        log_pval[tail] = (a - 1) * np.log(xt) - xt - \
+            scipy.special.gammaln(a) + np.log(total)
+
+    return log_pval.reshape(shape)
+
+
+def _segment_start_bins(gti, tstart, dt, nbin, epsilon=0.001):
+    """Find the start bins of segments of nbin bins fitting in the GTIs.
+
+    Bins are counted on the regular grid ``tstart + i * dt``, the same as
+    ``Lightcurve.make_lightcurve``. As in ``bin_intervals_from_gtis``, only
+    bins fully inside a GTI (within ``epsilon * dt``) are used, but the time
+    grid is never created.
     """
-    sum = 0.0
-    m = nspec - 1
+    gti = np.asarray(gti)
+    nbin_total = np.floor((gti[-1, 1] - tstart) / dt)
 
-    pn = power * nspec
+    first = np.ceil((gti[:, 0] - tstart) / dt - epsilon)
+    stop = np.minimum(np.floor((gti[:, 1] - tstart) / dt + epsilon),
+                      nbin_total)
+    nseg = np.maximum((stop - first) // nbin, 0).astype(np.int64)
 
-    while m >= 0:
+    return _arange_in_intervals(first.astype(np.int64), nseg, nbin)
 
-        s = 0.0
-        for i in range(int(m)-1):
-            s += np.log(float(m-i))
 
-        logterm = m*np.log(pn/2) - pn/2 - s
-        term = np.exp(logterm)
-        ratio = sum / term
+def _event_chunks(events, chunk_size):
+    """Iterate over consecutive chunks of event times.
 
-        if ratio > 1.0e15:
-            return sum
+    Arrays (including memory-mapped ones) are sliced in chunks of
+    ``chunk_size`` events, while any other iterable is assumed to already
+    yield chunks of event times.
+    """
+    if isinstance(events, np.ndarray):
+        for i in range(0, len(events), chunk_size):
+            yield np.asarray(events[i:i + chunk_size])
+    else:
+        for chunk in events:
+            yield np.asarray(chunk)
 
-        sum += term
-        m -= 1
 
-    return sum
+def _segment_counts_from_events(chunks, tstart, dt, start_bins, nbin):
+    """Bin the events of each segment, reading the events chunk by chunk.
+
+    Only the events of the current chunk and of the current segment are kept
+    in memory.
+
+    Parameters
+    ----------
+    chunks : iterable of arrays
+        Consecutive chunks of sorted event times
+    tstart : float
+        The start of the time grid
+    dt : float
+        The bin time
+    start_bins : array of ints
+        The first bin of each segment on the time grid
+    nbin : int
+        The number of bins in each segment
+
+    Yields
+    ------
+    counts : array
+        The binned light curve of a single segment
+    """
+    seg_starts = tstart + start_bins * dt
+    seg_length = nbin * dt
+    nseg = len(seg_starts)
+
+    def _bin_segment(times, t0):
+        lo, hi = np.searchsorted(times, [t0, t0 + seg_length])
+        counts, _ = np.histogram(times[lo:hi], bins=nbin,
+                                 range=[t0, t0 + seg_length])
+        return counts
+
+    buffer = np.array([])
+    iseg = 0
+    for chunk in chunks:
+        if len(chunk) == 0:
+            continue
+        buffer = np.concatenate([buffer.astype(chunk.dtype), chunk])
+
+        # All the segments ending before the last event read are complete
+        while iseg < nseg and seg_starts[iseg] + seg_length <= buffer[-1]:
+            yield _bin_segment(buffer, seg_starts[iseg])
+            iseg += 1
+
+        if iseg == nseg:
+            return
+        # Events before the current segment will not be used anymore
+        buffer = buffer[np.searchsorted(buffer, seg_starts[iseg]):]
+
+    for t0 in seg_starts[iseg:]:
+        yield _bin_segment(buffer, t0)
 
 
 class Powerspectrum(Crossspectrum):
@@ -297,8 +416,7 @@ class Powerspectrum(Crossspectrum):
 
         # calculate p-values for all powers
         # leave out zeroth power since it just encodes the number of photons!
-        pv = np.array([classical_pvalue(power, self.m)
-                      for power in self.power])
+        pv = classical_pvalue(self.power, self.m)
 
         # if trial correction is used, then correct the threshold for
         # the number of powers in the power spectrum
@@ -316,7 +434,8 @@ class Powerspectrum(Crossspectrum):
 
 class AveragedPowerspectrum(AveragedCrossspectrum, Powerspectrum):
 
-    def __init__(self, lc=None, segment_size=None, norm="frac", gti=None):
+    def __init__(self, lc=None, segment_size=None, norm="frac", gti=None,
+                 save_all=False):
         """
         Make an averaged periodogram from a light curve by segmenting the light
         curve, Fourier-transforming each segment and then averaging the
@@ -346,6 +465,15 @@ class AveragedPowerspectrum(AveragedCrossspectrum, Powerspectrum):
             This choice overrides the GTIs in the single light curves. Use with
             care!
 
+        save_all: bool, default False
+            If True, make a full ``Powerspectrum`` object for each segment and
+            save them all in the ``cs_all`` attribute. Otherwise, all segments
+            are stacked and Fourier-transformed at once, and only running sums
+            over the segments are kept. This is much faster for many segments,
+            and the memory usage does not grow with the number of segments.
+            The single periodograms are still available on request, through
+            ``segment_spectra`` and ``segment_powers``.
+
         Attributes
         ----------
         norm: {"leahy" | "rms"}
@@ -387,12 +515,121 @@ class AveragedPowerspectrum(AveragedCrossspectrum, Powerspectrum):
                 raise ValueError("segment_size must be finite!")
 
         self.segment_size = segment_size
+        self.save_all = save_all
 
         Powerspectrum.__init__(self, lc, norm, gti=gti)
 
         return
 
-    def _make_segment_spectrum(self, lc, segment_size):
+    @classmethod
+    def from_events(cls, events, dt, segment_size, norm="frac", gti=None,
+                    chunk_size=1000000):
+        """
+        Make an averaged periodogram directly from photon arrival times.
+
+        The events are read chunk by chunk, and only one segment at a time is
+        binned into a light curve. The full light curve is never created, so
+        that the memory usage depends on the segment length and on the chunk
+        size, not on the length of the observation. The result is the same
+        as ``AveragedPowerspectrum(events.to_lc(dt), segment_size)``, up to
+        the rounding of the segment length to a whole number of bins: here,
+        segments are always ``int(segment_size / dt)`` bins long, while the
+        light curve path divides by the median time step of the light curve.
+        When ``segment_size`` is a multiple of ``dt``, rounding errors in the
+        time step can make the latter one bin shorter.
+
+        Parameters
+        ----------
+        events: ``EventList`` object, array, or iterable of arrays
+            The *sorted* photon arrival times. Arrays (e.g. a ``numpy.memmap``
+            pointing to a large file) are read in chunks of ``chunk_size``
+            events. Any other iterable (e.g. a generator reading a file
+            piece by piece) has to yield consecutive chunks of event times.
+
+        dt: float
+            The time resolution of the light curve segments
+
+        segment_size: float
+            The size of each segment to average
+
+        Other Parameters
+        ----------------
+        norm: {"leahy" | "frac" | "abs" | "none"}, default "frac"
+            The normalization of the periodogram
+
+        gti: 2-d float array
+            [[gti0_0, gti0_1], [gti1_0, gti1_1], ...] -- Good Time intervals.
+            Mandatory if ``events`` is a generic iterable. Otherwise, it
+            defaults to the GTIs of the ``EventList``, or to the interval
+            between the first and the last event.
+
+        chunk_size: int, default 1000000
+            The number of events read at a time from arrays
+
+        Returns
+        -------
+        aps: ``AveragedPowerspectrum`` object
+            The averaged periodogram
+        """
+        if not np.isfinite(segment_size):
+            raise ValueError("segment_size must be finite!")
+
+        # EventList objects
+        if hasattr(events, "time"):
+            gti = assign_value_if_none(gti, events.gti)
+            events = events.time
+
+        if gti is None:
+            if not isinstance(events, np.ndarray):
+                raise ValueError("GTIs are needed to make a periodogram from "
+                                 "an iterable of events")
+            gti = [[events[0], events[-1]]]
+
+        gti = np.asarray(gti)
+        check_gtis(gti)
+
+        # Same time grid as EventList.to_lc
+        tstart = gti[0, 0]
+        nbin = int(segment_size / dt)
+        if nbin < 1:
+            raise ValueError("segment_size must be longer than the bin time")
+        start_bins = _segment_start_bins(gti, tstart, dt, nbin)
+
+        if len(start_bins) == 0:
+            raise ValueError("No GTIs are equal to or longer than "
+                             "segment_size.")
+
+        aps = cls(norm=norm)
+        aps.segment_size = segment_size
+        aps.gti = gti
+
+        sums = aps._empty_segment_sums(nbin, dt)
+        # Each block of segments is at most ~4 million bins long
+        block_size = max(1, 2 ** 22 // nbin)
+
+        block = []
+        for counts in _segment_counts_from_events(
+                _event_chunks(events, chunk_size), tstart, dt, start_bins,
+                nbin):
+            block.append(counts)
+            if len(block) == block_size:
+                block = np.array(block)
+                aps._add_segment_spectra(sums, block, block,
+                                         np.repeat(nbin * dt, len(block)))
+                block = []
+
+        if len(block) > 0:
+            block = np.array(block)
+            aps._add_segment_spectra(sums, block, block,
+                                     np.repeat(nbin * dt, len(block)))
+
+        aps._set_averaged_spectrum([sums], sums.pop("nphots1"), None)
+        aps.nphots = aps.nphots1
+
+        return aps
+
+    def _segment_intervals(self, lc, segment_size):
+        """Check the light curve and find the segments to average."""
 
         if not isinstance(lc, lightcurve.Lightcurve):
             raise TypeError("lc must be a lightcurve.Lightcurve object")
@@ -401,19 +638,32 @@ class AveragedPowerspectrum(AveragedCrossspectrum, Powerspectrum):
             self.gti = lc.gti
         check_gtis(self.gti)
 
-        start_inds, end_inds = \
-            bin_intervals_from_gtis(self.gti, segment_size, lc.time)
+        return bin_intervals_from_gtis(self.gti, segment_size, lc.time)
 
-        power_all = []
-        nphots_all = []
-        for start_ind, end_ind in zip(start_inds, end_inds):
-            time = lc.time[start_ind:end_ind]
-            counts = lc.counts[start_ind:end_ind]
-            counts_err = lc.counts_err[start_ind: end_ind]
-            lc_seg = lightcurve.Lightcurve(time, counts, err=counts_err,
-                                           err_dist=lc.err_dist.lower())
-            power_seg = Powerspectrum(lc_seg, norm=self.norm)
-            power_all.append(power_seg)
-            nphots_all.append(np.sum(lc_seg.counts))
+    def _make_segment_spectrum_batch(self, lc, segment_size):
+        """Sum the power spectra of all segments, without making objects.
+
+        See ``AveragedCrossspectrum._sum_segment_spectra`` for the format of
+        the output.
+        """
+        start_inds, end_inds = self._segment_intervals(lc, segment_size)
+
+        sums, nphots_all, _ = \
+            self._sum_segment_spectra(lc, lc, start_inds, end_inds, lc.dt)
+
+        return sums, nphots_all
+
+    def _make_segment_spectrum(self, lc, segment_size):
+
+        power_all = list(self._segment_spectrum_objects(lc, segment_size))
+        nphots_all = [power_seg.nphots for power_seg in power_all]
 
         return power_all, nphots_all
+
+    def _segment_spectrum_objects(self, lc, segment_size):
+        """Iterate over the ``Powerspectrum`` objects of single segments."""
+        start_inds, end_inds = self._segment_intervals(lc, segment_size)
+
+        for start_ind, end_ind in zip(start_inds, end_inds):
+            lc_seg = lc._slice(start_ind, end_ind)
+            yield Powerspectrum(lc_seg, norm=self.norm)
@@ -0,0 +1,135 @@
+"""Benchmark the scaling of the pulsation searches with ``n_jobs``.
+
+Run it on the machine to be tested, e.g.::
+
+    python -m stingray.pulse.benchmark_search --nevents 200000 \\
+        --ntrials 2000 --n-jobs 1 2 4 8
+
+For each number of processes, the search is repeated and the best time is
+reported, together with the speed-up over ``n_jobs=1``. The statistics of all
+runs are checked to be identical to those of the serial search.
+"""
+from __future__ import division, print_function
+import argparse
+import multiprocessing
+import time
+
+import numpy as np
+
+from .search import epoch_folding_search, z_n_search
+
+
+def _simulated_events(nevents, frequency, tseg, seed=0):
+    """Sorted event times with a sinusoidal pulsation, over ``tseg`` s."""
+    rng = np.random.RandomState(seed)
+    times = rng.uniform(0, tseg, 2 * nevents)
+    keep = rng.uniform(0, 1, len(times)) < \
+        (1 + 0.5 * np.sin(2 * np.pi * frequency * times)) / 2
+    return np.sort(times[keep][:nevents])
+
+
+def _default_n_jobs():
+    """1, 2, 4, ... up to the number of CPUs (included)."""
+    ncpu = multiprocessing.cpu_count()
+    n_jobs = [2 ** i for i in range(int(np.log2(ncpu)) + 1)]
+    if n_jobs[-1] != ncpu:
+        n_jobs.append(ncpu)
+    return n_jobs
+
+
+def benchmark(nevents=200000, ntrials=2000, n_jobs=None, search="ef",
+              nbin=32, nharm=2, segment_size=5000, tseg=10000,
+              repeat=3):
+    """Time a search on simulated data for each number of processes.
+
+    Parameters
+    ----------
+    nevents : int
+        The number of events
+    ntrials : int
+        The number of trial frequencies
+    n_jobs : list of int
+        The numbers of processes to test. Default: 1, 2, 4, ... up to the
+        number of CPUs
+    search : {"ef", "zn"}
+        Epoch folding or Z^2_n search
+
+    Other Parameters
+    ----------------
+    nbin : int
+        The number of bins of the folded profiles
+    nharm : int
+        The number of harmonics of the Z^2_n search
+    segment_size, tseg : float
+        The length of the segments of the search and of the observation
+    repeat : int
+        The number of repetitions of each search
+
+    Returns
+    -------
+    results : list of ``(n_jobs, best_time)`` tuples
+    """
+    if n_jobs is None:
+        n_jobs = _default_n_jobs()
+    frequency = 1.123
+    times = _simulated_events(nevents, frequency, tseg)
+    frequencies = frequency + np.linspace(-1, 1, ntrials) / tseg
+
+    if search == "ef":
+        def run(jobs):
+            return epoch_folding_search(times, frequencies, nbin=nbin,
+                                        segment_size=segment_size,
+                                        n_jobs=jobs)[1]
+    elif search == "zn":
+        def run(jobs):
+            return z_n_search(times, frequencies, nbin=nbin, nharm=nharm,
+                              segment_size=segment_size, n_jobs=jobs)[1]
+    else:
+        raise ValueError("search must be 'ef' or 'zn'")
+
+    # Compile the numba kernels outside of the timings
+    reference = run(1)
+
+    results = []
+    for jobs in n_jobs:
+        best = np.inf
+        for _ in range(repeat):
+            t0 = time.time()
+            stats = run(jobs)
+            best = min(best, time.time() - t0)
+            if not np.array_equal(stats, reference):
+                raise RuntimeError("n_jobs={} gives different "
+                                   "results".format(jobs))
+        results.append((jobs, best))
+    return results
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the pulsation searches with n_jobs")
+    parser.add_argument("--nevents", type=int, default=200000)
+    parser.add_argument("--ntrials", type=int, default=2000)
+    parser.add_argument("--n-jobs", type=int, nargs="+", default=None)
+    parser.add_argument("--search", choices=["ef", "zn"], default="ef")
+    parser.add_argument("--nbin", type=int, default=32)
+    parser.add_argument("--nharm", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(args)
+
+    results = benchmark(nevents=args.nevents, ntrials=args.ntrials,
+                        n_jobs=args.n_jobs, search=args.search,
+                        nbin=args.nbin, nharm=args.nharm,
+                        repeat=args.repeat)
+
+    print("{} CPUs, {} events, {} trials, search: {}".format(
+        multiprocessing.cpu_count(), args.nevents, args.ntrials,
+        args.search))
+    serial = dict(results).get(1)
+    for jobs, best in results:
+        speedup = "" if serial is None else \
+            "  speed-up: {:.2f}".format(serial / best)
+        print("n_jobs={:3d}: {:.3f} s{}".format(jobs, best, speedup))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,7 @@ Basic pulsar-related functions and statistics.
 from __future__ import division, print_function, absolute_import
 import numpy as np
 import collections
-from ..utils import simon, jit
+from ..utils import simon, jit, HAS_NUMBA
 from scipy.optimize import minimize, basinhopping, curve_fit
 try:
     import pint.toa as toa
@@ -27,10 +27,149 @@ def _default_value_if_no_key(dictionary, key, default):
         return default
 
 
+# Dekker's constant to split a double in two halves of 26 bits
+_SPLITTER = 134217729.0
+
+
+def _split(a):
+    """Split ``a`` into two doubles with non-overlapping 26-bit mantissas."""
+    c = _SPLITTER * a
+    high = c - (c - a)
+    return high, a - high
+
+
+def _two_sum(a, b):
+    """Sum of two doubles and its exact rounding error (Knuth)."""
+    s = a + b
+    b_virtual = s - a
+    return s, (a - (s - b_virtual)) + (b - b_virtual)
+
+
+def _quick_two_sum(a, b):
+    """Sum and rounding error of two doubles, with ``|a| >= |b|``."""
+    s = a + b
+    return s, b - (s - a)
+
+
+def _two_prod(a, b):
+    """Product of two doubles and its exact rounding error (Dekker)."""
+    p = a * b
+    a_high, a_low = _split(a)
+    b_high, b_low = _split(b)
+    return p, ((a_high * b_high - p) + a_high * b_low + a_low * b_high) + \
+        a_low * b_low
+
+
+def _dd_mul(a_high, a_low, b_high, b_low):
+    """Product of two double-double numbers."""
+    p, err = _two_prod(a_high, b_high)
+    err += a_high * b_low + a_low * b_high
+    return _quick_two_sum(p, err)
+
+
+def _dd_add(a_high, a_low, b_high, b_low):
+    """Sum of two double-double numbers."""
+    s, err = _two_sum(a_high, b_high)
+    err += a_low + b_low
+    return _quick_two_sum(s, err)
+
+
+def _to_double_double(x):
+    """Split a (long double) number or array into two doubles."""
+    high = np.asarray(x, dtype=np.double)
+    return high, np.asarray(x - high, dtype=np.double)
+
+
+# The same double-double operations, compiled for the kernel below
+_two_sum_fast = jit(nopython=True)(_two_sum)
+_quick_two_sum_fast = jit(nopython=True)(_quick_two_sum)
+_split_fast = jit(nopython=True)(_split)
+
+
+@jit(nopython=True)
+def _two_prod_fast(a, b):
+    p = a * b
+    a_high, a_low = _split_fast(a)
+    b_high, b_low = _split_fast(b)
+    return p, ((a_high * b_high - p) + a_high * b_low + a_low * b_high) + \
+        a_low * b_low
+
+
+@jit(nopython=True)
+def _dd_mul_fast(a_high, a_low, b_high, b_low):
+    p, err = _two_prod_fast(a_high, b_high)
+    err += a_high * b_low + a_low * b_high
+    return _quick_two_sum_fast(p, err)
+
+
+@jit(nopython=True)
+def _dd_add_fast(a_high, a_low, b_high, b_low):
+    s, err = _two_sum_fast(a_high, b_high)
+    err += a_low + b_low
+    return _quick_two_sum_fast(s, err)
+
+
+@jit(nopython=True)
+def _horner_dd_fast(t_high, t_low, coeff_high, coeff_low, out_high, out_low):
+    """Evaluate ``sum(coeff[i] * t ** (i + 1))`` in double-double precision.
+    """
+    ncoeff = len(coeff_high)
+    for i in range(len(t_high)):
+        high = coeff_high[ncoeff - 1]
+        low = coeff_low[ncoeff - 1]
+        for j in range(ncoeff - 2, -1, -1):
+            high, low = _dd_mul_fast(high, low, t_high[i], t_low[i])
+            high, low = _dd_add_fast(high, low, coeff_high[j], coeff_low[j])
+        out_high[i], out_low[i] = \
+            _dd_mul_fast(high, low, t_high[i], t_low[i])
+    return out_high, out_low
+
+
+def _horner_dd(t_high, t_low, coeff_high, coeff_low):
+    """Vectorized version of `_horner_dd_fast`."""
+    high = np.full(t_high.shape, coeff_high[-1])
+    low = np.full(t_high.shape, coeff_low[-1])
+    for j in range(len(coeff_high) - 2, -1, -1):
+        high, low = _dd_mul(high, low, t_high, t_low)
+        high, low = _dd_add(high, low, coeff_high[j], coeff_low[j])
+    return _dd_mul(high, low, t_high, t_low)
+
+
+def _pulse_phase_double_double(times, coefficients, ph0, to_1):
+    """Pulse phase by Horner's scheme on double-double numbers."""
+    t_high, t_low = _to_double_double(times)
+    coeff_high, coeff_low = _to_double_double(coefficients)
+    shape = t_high.shape
+    t_high, t_low = t_high.ravel(), t_low.ravel()
+    if HAS_NUMBA:
+        high, low = _horner_dd_fast(t_high, t_low, coeff_high, coeff_low,
+                                    np.zeros_like(t_high),
+                                    np.zeros_like(t_high))
+    else:
+        high, low = _horner_dd(t_high, t_low, coeff_high, coeff_low)
+    high, low = _dd_add(high, low, *_to_double_double(ph0))
+    high, low = high.reshape(shape), low.reshape(shape)
+
+    if not to_1:
+        return high.astype(np.longdouble) + low
+    # The fractional part of the high part is exact
+    ph = high - np.floor(high)
+    ph += low
+    ph -= np.floor(ph)
+    return ph
+
+
 def pulse_phase(times, *frequency_derivatives, **opts):
     """
     Calculate pulse phase from the frequency and its derivatives.
 
+    The phase polynomial is evaluated with Horner's scheme, updating a single
+    output array. Optionally, the calculation is done on double-double
+    numbers (the sum of two doubles, with about 32 significant digits), that
+    keep the precision of the phases well below a microsecond over years of
+    data with no need for long doubles. When numba is installed, this is done
+    by a compiled kernel that is much faster than long double arithmetic.
+
     Parameters
     ----------
     times : array of floats
@@ -49,36 +188,111 @@ def pulse_phase(times, *frequency_derivatives, **opts):
         The starting phase
     to_1 : bool, default True
         Only return the fractional part of the phase, normalized from 0 to 1
+    double_double : bool, default None
+        Calculate the phases with double-double arithmetic. In this case, the
+        fractional phases are doubles and the absolute phases (with ``to_1``
+        False) long doubles. By default, this is done for long double times
+        if numba is installed; otherwise, the phases are calculated with the
+        precision of ``times``
+
+    Examples
+    --------
+    >>> times = np.array([0, 0.25, 1.5])
+    >>> np.allclose(pulse_phase(times, 2, 4, to_1=False), [0, 0.625, 7.5])
+    True
+    >>> np.allclose(pulse_phase(times, 2, 4, double_double=True),
+    ...             [0, 0.625, 0.5])
+    True
     """
+    from math import factorial
 
     ph0 = _default_value_if_no_key(opts, "ph0", 0)
     to_1 = _default_value_if_no_key(opts, "to_1", True)
-    ph = ph0
-
-    for i_f, f in enumerate(frequency_derivatives):
-        ph += 1 / np.math.factorial(i_f + 1) * times**(i_f + 1) * f
+    double_double = _default_value_if_no_key(opts, "double_double", None)
+
+    times = np.asarray(times)
+    if double_double is None:
+        double_double = HAS_NUMBA and times.dtype == np.longdouble and \
+            np.finfo(np.longdouble).eps < np.finfo(np.double).eps
+
+    # The coefficients of the phase polynomial, f^(n - 1) / n!
+    coefficients = [np.longdouble(f) / factorial(i_f + 1)
+                    for i_f, f in enumerate(frequency_derivatives)]
+    if len(coefficients) == 0:
+        ph = np.zeros(times.shape) + ph0
+    elif double_double:
+        ph = _pulse_phase_double_double(times, np.array(coefficients), ph0,
+                                        to_1)
+        return ph[()] if ph.ndim == 0 else ph
+    else:
+        coefficients = np.array(coefficients,
+                                dtype=np.result_type(times, np.double))
+        ph = coefficients[-1] * times
+        for coeff in coefficients[-2::-1]:
+            ph += coeff
+            ph *= times
+        ph += ph0
 
     if to_1:
         ph -= np.floor(ph)
-    return ph
+    return ph[()] if ph.ndim == 0 else ph
+
+
+def _fractional_coverage(fractions, nbin):
+    '''Exposure of each profile bin over the phase intervals ``[0, frac)``.
+
+    Parameters
+    ----------
+    fractions : array of floats, shape ``(nrows, nint)``
+        Fractional phases, between 0 and 1
+
+    Returns
+    -------
+    coverage : array of floats, shape ``(nrows, nbin)``
+        For each row, the sum over the ``nint`` intervals ``[0, frac)`` of the
+        length covered inside each profile bin
+    '''
+    nrows = fractions.shape[0]
+    binw = 1 / nbin
+    bins = np.minimum((fractions * nbin).astype(np.int64), nbin - 1)
+    # Bin the fractions of all rows at once, offsetting the bin index of
+    # each row by nbin
+    idx = (bins + nbin * np.arange(nrows)[:, np.newaxis]).ravel()
+    counts = np.bincount(idx, minlength=nrows * nbin).reshape(nrows, nbin)
+    partial = np.bincount(idx, weights=(fractions - bins * binw).ravel(),
+                          minlength=nrows * nbin).reshape(nrows, nbin)
+    # Each interval covers completely all bins before the one containing
+    # its end, and partially this last one
+    above = np.cumsum(counts[:, ::-1], axis=1)[:, ::-1] - counts
+    return above * binw + partial
 
 
 def phase_exposure(start_time, stop_time, period, nbin=16, gtis=None):
     '''
     Calculate the exposure on each phase of a pulse profile.
 
+    The exposure is calculated for all GTIs at once, from the cumulative phase
+    coverage of their start and stop times: each GTI contributes the number of
+    whole pulse cycles it contains, plus the difference between the bin
+    coverages of the fractional phases of its stop and start.
+
     Parameters
     ----------
     start_time, stop_time : float
         Starting and stopping time (or phase if ``period``==1)
-    period : float
-        The pulse period (if 1, equivalent to phases)
+    period : float or array of floats
+        The pulse period (if 1, equivalent to phases). If an array of trial
+        periods is given, the exposures for all of them are calculated in a
+        single call.
 
     Returns
     -------
     expo : array of floats
         The normalized exposure of each bin in the pulse profile (1 is the
-        highest exposure, 0 the lowest)
+        highest exposure, 0 the lowest). Bins with no exposure, e.g. when the
+        period is longer than the observation, are 0; if no bin is exposed at
+        all, all of them are 0. If ``period`` is an array, the
+        result has shape ``(len(period), nbin)``, one profile per period.
 
     Other parameters
     ----------------
@@ -86,6 +300,15 @@ def phase_exposure(start_time, stop_time, period, nbin=16, gtis=None):
         The number of bins in the profile
     gtis : [[gti0_0, gti0_1], [gti1_0, gti1_1], ...], optional, default None
         Good Time Intervals
+
+    Examples
+    --------
+    >>> expo = phase_exposure(0, 0.5, 1, nbin=4)
+    >>> np.allclose(expo, [1, 1, 0, 0])
+    True
+    >>> expo = phase_exposure(0, 1.5, np.array([1, 3]), nbin=2)
+    >>> np.allclose(expo, [[1, 0.5], [1, 0]])
+    True
     '''
     if gtis is None:
         gtis = np.array([[start_time, stop_time]])
@@ -93,59 +316,36 @@ def phase_exposure(start_time, stop_time, period, nbin=16, gtis=None):
     # Use precise floating points -------------
     start_time = np.longdouble(start_time)
     stop_time = np.longdouble(stop_time)
-    period = np.longdouble(period)
-    gtis = np.array(gtis, dtype=np.longdouble)
+    period = np.asarray(period, dtype=np.longdouble)
+    gtis = np.array(gtis, dtype=np.longdouble).reshape((-1, 2))
     # -----------------------------------------
 
-    expo = np.zeros(nbin)
-    phs = np.linspace(0, 1, nbin + 1)
-    phs = np.array(list(zip(phs[0:-1], phs[1:])))
-
-    # Discard gtis outside [start, stop]
+    # Discard gtis outside [start, stop], and cut the others to this interval
     good = np.logical_and(gtis[:, 0] < stop_time, gtis[:, 1] > start_time)
-    gtis = gtis[good]
-
-    for g in gtis:
-        g0 = g[0]
-        g1 = g[1]
-        if g0 < start_time:
-            # If the start of the fold is inside a gti, start from there
-            g0 = start_time
-        if g1 > stop_time:
-            # If the end of the fold is inside a gti, end there
-            g1 = stop_time
-        length = g1 - g0
-        # How many periods inside this length?
-        nraw = length / period
-        # How many integer periods?
-        nper = nraw.astype(int)
-
-        # First raw exposure: the number of periods
-        expo += nper / nbin
-
-        # FRACTIONAL PART =================
-        # What remains is additional exposure for part of the profile.
-        start_phase = np.fmod(g0 / period, 1)
-        end_phase = nraw - nper + start_phase
-
-        limits = [[start_phase, end_phase]]
-        # start_phase is always < 1. end_phase not always. In this case...
-        if end_phase > 1:
-            limits = [[0, end_phase - 1], [start_phase, 1]]
-
-        for l in limits:
-            l0 = l[0]
-            l1 = l[1]
-            # Discards bins untouched by these limits
-            goodbins = np.logical_and(phs[:, 0] <= l1, phs[:, 1] >= l0)
-            idxs = np.arange(len(phs), dtype=int)[goodbins]
-            for i in idxs:
-                start = max([phs[i, 0], l0])
-                stop = min([phs[i, 1], l1])
-                w = stop - start
-                expo[i] += w
-
-    return expo / np.max(expo)
+    gtis = np.clip(gtis[good], start_time, stop_time)
+
+    periods = period.reshape((-1, 1))
+    start_phases = gtis[:, 0] / periods
+    stop_phases = gtis[:, 1] / periods
+
+    # Whole cycles, counted in longdouble before the fractional phases lose
+    # precision in double
+    start_cycles = np.floor(start_phases)
+    stop_cycles = np.floor(stop_phases)
+    ncycles = np.sum(stop_cycles - start_cycles, axis=1).astype(np.double)
+
+    expo = ncycles[:, np.newaxis] / nbin + \
+        _fractional_coverage((stop_phases - stop_cycles).astype(np.double),
+                             nbin) - \
+        _fractional_coverage((start_phases - start_cycles).astype(np.double),
+                             nbin)
+
+    # Bins with no exposure stay at zero, also when no bin is exposed
+    max_expo = np.max(expo, axis=1)[:, np.newaxis]
+    expo /= np.where(max_expo > 0, max_expo, 1)
+    if period.ndim == 0:
+        return expo[0]
+    return expo
 
 
 def fold_events(times, *frequency_derivatives, **opts):
@@ -179,7 +379,7 @@ def fold_events(times, *frequency_derivatives, **opts):
         Reference time for the timing solution
     expocorr : bool, default False
         Correct each bin for exposure (use when the period of the pulsar is
-        comparable to that of GTIs)
+        comparable to that of GTIs). Bins with no exposure are left at zero
 
     '''
     nbin = _default_value_if_no_key(opts, "nbin", 16)
@@ -214,6 +414,8 @@ def fold_events(times, *frequency_derivatives, **opts):
     if expocorr:
         expo_norm = phase_exposure(start_phase, stop_phase, 1, nbin,
                                    gtis=gti_phases)
+        # No events can fall in bins with no exposure: leave them at zero
+        expo_norm[expo_norm == 0] = 1
         simon("For exposure != 1, the uncertainty might be incorrect")
     else:
         expo_norm = 1
@@ -1,26 +1,55 @@
 from __future__ import division, print_function
+import multiprocessing
 import numpy as np
-from .pulsar import stat, fold_events, z_n, pulse_phase
+from .pulsar import stat, fold_events, z_n, pulse_phase, phase_exposure
 from ..utils import jit, HAS_NUMBA
 from ..utils import contiguous_regions
+from ..utils import simon
 from astropy.stats import poisson_conf_interval
 
 
-__all__ = ['epoch_folding_search', 'z_n_search', 'search_best_peaks',
+__all__ = ['epoch_folding_search', 'z_n_search', 'semicoherent_z_n_search',
+           'ffa_search', 'search_best_peaks', 'search_best_peaks_2d',
            'plot_profile', 'plot_phaseogram', 'phaseogram']
 
 
 @jit(nopython=True)
-def _pulse_phase_fast(time, f, buffer_array):
+def _pulse_phase_fast(time, f, buffer_array, offsets=None):
     for i in range(len(time)):
         buffer_array[i] = time[i] * f
+        if offsets is not None:
+            buffer_array[i] += offsets[i]
         buffer_array[i] -= np.floor(buffer_array[i])
     return buffer_array
 
 
-def _folding_search(stat_func, times, frequencies, segment_size=5000):
-    stats = np.zeros_like(frequencies)
-    times = (times - times[0]).astype(np.float64)
+def _add_segment_stats(stat_func, ts, frequencies, stats, fused=False,
+                       expo=None, offsets=None):
+    """Add the statistics of a segment to ``stats``, for all frequencies.
+
+    ``offsets`` are phases to add to those of each event, if any.
+    """
+    if fused:
+        # stat_func folds and calculates the statistics for all
+        # frequencies at once
+        stat_func(ts, frequencies, stats, offsets)
+        return stats
+    buffer = np.zeros_like(ts)
+    for i, f in enumerate(frequencies):
+        phases = _pulse_phase_fast(ts, f, buffer, offsets)
+        if expo is not None:
+            stats[i] += stat_func(phases, expo[i])
+        else:
+            stats[i] += stat_func(phases)
+    return stats
+
+
+def _folding_search_stats(stat_func, times, frequencies, segment_size=5000,
+                          expocorr=False, nbin=128, fused=False, fdots=None):
+    if fdots is None:
+        stats = np.zeros_like(frequencies)
+    else:
+        stats = np.zeros((len(fdots), len(frequencies)))
     length = times[-1]
     if length < segment_size:
         segment_size = length
@@ -28,14 +57,93 @@ def _folding_search(stat_func, times, frequencies, segment_size=5000):
     count = 0
     for s in start_times:
         ts = times[(times >=s) & (times < s + segment_size)]
-        buffer = np.zeros_like(ts)
         if len(ts) < 1 or ts[-1] - ts[0] < 0.2 * segment_size:
             continue
-        for i, f in enumerate(frequencies):
-            phases = _pulse_phase_fast(ts, f, buffer)
-            stats[i] += stat_func(phases)
         count += 1
-    return frequencies, stats / count
+        if fdots is not None:
+            # The t^2 / 2 term of the phases is calculated once, and the
+            # phase offsets due to each fdot are shared by all frequencies
+            half_t2 = 0.5 * ts ** 2
+            for k, fdot in enumerate(fdots):
+                offsets = half_t2 * fdot
+                offsets -= np.floor(offsets)
+                _add_segment_stats(stat_func, ts, frequencies, stats[k],
+                                   fused=fused, offsets=offsets)
+            continue
+        expo = None
+        if expocorr:
+            # The exposure profiles of this segment for all trial
+            # frequencies, in a single batched call
+            expo = phase_exposure(s, min(s + segment_size, length),
+                                  1 / np.asarray(frequencies), nbin=nbin)
+            # Empty bins with no exposure are left uncorrected
+            expo[expo == 0] = 1
+        _add_segment_stats(stat_func, ts, frequencies, stats, fused=fused,
+                           expo=expo)
+    return stats / count
+
+
+# Arguments of the parallel searches, inherited by the worker processes
+_worker_args = {}
+
+
+def _init_folding_worker(stat_func, times, kwargs):
+    _worker_args['stat_func'] = stat_func
+    _worker_args['times'] = times
+    _worker_args['kwargs'] = kwargs
+
+
+def _folding_worker(frequencies):
+    return _folding_search_stats(_worker_args['stat_func'],
+                                 _worker_args['times'], frequencies,
+                                 **_worker_args['kwargs'])
+
+
+def _number_of_jobs(n_jobs, ntrials):
+    """Number of processes to use for ``ntrials`` trials.
+
+    Negative values count backwards from the number of CPUs, as in
+    ``n_jobs=-1`` for all CPUs.
+    """
+    if n_jobs < 0:
+        n_jobs = max(multiprocessing.cpu_count() + 1 + n_jobs, 1)
+    return max(min(n_jobs, ntrials), 1)
+
+
+def _folding_search(stat_func, times, frequencies, segment_size=5000,
+                    expocorr=False, nbin=128, n_jobs=1, fused=False,
+                    fdots=None):
+    times = (times - times[0]).astype(np.float64)
+    kwargs = {"segment_size": segment_size, "expocorr": expocorr,
+              "nbin": nbin, "fused": fused, "fdots": fdots}
+
+    n_jobs = _number_of_jobs(n_jobs, len(frequencies))
+    if n_jobs > 1:
+        try:
+            # Forked workers share the time array with the parent and do not
+            # need to pickle the statistics function
+            context = multiprocessing.get_context('fork')
+        except (AttributeError, ValueError):  # pragma: no cover
+            simon("Parallel searches need the fork start method of "
+                  "multiprocessing. Running the search serially")
+            n_jobs = 1
+
+    if n_jobs == 1:
+        return frequencies, _folding_search_stats(stat_func, times,
+                                                  frequencies, **kwargs)
+
+    # Each process searches a contiguous block of trial frequencies, over
+    # all segments in the same order as in the serial search. This makes
+    # the results identical to the serial ones
+    chunks = np.array_split(np.asarray(frequencies), n_jobs)
+    pool = context.Pool(n_jobs, initializer=_init_folding_worker,
+                        initargs=(stat_func, times, kwargs))
+    try:
+        stats = pool.map(_folding_worker, chunks)
+    finally:
+        pool.close()
+        pool.join()
+    return frequencies, np.concatenate(stats, axis=-1)
 
 
 @jit(nopython=True)
@@ -57,8 +165,218 @@ def _profile_fast(phase, nbin=128):
     return bc
 
 
+@jit(nopython=True)
+def _fold_profile_fast(times, f, profile, offsets=None):
+    """Fold the events at frequency ``f`` in one pass, into ``profile``.
+
+    ``offsets``, if any, are phases to add to those of each event.
+    """
+    nbin = len(profile)
+    for i in range(nbin):
+        profile[i] = 0
+    for i in range(len(times)):
+        phase = times[i] * f
+        if offsets is not None:
+            phase += offsets[i]
+        phase -= np.floor(phase)
+        profile[np.int64(phase * nbin)] += 1
+    return profile
+
+
+@jit(nopython=True)
+def _stat_fast(profile):
+    """Epoch folding statistics of a profile, as `stat` with no errors."""
+    nbin = len(profile)
+    mean = 0.
+    for i in range(nbin):
+        mean += profile[i]
+    mean /= nbin
+    if mean == 0:
+        return 0.
+    total = 0.
+    for i in range(nbin):
+        total += (profile[i] - mean) ** 2
+    return total / mean
+
+
+@jit(nopython=True)
+def _z_n_fast(profile, cos_table, sin_table):
+    """Z^2_n statistics of a profile, as `z_n` with the profile as norm.
+
+    ``cos_table`` and ``sin_table`` contain the cosines and sines of the
+    phases of the bins for each harmonic, with shape ``(nharm, nbin)``.
+    """
+    nbin = len(profile)
+    total_norm = 0.
+    for i in range(nbin):
+        total_norm += profile[i]
+    if total_norm == 0:
+        return 0.
+    z2 = 0.
+    for k in range(cos_table.shape[0]):
+        cos_sum = 0.
+        sin_sum = 0.
+        for i in range(nbin):
+            cos_sum += cos_table[k, i] * profile[i]
+            sin_sum += sin_table[k, i] * profile[i]
+        z2 += cos_sum ** 2 + sin_sum ** 2
+    return 2 / total_norm * z2
+
+
+@jit(nopython=True)
+def _epoch_folding_segment_fast(times, frequencies, nbin, stats,
+                                offsets=None):
+    """Add the epoch folding statistics of a segment for all frequencies."""
+    profile = np.zeros(nbin)
+    for i in range(len(frequencies)):
+        _fold_profile_fast(times, frequencies[i], profile, offsets)
+        stats[i] += _stat_fast(profile)
+    return stats
+
+
+@jit(nopython=True)
+def _z_n_segment_fast(times, frequencies, cos_table, sin_table, stats,
+                      offsets=None):
+    """Add the Z^2_n statistics of a segment for all frequencies."""
+    profile = np.zeros(cos_table.shape[1])
+    for i in range(len(frequencies)):
+        _fold_profile_fast(times, frequencies[i], profile, offsets)
+        stats[i] += _z_n_fast(profile, cos_table, sin_table)
+    return stats
+
+
+@jit(nopython=True)
+def _z_n_events_fast(times, f, cos_sums, sin_sums, offsets=None):
+    """Z^2_n statistics of the events folded at frequency ``f``.
+
+    The sums of the cosines and sines of all harmonics are accumulated in
+    ``cos_sums`` and ``sin_sums``, whose length is the number of harmonics.
+    Only the first harmonic of each phase is calculated with trigonometric
+    functions, the following ones with the angle addition formulas.
+    ``offsets``, if any, are phases to add to those of each event.
+    """
+    nharm = len(cos_sums)
+    for k in range(nharm):
+        cos_sums[k] = 0
+        sin_sums[k] = 0
+    for i in range(len(times)):
+        phase = times[i] * f
+        if offsets is not None:
+            phase += offsets[i]
+        phase -= np.floor(phase)
+        cos_1 = np.cos(2 * np.pi * phase)
+        sin_1 = np.sin(2 * np.pi * phase)
+        cos_k = cos_1
+        sin_k = sin_1
+        for k in range(nharm):
+            cos_sums[k] += cos_k
+            sin_sums[k] += sin_k
+            cos_k, sin_k = \
+                cos_k * cos_1 - sin_k * sin_1, sin_k * cos_1 + cos_k * sin_1
+    z2 = 0.
+    for k in range(nharm):
+        z2 += cos_sums[k] ** 2 + sin_sums[k] ** 2
+    return 2 / len(times) * z2
+
+
+@jit(nopython=True)
+def _z_n_events_segment_fast(times, frequencies, nharm, stats,
+                             offsets=None):
+    """Add the exact Z^2_n statistics of a segment for all frequencies."""
+    cos_sums = np.zeros(nharm)
+    sin_sums = np.zeros(nharm)
+    for i in range(len(frequencies)):
+        stats[i] += _z_n_events_fast(times, frequencies[i], cos_sums,
+                                     sin_sums, offsets)
+    return stats
+
+
+# Number of trial frequencies whose harmonic sums are accumulated together
+_GRID_BLOCK = 4096
+# The phases are recalculated exactly every this many trial frequencies
+_GRID_RESEED = 256
+
+
+@jit(nopython=True)
+def _z_n_events_grid_segment_fast(times, frequencies, df, nharm, stats,
+                                  offsets=None):
+    """Add the exact Z^2_n statistics of a segment for all frequencies.
+
+    Same as `_z_n_events_segment_fast`, for equally spaced ``frequencies``
+    with step ``df``. For each event, the first harmonic at a trial frequency
+    is obtained from the one at the previous frequency by a rotation of
+    ``2 pi t df``. The phases are recalculated exactly every
+    ``_GRID_RESEED`` frequencies, to stop the accumulation of rounding errors.
+    """
+    nfreq = len(frequencies)
+    cos_sums = np.zeros((_GRID_BLOCK, nharm))
+    sin_sums = np.zeros((_GRID_BLOCK, nharm))
+    for block_start in range(0, nfreq, _GRID_BLOCK):
+        block_stop = min(block_start + _GRID_BLOCK, nfreq)
+        cos_sums[:] = 0
+        sin_sums[:] = 0
+        for i in range(len(times)):
+            t = times[i]
+            step = t * df
+            step -= np.floor(step)
+            cos_step = np.cos(2 * np.pi * step)
+            sin_step = np.sin(2 * np.pi * step)
+            cos_1 = 0.
+            sin_1 = 0.
+            for j in range(block_start, block_stop):
+                if (j - block_start) % _GRID_RESEED == 0:
+                    phase = t * frequencies[j]
+                    if offsets is not None:
+                        phase += offsets[i]
+                    phase -= np.floor(phase)
+                    cos_1 = np.cos(2 * np.pi * phase)
+                    sin_1 = np.sin(2 * np.pi * phase)
+                else:
+                    cos_1, sin_1 = cos_1 * cos_step - sin_1 * sin_step, \
+                        sin_1 * cos_step + cos_1 * sin_step
+                cos_k = cos_1
+                sin_k = sin_1
+                jb = j - block_start
+                for k in range(nharm):
+                    cos_sums[jb, k] += cos_k
+                    sin_sums[jb, k] += sin_k
+                    cos_k, sin_k = cos_k * cos_1 - sin_k * sin_1, \
+                        sin_k * cos_1 + cos_k * sin_1
+        for j in range(block_start, block_stop):
+            z2 = 0.
+            for k in range(nharm):
+                z2 += cos_sums[j - block_start, k] ** 2 + \
+                    sin_sums[j - block_start, k] ** 2
+            stats[j] += 2 / len(times) * z2
+    return stats
+
+
+def _frequency_step(frequencies, rtol=1e-9):
+    """Step of an equally spaced frequency grid, or None if not equally
+    spaced."""
+    if len(frequencies) < 2:
+        return None
+    df = (frequencies[-1] - frequencies[0]) / (len(frequencies) - 1)
+    if df == 0 or \
+            np.any(np.abs(np.diff(frequencies) - df) > rtol * np.abs(df)):
+        return None
+    return df
+
+
+def _grid_search(stat_func, times, frequencies, fdots=None, **kwargs):
+    """Run `_folding_search`, on a (frequency, fdot) grid if fdots are given.
+    """
+    if fdots is None:
+        return _folding_search(stat_func, times, frequencies, **kwargs)
+    fdots = np.atleast_1d(np.asarray(fdots, dtype=np.float64))
+    _, stats = _folding_search(stat_func, times, frequencies, fdots=fdots,
+                               **kwargs)
+    fgrid, fdgrid = np.meshgrid(frequencies, fdots)
+    return fgrid, fdgrid, stats
+
+
 def epoch_folding_search(times, frequencies, nbin=128, segment_size=5000,
-                         expocorr=False):
+                         expocorr=False, n_jobs=1, fdots=None):
     """Performs epoch folding at trial frequencies in photon data.
 
     If no exposure correction is needed and numba is installed, it uses a fast
@@ -74,6 +392,17 @@ def epoch_folding_search(times, frequencies, nbin=128, segment_size=5000,
     frequencies : array-like
         the trial values for the frequencies
 
+    Returns
+    -------
+    frequencies : array of floats
+        the trial frequencies. If ``fdots`` is given, the ``(len(fdots),
+        len(frequencies))`` grid of trial frequencies
+    fdots : array of floats
+        only if ``fdots`` is given: the grid of trial frequency derivatives,
+        with the same shape as the grid of frequencies
+    stats : array of floats
+        the epoch folding statistics, for each trial
+
     Other Parameters
     ----------------
     nbin : int
@@ -82,21 +411,41 @@ def epoch_folding_search(times, frequencies, nbin=128, segment_size=5000,
         the length of the segments to be averaged in the periodogram
     expocorr : bool
         correct for the exposure (Use it if the period is comparable to the
-        length of the good time intervals.)
+        length of the good time intervals.) Not available with ``fdots``
+    n_jobs : int
+        the number of processes searching the trial frequencies in parallel.
+        If negative, it counts backwards from the number of CPUs (-1 means
+        all CPUs). The results are identical to those of the serial search
+    fdots : array-like
+        the trial values for the first derivative of the frequency. If given,
+        the search is done on the 2-D grid of all frequencies and all
+        frequency derivatives, referred to the time of the first event
     """
-    if expocorr or not HAS_NUMBA:
-        return \
-            _folding_search(lambda x: stat(fold_events(np.sort(x), 1,
-                                                       nbin=nbin,
-                                                       expocorr=expocorr)[1]),
-                               times, frequencies, segment_size=segment_size)
+    if expocorr and fdots is not None:
+        raise ValueError("Exposure correction is not available in searches "
+                         "over frequency derivatives")
+    if expocorr:
+        return _grid_search(
+            lambda x, expo: stat(fold_events(np.sort(x), 1, nbin=nbin)[1] /
+                                 expo),
+            times, frequencies, segment_size=segment_size, expocorr=True,
+            nbin=nbin, n_jobs=n_jobs)
+    if not HAS_NUMBA:
+        return _grid_search(
+            lambda x: stat(fold_events(np.sort(x), 1, nbin=nbin)[1]),
+            times, frequencies, fdots=fdots, segment_size=segment_size,
+            n_jobs=n_jobs)
 
-    return _folding_search(lambda x: stat(_profile_fast(x, nbin=nbin)),
-                           times, frequencies, segment_size=segment_size)
+    frequencies = np.asarray(frequencies, dtype=np.float64)
+    return _grid_search(
+        lambda ts, freqs, stats, offsets: _epoch_folding_segment_fast(
+            ts, freqs, nbin, stats, offsets),
+        times, frequencies, fdots=fdots, segment_size=segment_size,
+        n_jobs=n_jobs, fused=True)
 
 
 def z_n_search(times, frequencies, nharm=4, nbin=128, segment_size=5000,
-               expocorr=False):
+               expocorr=False, n_jobs=1, exact=False, fdots=None):
     """Calculates the Z^2_n statistics at trial frequencies in photon data.
 
     The "real" Z^2_n statistics is very slow. Therefore, in this function data
@@ -108,6 +457,10 @@ def z_n_search(times, frequencies, nharm=4, nbin=128, segment_size=5000,
     If no exposure correction is needed and numba is installed, it uses a fast
     algorithm to perform the folding. Otherwise, it runs a *much* slower
     algorithm, which however yields a more precise result.
+    With ``exact=True``, the statistics is instead calculated from the phases
+    of the single events, with no binning. With numba, this needs only one
+    sine and cosine per event and trial: the higher harmonics are obtained
+    from the first one with the angle addition formulas.
     The search can be done in segments and the results averaged. Use
     segment_size to control this
 
@@ -118,6 +471,17 @@ def z_n_search(times, frequencies, nharm=4, nbin=128, segment_size=5000,
     frequencies : array-like
         the trial values for the frequencies
 
+    Returns
+    -------
+    frequencies : array of floats
+        the trial frequencies. If ``fdots`` is given, the ``(len(fdots),
+        len(frequencies))`` grid of trial frequencies
+    fdots : array of floats
+        only if ``fdots`` is given: the grid of trial frequency derivatives,
+        with the same shape as the grid of frequencies
+    stats : array of floats
+        the Z^2_n statistics, for each trial
+
     Other Parameters
     ----------------
     nbin : int
@@ -126,20 +490,350 @@ def z_n_search(times, frequencies, nharm=4, nbin=128, segment_size=5000,
         the length of the segments to be averaged in the periodogram
     expocorr : bool
         correct for the exposure (Use it if the period is comparable to the
-        length of the good time intervals.)
+        length of the good time intervals.) Not available with ``fdots``
+    n_jobs : int
+        the number of processes searching the trial frequencies in parallel.
+        If negative, it counts backwards from the number of CPUs (-1 means
+        all CPUs). The results are identical to those of the serial search
+    exact : bool
+        calculate the statistics from the event phases, instead of the folded
+        profiles. ``nbin`` is ignored. Incompatible with ``expocorr``
+    fdots : array-like
+        the trial values for the first derivative of the frequency. If given,
+        the search is done on the 2-D grid of all frequencies and all
+        frequency derivatives, referred to the time of the first event
     """
+    if expocorr and fdots is not None:
+        raise ValueError("Exposure correction is not available in searches "
+                         "over frequency derivatives")
+    if exact:
+        if expocorr:
+            raise ValueError("The exact Z^2_n search does not support "
+                             "exposure correction")
+        if not HAS_NUMBA:
+            return _grid_search(lambda x: z_n(x, n=nharm), times,
+                                frequencies, fdots=fdots,
+                                segment_size=segment_size, n_jobs=n_jobs)
+        frequencies = np.asarray(frequencies, dtype=np.float64)
+        df = _frequency_step(frequencies)
+        if df is None:
+            segment_func = \
+                lambda ts, freqs, stats, offsets: _z_n_events_segment_fast(
+                    ts, freqs, nharm, stats, offsets)
+        else:
+            segment_func = \
+                lambda ts, freqs, stats, offsets: \
+                _z_n_events_grid_segment_fast(ts, freqs, df, nharm, stats,
+                                              offsets)
+        return _grid_search(segment_func, times, frequencies, fdots=fdots,
+                            segment_size=segment_size, n_jobs=n_jobs,
+                            fused=True)
+
     phase = np.arange(0, 1, 1 / nbin)
-    if expocorr or not HAS_NUMBA:
-        return \
-            _folding_search(
-                lambda x: z_n(phase, n=nharm,
-                              norm=fold_events(np.sort(x), 1, nbin=nbin,
-                                               expocorr=expocorr)[1]),
-                               times, frequencies, segment_size=segment_size)
+    if expocorr:
+        return _grid_search(
+            lambda x, expo: z_n(phase, n=nharm,
+                                norm=fold_events(np.sort(x), 1,
+                                                 nbin=nbin)[1] / expo),
+            times, frequencies, segment_size=segment_size, expocorr=True,
+            nbin=nbin, n_jobs=n_jobs)
+    if not HAS_NUMBA:
+        return _grid_search(
+            lambda x: z_n(phase, n=nharm,
+                          norm=fold_events(np.sort(x), 1, nbin=nbin)[1]),
+            times, frequencies, fdots=fdots, segment_size=segment_size,
+            n_jobs=n_jobs)
 
-    return _folding_search(lambda x: z_n(phase, n=nharm,
-                                         norm=_profile_fast(x, nbin=nbin)),
-                           times, frequencies, segment_size=segment_size)
+    frequencies = np.asarray(frequencies, dtype=np.float64)
+    harmonic_phases = np.arange(1, nharm + 1)[:, np.newaxis] * \
+        (phase * 2 * np.pi)
+    cos_table = np.cos(harmonic_phases)
+    sin_table = np.sin(harmonic_phases)
+    return _grid_search(
+        lambda ts, freqs, stats, offsets: _z_n_segment_fast(
+            ts, freqs, cos_table, sin_table, stats, offsets),
+        times, frequencies, fdots=fdots, segment_size=segment_size,
+        n_jobs=n_jobs, fused=True)
+
+
+@jit(nopython=True)
+def _segment_harmonic_sums(times, segment_index, references, f0, df, nharm,
+                           sums):
+    """Complex sums of the harmonics of the events of each segment.
+
+    ``sums[j, c, k]`` is incremented by ``exp(2 pi i (k + 1) f (t - r))`` for
+    each event at time ``t`` in segment ``j``, with reference time ``r``,
+    for the frequencies ``f = f0 + c * df``. As in
+    `_z_n_events_grid_segment_fast`, the first harmonic is rotated from one
+    frequency to the next, and recalculated exactly every ``_GRID_RESEED``
+    frequencies.
+    """
+    nfreq = sums.shape[1]
+    for i in range(len(times)):
+        j = segment_index[i]
+        t = times[i] - references[j]
+        step_phase = t * df
+        step_phase -= np.floor(step_phase)
+        step = np.cos(2 * np.pi * step_phase) + \
+            1j * np.sin(2 * np.pi * step_phase)
+        first = 0j
+        for c in range(nfreq):
+            if c % _GRID_RESEED == 0:
+                phase = t * (f0 + c * df)
+                phase -= np.floor(phase)
+                first = np.cos(2 * np.pi * phase) + \
+                    1j * np.sin(2 * np.pi * phase)
+            else:
+                first *= step
+            harmonic = first
+            for k in range(nharm):
+                sums[j, c, k] += harmonic
+                harmonic *= first
+    return sums
+
+
+def semicoherent_z_n_search(times, frequencies, fdots=None, nharm=4,
+                            segment_size=5000, oversample=4):
+    """Z^2_n search stacking phase-coherently the harmonic sums of segments.
+
+    The observation is cut in segments of length ``segment_size``. For each
+    segment, the complex sums of the harmonics of the event phases,
+    ``sum(exp(2 pi i k f (t - r)))`` with ``r`` the center of the segment, are
+    calculated once on a coarse grid of frequencies, with a step of
+    ``1 / (oversample * segment_size)``. For each trial frequency and
+    frequency derivative, the sums of all segments are then combined
+    coherently: each segment uses the sums at the coarse frequency closest
+    to the local frequency ``f + fdot * r``, rotated by the phase of the
+    model at ``r``.
+
+    This way, the events are only processed once, on the coarse grid, and
+    the cost of the search over a fine grid of frequencies and frequency
+    derivatives is dominated by operations on the (small) arrays of sums.
+    Unlike the averaging of independent segments in `z_n_search`, all the
+    events are stacked coherently. The approximations are in the frequency
+    within each segment: the frequency derivative within a segment is
+    neglected, and the frequency is rounded to the coarse grid, which shifts
+    the phases at the borders of the segment by at most
+    ``1 / (4 * oversample)`` cycles in the first harmonic.
+
+    Parameters
+    ----------
+    times : array-like
+        the event arrival times
+    frequencies : array-like
+        the trial values for the frequencies
+
+    Returns
+    -------
+    frequencies : array of floats
+        the trial frequencies. If ``fdots`` is given, the ``(len(fdots),
+        len(frequencies))`` grid of trial frequencies
+    fdots : array of floats
+        only if ``fdots`` is given: the grid of trial frequency derivatives,
+        with the same shape as the grid of frequencies
+    stats : array of floats
+        the Z^2_n statistics, for each trial
+
+    Other Parameters
+    ----------------
+    fdots : array-like
+        the trial values for the first derivative of the frequency, referred
+        to the time of the first event
+    nharm : int
+        the number of harmonics of the Z^2_n statistics
+    segment_size : float
+        the length of the segments
+    oversample : float
+        the oversampling of the coarse grid of frequencies of the segments,
+        with respect to their Fourier resolution ``1 / segment_size``
+    """
+    times = np.asarray(times)
+    times = (times - times[0]).astype(np.float64)
+    frequencies = np.asarray(frequencies, dtype=np.float64)
+    search_fdots = np.zeros(1) if fdots is None else \
+        np.atleast_1d(np.asarray(fdots, dtype=np.float64))
+
+    segment_index = np.floor(times / segment_size).astype(np.int64)
+    segments, segment_index = np.unique(segment_index, return_inverse=True)
+    references = (segments + 0.5) * segment_size
+
+    # The coarse grid covers all the local frequencies in the segments
+    df = 1 / (oversample * segment_size)
+    drifts = np.outer(search_fdots, references)
+    f0 = np.min(frequencies) + np.min(drifts)
+    nfreq = int(np.ceil((np.max(frequencies) + np.max(drifts) - f0) / df)) + 1
+
+    sums = np.zeros((len(segments), nfreq, nharm), dtype=np.complex128)
+    _segment_harmonic_sums(times, segment_index, references, f0, df, nharm,
+                           sums)
+
+    harmonics = np.arange(1, nharm + 1)
+    segment_numbers = np.arange(len(segments))
+    # Limit the size of the temporary arrays of the combination
+    chunk = max(2 ** 20 // (len(segments) * nharm), 1)
+    stats = np.zeros((len(search_fdots), len(frequencies)))
+    for i, fdot in enumerate(search_fdots):
+        for start in range(0, len(frequencies), chunk):
+            freqs = frequencies[start:start + chunk, np.newaxis]
+            local_freqs = freqs + fdot * references
+            coarse = np.rint((local_freqs - f0) / df).astype(np.int64)
+            phases = freqs * references + 0.5 * fdot * references ** 2
+            phases -= np.floor(phases)
+            rotations = np.exp(2j * np.pi * phases[:, :, np.newaxis] *
+                               harmonics)
+            harmonic_sums = np.sum(
+                rotations * sums[segment_numbers, coarse, :], axis=1)
+            stats[i, start:start + chunk] = \
+                2 / len(times) * np.sum(np.abs(harmonic_sums) ** 2, axis=1)
+
+    if fdots is None:
+        return frequencies, stats[0]
+    fgrid, fdgrid = np.meshgrid(frequencies, search_fdots)
+    return fgrid, fdgrid, stats
+
+
+def _ffa(data):
+    """Fast Folding Algorithm on a time series cut in ``m`` rows.
+
+    Parameters
+    ----------
+    data : array of shape ``(m, p)``
+        The time series, in rows of ``p`` bins. ``m`` must be a power of 2
+
+    Returns
+    -------
+    profiles : array of shape ``(m, p)``
+        The profile ``s`` is the sum of the rows, each shifted so that the
+        total shift across the ``m`` rows is ``s`` bins. This corresponds to
+        folding with a period of ``p + s / (m - 1)`` bins
+
+    Notes
+    -----
+    The profiles of the two halves of each block of rows are combined two
+    at a time: the profile with drift ``s`` of a block is the sum of the
+    profiles with drift ``s // 2`` of its halves, the second one shifted by
+    ``s - s // 2`` bins (Staelin 1969). This takes ``O(m p log m)`` operations
+    instead of ``O(m^2 p)``.
+    """
+    m, p = data.shape
+    # The profiles of blocks of n rows, for all n drifts: (m / n, n, p)
+    profiles = data[:, np.newaxis, :]
+    columns = np.arange(p)
+    n = 1
+    while n < m:
+        first = profiles[0::2]
+        second = profiles[1::2]
+        drifts = np.arange(2 * n)
+        half_drifts = drifts // 2
+        shifts = (columns + (drifts - half_drifts)[:, np.newaxis]) % p
+        profiles = first[:, half_drifts, :] + \
+            second[:, half_drifts[:, np.newaxis], shifts]
+        n *= 2
+    return profiles[0]
+
+
+def _ffa_base_period_stats(counts, p):
+    """Epoch folding statistics for periods between ``p`` and ``p + 1`` bins.
+
+    The light curve is cut in rows of ``p`` bins, padded with empty rows to a
+    power of 2, and folded with the FFA.
+    """
+    nrows = len(counts) // p
+    nrows_ffa = 2 ** int(np.ceil(np.log2(nrows)))
+    data = np.zeros((nrows_ffa, p))
+    data[:nrows] = counts[:nrows * p].reshape((nrows, p))
+
+    # The last profile has the same period as the first of p + 1 bins
+    profiles = _ffa(data)[:-1]
+    periods = p + np.arange(nrows_ffa - 1) / (nrows_ffa - 1)
+
+    # All profiles have the same total counts
+    mean = np.sum(data) / p
+    stats = np.sum((profiles - mean) ** 2, axis=1) / mean
+    return periods, stats
+
+
+def ffa_search(times, dt, period_min, period_max, gti=None):
+    """Search long periods in photon data with the Fast Folding Algorithm.
+
+    The events are binned once in a light curve. For each integer number of
+    bins ``p`` between ``period_min / dt`` and ``period_max / dt``, the light
+    curve is cut in rows of ``p`` bins, and the Fast Folding Algorithm
+    (Staelin 1969) calculates with shifts and sums the folded profiles for all
+    the periods between ``p`` and ``p + 1`` bins that drift by a whole number
+    of bins over the observation. The epoch folding statistics of each
+    profile is then calculated as in `epoch_folding_search`. Each base period
+    costs ``O(N log N)`` operations, where ``N`` is the number of bins, with
+    no further dependence on the number of photons.
+
+    Parameters
+    ----------
+    times : array-like
+        the event arrival times
+    dt : float
+        the bin time of the light curve, and the phase resolution of the
+        folded profiles
+    period_min, period_max : float
+        the range of trial periods
+
+    Other Parameters
+    ----------------
+    gti : [[gti0_0, gti0_1], [gti1_0, gti1_1], ...]
+        Good Time Intervals. The light curve spans all of them, with the
+        bins outside the GTIs set to zero
+
+    Returns
+    -------
+    frequencies : array of floats
+        the trial frequencies, in increasing order
+    stats : array of floats
+        the epoch folding statistics at each trial frequency. The number of
+        bins of the profiles, and hence the number of degrees of freedom of
+        the statistics, is ``int(1 / (frequency * dt))``
+
+    Examples
+    --------
+    >>> times = np.sort(np.random.RandomState(0).uniform(0, 1000, 10000))
+    >>> freq, stats = ffa_search(times, 0.1, 2, 4)
+    >>> np.all(np.diff(freq) > 0)
+    True
+    >>> np.all((freq >= 1 / 4) & (freq <= 1 / 2))
+    True
+    """
+    from ..lightcurve import Lightcurve
+    from ..gti import create_gti_mask
+    if gti is None:
+        lc = Lightcurve.make_lightcurve(times, dt)
+        counts = lc.counts
+    else:
+        # Bin on a regular grid across the gaps, so that the phases of the
+        # bins after each gap are preserved, and empty the bad bins.
+        gti = np.asarray(gti)
+        lc = Lightcurve.make_lightcurve(times, dt, tstart=gti[0, 0],
+                                        tseg=gti[-1, 1] - gti[0, 0])
+        counts = lc.counts.copy()
+        counts[~create_gti_mask(lc.time, gti, dt=dt / 2)] = 0
+
+    p_min = int(np.floor(period_min / dt))
+    p_max = min(int(np.floor(period_max / dt)), len(counts) // 2)
+    if p_min < 2:
+        raise ValueError("The minimum period must be at least two bins")
+    if p_max < p_min:
+        raise ValueError("The minimum period must be shorter than half of "
+                         "the observation")
+
+    all_periods = []
+    all_stats = []
+    for p in range(p_min, p_max + 1):
+        periods, stats = _ffa_base_period_stats(counts, p)
+        all_periods.append(periods)
+        all_stats.append(stats)
+
+    periods = np.concatenate(all_periods) * dt
+    stats = np.concatenate(all_stats)
+    good = (periods >= period_min) & (periods <= period_max)
+
+    return 1 / periods[good][::-1], stats[good][::-1]
 
 
 def search_best_peaks(x, stat, threshold):
@@ -212,6 +906,57 @@ def search_best_peaks(x, stat, threshold):
     return best_x[order], best_stat[order]
 
 
+def search_best_peaks_2d(x, y, stat, threshold):
+    """Search peaks above threshold in a 2-D periodogram.
+
+    As `search_best_peaks`, for searches on 2-D grids (e.g. frequency and
+    frequency derivative). Each connected region of the grid where the
+    statistics is above threshold gives a single peak, at its maximum.
+
+    Parameters
+    ----------
+    x, y : 2-D array-like
+        The grids of the two search parameters (e.g. frequencies and fdots)
+    stat : 2-D array-like
+        The statistics. It must have the same shape as x and y
+    threshold : float
+        The threshold value over which we look for peaks in the stat array
+
+    Returns
+    -------
+    best_x, best_y : array-like
+        the coordinates of the peaks above threshold, sorted by inverse value
+        of stat. Empty lists if no peaks are above threshold.
+    best_stat : array-like
+        for each peak, the corresponding stat value.
+
+    Examples
+    --------
+    >>> x, y = np.meshgrid(np.arange(5), np.arange(3))
+    >>> stat = [[0, 2, 1, 0, 0], [0, 1, 0, 0, 3], [0, 0, 0, 0, 2]]
+    >>> best_x, best_y, best_stat = search_best_peaks_2d(x, y, stat, 1)
+    >>> np.all(best_x == [4, 1]), np.all(best_y == [1, 0])
+    (True, True)
+    >>> np.all(best_stat == [3, 2])
+    True
+    """
+    from scipy import ndimage
+
+    stat = np.asarray(stat)
+    x = np.asarray(x)
+    y = np.asarray(y)
+    regions, nregions = ndimage.label(stat >= threshold)
+    if nregions == 0:
+        return [], [], []
+    positions = ndimage.maximum_position(stat, regions,
+                                         np.arange(1, nregions + 1))
+    positions = tuple(np.array(positions).T)
+    best_stat = stat[positions]
+    order = np.argsort(best_stat)[::-1]
+
+    return x[positions][order], y[positions][order], best_stat[order]
+
+
 def plot_profile(phase, profile, err=None, ax=None):
     """Plot a pulse profile showing some stats.
 
@@ -128,6 +128,74 @@ class TestAll(object):
         ph = pulse_phase(times, 0, 0, 1, ph0=0, to_1=False)
         np.testing.assert_array_almost_equal(ph, 1/6 * times ** 3)
 
+    def test_pulse_phase_horner(self):
+        """Horner's scheme gives the same phases as the explicit sum."""
+        times = np.arange(0, 1000, 0.37)
+        fs = [1.23, 1e-3, -2e-7, 3e-10]
+        ph = pulse_phase(times, *fs, ph0=0.1, to_1=False)
+        expected = 0.1 + sum(f * times ** (i + 1) / np.math.factorial(i + 1)
+                             for i, f in enumerate(fs))
+        np.testing.assert_allclose(ph, expected, rtol=1e-12)
+
+    def test_pulse_phase_shape(self):
+        """N-d arrays (e.g. GTIs) and scalars keep their shape."""
+        gtis = np.array([[0, 0.25], [1.5, 1.75]])
+        for double_double in [False, True]:
+            ph = pulse_phase(gtis, 2, 0.1, double_double=double_double)
+            assert ph.shape == gtis.shape
+            np.testing.assert_array_almost_equal(
+                ph, (2 * gtis + 0.05 * gtis ** 2) % 1)
+            ph = pulse_phase(1.5, 2, double_double=double_double,
+                             to_1=False)
+            assert np.shape(ph) == ()
+            np.testing.assert_almost_equal(ph, 3)
+
+    def test_pulse_phase_double_double(self):
+        """Double-double phases are exact to much better than a microcycle.
+        """
+        from fractions import Fraction
+        rng = np.random.RandomState(1234)
+        times = np.sort(rng.uniform(0, 3e8, 100)).astype(np.longdouble)
+        times += rng.uniform(0, 1e-7, 100).astype(np.longdouble)
+        fs = [np.longdouble(500.123456789), -1.23e-11, 3.45e-22]
+        ph = pulse_phase(times, *fs, double_double=True)
+        assert ph.dtype == np.double
+
+        def exact(x):
+            high = np.double(x)
+            return Fraction(high) + Fraction(np.double(x - high))
+
+        for t, p in zip(times, ph):
+            t = exact(t)
+            phase = sum(exact(np.longdouble(f) / np.math.factorial(i + 1)) *
+                        t ** (i + 1) for i, f in enumerate(fs))
+            phase -= phase.numerator // phase.denominator
+            assert abs(float(phase) - p) < 1e-9 or \
+                abs(abs(float(phase) - p) - 1) < 1e-9
+
+    def test_pulse_phase_double_double_absolute(self):
+        times = np.arange(0, 1e6, 1.1, dtype=np.longdouble)
+        ph = pulse_phase(times, 1.1, 2e-9, ph0=0.5, to_1=False,
+                         double_double=True)
+        ph_ld = pulse_phase(times, 1.1, 2e-9, ph0=0.5, to_1=False,
+                            double_double=False)
+        assert ph.dtype == np.longdouble
+        assert np.all(np.abs(ph - ph_ld) < 1e-8)
+
+    def test_pulse_phase_double_double_numpy(self):
+        """The numba kernel and the numpy fallback give the same results."""
+        from stingray.pulse.pulsar import _horner_dd, _horner_dd_fast
+        rng = np.random.RandomState(1234)
+        t_high = rng.uniform(0, 1e8, 1000)
+        t_low = rng.uniform(-1e-9, 1e-9, 1000)
+        c_high = np.array([312.3, 1e-11, -4e-20])
+        c_low = np.array([1e-15, 1e-28, 0])
+        high, low = _horner_dd_fast(t_high, t_low, c_high, c_low,
+                                    np.zeros(1000), np.zeros(1000))
+        high_np, low_np = _horner_dd(t_high, t_low, c_high, c_low)
+        np.testing.assert_array_equal(high, high_np)
+        assert np.all(np.abs(low - low_np) <= 1e-16 * np.abs(high))
+
     def test_phase_exposure1(self):
         start_time = 0
         stop_time = 1
@@ -167,6 +235,54 @@ class TestAll(object):
         expected = np.ones(nbin)
         np.testing.assert_array_almost_equal(expo, expected)
 
+    def test_phase_exposure_many_gtis(self):
+        start_time = 0
+        stop_time = 10
+        gtis = np.array([[0, 0.25], [1.5, 1.75], [2, 4.5], [9.25, 11]])
+        period = 1
+        nbin = 4
+        expo = phase_exposure(start_time, stop_time, period, nbin, gtis=gtis)
+        # Two full cycles from the third GTI; the fractional parts cover
+        # bins 0, 1 and 2 twice, bin 3 once (the last GTI is cut at 10)
+        expected = np.array([4, 4, 4, 3]) / 4
+        np.testing.assert_array_almost_equal(expo, expected)
+
+    def test_phase_exposure_negative_times(self):
+        start_time = -1
+        stop_time = 1
+        gtis = np.array([[-0.75, -0.5]])
+        period = 1
+        nbin = 4
+        expo = phase_exposure(start_time, stop_time, period, nbin, gtis=gtis)
+        expected = np.array([0, 1, 0, 0])
+        np.testing.assert_array_almost_equal(expo, expected)
+
+    def test_phase_exposure_many_periods(self):
+        start_time = 0
+        stop_time = 100
+        gtis = np.array([[0, 13.3], [20.1, 41], [55.5, 98.7]])
+        periods = np.array([0.7, 1.3, 3.14, 27.1])
+        nbin = 16
+        expo = phase_exposure(start_time, stop_time, periods, nbin, gtis=gtis)
+        assert expo.shape == (len(periods), nbin)
+        for p, e in zip(periods, expo):
+            np.testing.assert_array_almost_equal(
+                e, phase_exposure(start_time, stop_time, p, nbin, gtis=gtis))
+
+    def test_phase_exposure_period_longer_than_segment(self):
+        expo = phase_exposure(0, 1, 10, nbin=4)
+        np.testing.assert_array_almost_equal(expo, [1, 0, 0, 0])
+        expo = phase_exposure(0, 1, np.array([1, 10]), nbin=4,
+                              gtis=np.array([[2, 3]]))
+        np.testing.assert_array_equal(expo, np.zeros((2, 4)))
+
+    def test_pulse_profile_period_longer_than_segment(self):
+        times = np.array([0.1, 0.2, 0.3])
+        ph, p, pe = fold_events(times, 0.1, nbin=4, expocorr=True,
+                                gtis=np.array([[0, 1.]]))
+        assert np.all(np.isfinite(p)) and np.all(np.isfinite(pe))
+        np.testing.assert_array_almost_equal(p, [3, 0, 0, 0])
+
     def test_pulse_profile1(self):
         nbin = 16
         times = np.arange(0, 1, 1/nbin)
@@ -1,9 +1,15 @@
 from __future__ import division, print_function
 from stingray.pulse.search import epoch_folding_search, z_n_search
+from stingray.pulse.search import ffa_search, _ffa, search_best_peaks
+from stingray.pulse.search import search_best_peaks_2d, semicoherent_z_n_search
 from stingray.pulse.search import _profile_fast, phaseogram, plot_phaseogram
-from stingray.pulse.search import plot_profile
-from stingray.pulse.pulsar import fold_events
+from stingray.pulse.search import plot_profile, _number_of_jobs
+from stingray.pulse.search import _folding_search, _frequency_step
+from stingray.pulse.search import _z_n_events_segment_fast
+from stingray.pulse.search import _fold_profile_fast, _stat_fast, _z_n_fast
+from stingray.pulse.pulsar import fold_events, stat, z_n
 import numpy as np
+import pytest
 from stingray import Lightcurve
 from stingray.events import EventList
 
@@ -103,6 +109,43 @@ class TestAll(object):
         prof = _profile_fast(test_phase, nbin=16)
         assert np.all(prof == np.ones(16))
 
+    def test_fold_profile_fast(self):
+        times = np.arange(0, 2, 1/16) + 1/32
+        profile = np.ones(8) * 5
+        _fold_profile_fast(times, 1, profile)
+        assert np.all(profile == np.ones(8) * 4)
+
+    def test_stat_fast(self):
+        rng = np.random.RandomState(1)
+        profile = rng.poisson(100, 32).astype(float)
+        assert np.isclose(_stat_fast(profile), stat(profile))
+
+    def test_z_n_fast(self):
+        rng = np.random.RandomState(2)
+        profile = rng.poisson(100, 32).astype(float)
+        phase = np.arange(0, 1, 1 / 32)
+        harmonic_phases = np.arange(1, 4)[:, np.newaxis] * phase * 2 * np.pi
+        assert np.isclose(
+            _z_n_fast(profile, np.cos(harmonic_phases),
+                      np.sin(harmonic_phases)),
+            z_n(phase, n=3, norm=profile))
+
+    def test_fused_search_matches_profile_statistics(self):
+        frequencies = np.arange(9.85, 9.95, 0.1/self.tseg)
+        phase = np.arange(0, 1, 1 / 16)
+        _, ef_stat = epoch_folding_search(self.event_times, frequencies,
+                                          nbin=16)
+        _, ef_expected = _folding_search(
+            lambda x: stat(_profile_fast(x, nbin=16)), self.event_times,
+            frequencies)
+        assert np.allclose(ef_stat, ef_expected)
+        _, z_stat = z_n_search(self.event_times, frequencies, nbin=16,
+                               nharm=2)
+        _, z_expected = _folding_search(
+            lambda x: z_n(phase, n=2, norm=_profile_fast(x, nbin=16)),
+            self.event_times, frequencies)
+        assert np.allclose(z_stat, z_expected)
+
     def test_epoch_folding_search(self):
         """Test pulse phase calculation, frequency only."""
         frequencies = np.arange(9.85, 9.95, 0.1/self.tseg)
@@ -123,6 +166,86 @@ class TestAll(object):
         maxstatbin = freq[np.argmax(stat)]
         assert maxstatbin == frequencies[minbin]
 
+    def test_epoch_folding_search_parallel(self):
+        frequencies = np.arange(9.85, 9.95, 0.1/self.tseg)
+        _, stat = epoch_folding_search(self.event_times, frequencies,
+                                       nbin=16, segment_size=2)
+        freq, stat_par = epoch_folding_search(self.event_times, frequencies,
+                                              nbin=16, segment_size=2,
+                                              n_jobs=3)
+        assert np.all(freq == frequencies)
+        assert np.all(stat_par == stat)
+
+    def test_epoch_folding_search_expocorr_parallel(self):
+        frequencies = np.arange(9.89, 9.91, 0.1/self.tseg)
+        _, stat = epoch_folding_search(self.event_times, frequencies,
+                                       nbin=16, expocorr=True)
+        _, stat_par = epoch_folding_search(self.event_times, frequencies,
+                                           nbin=16, expocorr=True, n_jobs=-1)
+        assert np.all(stat_par == stat)
+
+    def test_z_n_search_exact(self):
+        frequencies = np.arange(9.85, 9.95, 0.3/self.tseg)
+        freq, stat = z_n_search(self.event_times, frequencies, nharm=3,
+                                exact=True)
+        _, expected = _folding_search(lambda x: z_n(x, n=3),
+                                      self.event_times, frequencies)
+        assert np.allclose(stat, expected, rtol=1e-10)
+        minbin = np.argmin(np.abs(frequencies - self.pulse_frequency))
+        assert freq[np.argmax(stat)] == frequencies[minbin]
+
+    def test_z_n_search_exact_irregular_frequencies(self):
+        frequencies = np.sort(np.random.RandomState(3).uniform(9.85, 9.95, 30))
+        _, stat = z_n_search(self.event_times, frequencies, nharm=2,
+                             exact=True)
+        _, expected = _folding_search(lambda x: z_n(x, n=2),
+                                      self.event_times, frequencies)
+        assert np.allclose(stat, expected, rtol=1e-10)
+
+    def test_z_n_search_exact_many_frequencies(self):
+        # More trials than a block of the frequency grid
+        frequencies = np.linspace(9.5, 10.5, 5000)
+        times = self.event_times[:200]
+        _, stat = z_n_search(times, frequencies, nharm=2, exact=True)
+        _, expected = _folding_search(
+            lambda ts, freqs, stats, offsets: _z_n_events_segment_fast(
+                ts, freqs, 2, stats, offsets),
+            times, frequencies, fused=True)
+        assert np.allclose(stat, expected, rtol=1e-10)
+
+    def test_z_n_search_exact_expocorr_raises(self):
+        with pytest.raises(ValueError):
+            z_n_search(self.event_times, [1, 2], exact=True, expocorr=True)
+
+    def test_frequency_step(self):
+        assert np.isclose(_frequency_step(np.linspace(1, 2, 11)), 0.1)
+        assert _frequency_step(np.array([1.])) is None
+        assert _frequency_step(np.array([1., 1.])) is None
+        assert _frequency_step(np.array([1, 1.1, 1.3])) is None
+
+    def test_z_n_search_parallel(self):
+        frequencies = np.arange(9.85, 9.95, 0.3/self.tseg)
+        _, stat = z_n_search(self.event_times, frequencies, nbin=16,
+                             nharm=2)
+        _, stat_par = z_n_search(self.event_times, frequencies, nbin=16,
+                                 nharm=2, n_jobs=2)
+        assert np.all(stat_par == stat)
+
+    def test_number_of_jobs(self):
+        import multiprocessing
+        assert _number_of_jobs(4, 2) == 2
+        assert _number_of_jobs(0, 10) == 1
+        assert _number_of_jobs(-1, 10000) == multiprocessing.cpu_count()
+
+    def test_n_jobs_benchmark(self):
+        from ..benchmark_search import benchmark
+        for search in ["ef", "zn"]:
+            results = benchmark(nevents=1000, ntrials=10, n_jobs=[1, 2],
+                                search=search, nbin=8, repeat=1)
+            assert [r[0] for r in results] == [1, 2]
+        with pytest.raises(ValueError):
+            benchmark(nevents=1000, ntrials=10, search="ffa")
+
     def test_z_n_search(self):
         """Test pulse phase calculation, frequency only."""
         frequencies = np.arange(9.85, 9.95, 0.3/self.tseg)
@@ -142,3 +265,194 @@ class TestAll(object):
         minbin = np.argmin(np.abs(frequencies - self.pulse_frequency))
         maxstatbin = freq[np.argmax(stat)]
         assert maxstatbin == frequencies[minbin]
+
+
+def _ffa_recursive(data):
+    nrows = len(data)
+    if nrows == 1:
+        return data.copy()
+    first = _ffa_recursive(data[:nrows // 2])
+    second = _ffa_recursive(data[nrows // 2:])
+    return np.array([first[s // 2] + np.roll(second[s // 2], -(s - s // 2))
+                     for s in range(nrows)])
+
+
+class TestFFA(object):
+    @classmethod
+    def setup_class(cls):
+        rng = np.random.RandomState(5)
+        cls.period = 7.3
+        cls.tseg = 5000
+        background = rng.uniform(0, cls.tseg, 10000)
+        npulsed = 3000
+        pulsed = (rng.randint(0, int(cls.tseg / cls.period), npulsed) +
+                  rng.vonmises(0, 4, npulsed) / (2 * np.pi)) * cls.period
+        cls.event_times = np.sort(np.concatenate([background, pulsed]))
+
+    def test_ffa_matches_recursive_definition(self):
+        rng = np.random.RandomState(6)
+        for nrows in [1, 2, 4, 16]:
+            data = rng.poisson(3, (nrows, 7)).astype(float)
+            assert np.allclose(_ffa(data), _ffa_recursive(data))
+
+    def test_ffa_no_drift_is_simple_folding(self):
+        data = np.arange(32.).reshape((4, 8))
+        assert np.allclose(_ffa(data)[0], np.sum(data, axis=0))
+
+    def test_ffa_search(self):
+        freq, stat = ffa_search(self.event_times, 0.1, 5, 10)
+        assert freq.shape == stat.shape
+        assert np.all(np.diff(freq) > 0)
+        assert np.all((freq >= 1 / 10) & (freq <= 1 / 5))
+        assert np.isclose(1 / freq[np.argmax(stat)], self.period, atol=0.01)
+        best_freq, _ = search_best_peaks(freq, stat, np.max(stat) / 2)
+        assert np.isclose(1 / best_freq[0], self.period, atol=0.01)
+
+    def test_ffa_search_gapped_gti(self):
+        gti = np.array([[0, 2000], [2201, self.tseg]])
+        freq, stat = ffa_search(self.event_times, 0.1, 5, 10)
+        freq_gap, stat_gap = ffa_search(self.event_times, 0.1, 5, 10,
+                                        gti=gti)
+        best = freq[np.argmax(stat)]
+        best_gap = freq_gap[np.argmax(stat_gap)]
+        assert np.isclose(best_gap, best, atol=0.5 / self.tseg)
+        # The pulses after the gap add up in phase with the others
+        assert np.max(stat_gap) > 0.9 * np.max(stat)
+
+    def test_ffa_search_invalid_periods(self):
+        with pytest.raises(ValueError):
+            ffa_search(self.event_times, 1, 1, 10)
+        with pytest.raises(ValueError):
+            ffa_search(self.event_times, 1, 3000, 4000)
+
+
+class TestFdotSearch(object):
+    @classmethod
+    def setup_class(cls):
+        rng = np.random.RandomState(7)
+        cls.f = 2.1
+        cls.fdot = 3e-6
+        cls.tseg = 2000
+        times = np.sort(rng.uniform(0, cls.tseg, 40000))
+        phase = cls.f * times + 0.5 * cls.fdot * times ** 2
+        keep = rng.uniform(0, 1, len(times)) < \
+            (1 + np.cos(2 * np.pi * phase)) / 2
+        cls.event_times = times[keep]
+        # The search grid is referred to the first event
+        t0 = cls.event_times[0]
+        cls.f_ref = cls.f + cls.fdot * t0
+        cls.frequencies = np.linspace(cls.f_ref - 0.001, cls.f_ref + 0.001, 21)
+        cls.fdots = np.linspace(-6e-6, 12e-6, 19)
+
+    def _check_peak(self, fgrid, fdgrid, stats):
+        assert fgrid.shape == fdgrid.shape == stats.shape == \
+            (len(self.fdots), len(self.frequencies))
+        best_f, best_fdot, _ = \
+            search_best_peaks_2d(fgrid, fdgrid, stats, np.max(stats) / 2)
+        assert np.isclose(best_f[0], self.f_ref, atol=1e-4)
+        assert np.isclose(best_fdot[0], self.fdot, atol=1.1e-6)
+
+    def test_epoch_folding_fdot_search(self):
+        fgrid, fdgrid, stats = \
+            epoch_folding_search(self.event_times, self.frequencies,
+                                 nbin=16, fdots=self.fdots)
+        self._check_peak(fgrid, fdgrid, stats)
+        _, stats_1d = epoch_folding_search(self.event_times,
+                                           self.frequencies, nbin=16)
+        assert np.allclose(stats[self.fdots == 0][0], stats_1d)
+
+    def test_fdot_search_fused_matches_python_folding(self):
+        _, _, stats = epoch_folding_search(self.event_times,
+                                           self.frequencies[:5], nbin=16,
+                                           fdots=self.fdots[::6])
+        _, expected = _folding_search(
+            lambda x: stat(_profile_fast(x, nbin=16)), self.event_times,
+            self.frequencies[:5], fdots=self.fdots[::6])
+        assert np.allclose(stats, expected)
+
+    def test_z_n_fdot_search(self):
+        fgrid, fdgrid, stats = \
+            z_n_search(self.event_times, self.frequencies, nbin=16, nharm=1,
+                       fdots=self.fdots)
+        self._check_peak(fgrid, fdgrid, stats)
+
+    def test_z_n_exact_fdot_search(self):
+        fgrid, fdgrid, stats = \
+            z_n_search(self.event_times, self.frequencies, nharm=2,
+                       exact=True, fdots=self.fdots)
+        self._check_peak(fgrid, fdgrid, stats)
+        _, expected = _folding_search(
+            lambda x: z_n(x, n=2), self.event_times, self.frequencies,
+            fdots=self.fdots[::6])
+        assert np.allclose(stats[::6], expected, rtol=1e-10)
+
+    def test_fdot_search_parallel(self):
+        _, _, stats = epoch_folding_search(self.event_times,
+                                           self.frequencies, nbin=16,
+                                           fdots=self.fdots)
+        _, _, stats_par = epoch_folding_search(self.event_times,
+                                               self.frequencies, nbin=16,
+                                               fdots=self.fdots, n_jobs=3)
+        assert np.all(stats_par == stats)
+
+    def test_fdot_search_expocorr_raises(self):
+        with pytest.raises(ValueError):
+            epoch_folding_search(self.event_times, self.frequencies,
+                                 fdots=self.fdots, expocorr=True)
+        with pytest.raises(ValueError):
+            z_n_search(self.event_times, self.frequencies,
+                       fdots=self.fdots, expocorr=True)
+
+    def test_search_best_peaks_2d_no_peaks(self):
+        x, y = np.meshgrid(np.arange(3), np.arange(2))
+        best_x, best_y, best_stat = \
+            search_best_peaks_2d(x, y, np.zeros((2, 3)), 1)
+        assert best_x == best_y == best_stat == []
+
+
+class TestSemicoherentSearch(object):
+    @classmethod
+    def setup_class(cls):
+        rng = np.random.RandomState(8)
+        cls.f = 2.1
+        cls.fdot = 3e-8
+        cls.tseg = 20000
+        times = np.sort(rng.uniform(0, cls.tseg, 20000))
+        phase = cls.f * times + 0.5 * cls.fdot * times ** 2
+        keep = rng.uniform(0, 1, len(times)) < \
+            0.8 + 0.2 * np.cos(2 * np.pi * phase)
+        cls.event_times = times[keep]
+        t0 = cls.event_times[0]
+        cls.f_ref = cls.f + cls.fdot * t0
+        cls.segment_size = 2000
+
+    def test_coherent_on_coarse_grid(self):
+        # With no fdot and frequencies on the coarse grid of the segments,
+        # the stacking is exact
+        df = 1 / (4 * self.segment_size)
+        frequencies = self.f_ref + np.arange(-5, 5) * df
+        freq, stats = semicoherent_z_n_search(self.event_times, frequencies,
+                                              nharm=2,
+                                              segment_size=self.segment_size)
+        assert np.all(freq == frequencies)
+        times = self.event_times - self.event_times[0]
+        expected = [z_n(times * f % 1, n=2) for f in frequencies]
+        assert np.allclose(stats, expected, rtol=1e-8)
+
+    def test_semicoherent_fdot_search(self):
+        frequencies = np.linspace(self.f_ref - 2e-4, self.f_ref + 2e-4, 81)
+        fdots = np.linspace(0, 6e-8, 31)
+        fgrid, fdgrid, stats = \
+            semicoherent_z_n_search(self.event_times, frequencies, fdots,
+                                    nharm=2, segment_size=self.segment_size)
+        assert fgrid.shape == fdgrid.shape == stats.shape == (31, 81)
+        best_f, best_fdot, best_stat = \
+            search_best_peaks_2d(fgrid, fdgrid, stats, np.max(stats) / 2)
+        assert np.isclose(best_f[0], self.f_ref, atol=1e-5)
+        assert np.isclose(best_fdot[0], self.fdot, atol=2e-9)
+
+        # Most of the coherent power is recovered
+        _, _, coherent = z_n_search(self.event_times, [best_f[0]], nharm=2,
+                                    exact=True, fdots=[best_fdot[0]],
+                                    segment_size=2 * self.tseg)
+        assert best_stat[0] > 0.8 * coherent[0, 0]
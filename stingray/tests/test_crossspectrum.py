@@ -141,6 +141,41 @@ class TestCrossspectrum(object):
         # For now, just verify that it doesn't crash
         _ = self.cs.rebin_log(f=0.01)
 
+    def test_rebin_log_bins(self):
+        cs = Crossspectrum()
+        cs.freq = np.arange(1, 101) * 0.1
+        cs.df = 0.1
+        cs.power = np.arange(1, 101, dtype=float)
+        cs.power_err = np.ones(100)
+        binfreq, binpower, binpower_err, nsamples = cs.rebin_log(f=1)
+
+        # Edges at 1, 2, 6, 14, 30, 62, 126 times df
+        assert np.allclose(binfreq, np.array([1.5, 4, 10, 22, 46, 94]) * 0.1)
+        assert np.all(nsamples == [1, 4, 8, 16, 32, 39])
+        assert np.allclose(binpower, [1, 3.5, 9.5, 21.5, 45.5, 81])
+        assert np.allclose(binpower_err, 1 / np.sqrt(nsamples))
+
+    def test_rebin_log_plan_is_reused(self):
+        from ..crossspectrum import _get_log_rebin_plan
+        plan = _get_log_rebin_plan(self.cs.freq, self.cs.df, 0.01)
+        assert _get_log_rebin_plan(self.cs.freq.copy(), self.cs.df,
+                                   0.01) is plan
+        assert _get_log_rebin_plan(self.cs.freq, self.cs.df, 0.02) \
+            is not plan
+        binfreq, _, _, nsamples = self.cs.rebin_log(f=0.01)
+        assert np.allclose(binfreq, plan.binfreq)
+        assert np.sum(nsamples) == len(self.cs.freq)
+
+    def test_rebin_log_output_does_not_alter_plan(self):
+        binfreq, binpower, _, nsamples = self.cs.rebin_log(f=0.01)
+        binfreq *= 2
+        nsamples[:] = 0
+        new_binfreq, new_binpower, _, new_nsamples = \
+            self.cs.rebin_log(f=0.01)
+        assert np.allclose(new_binfreq * 2, binfreq)
+        assert np.sum(new_nsamples) == len(self.cs.freq)
+        assert np.allclose(new_binpower, binpower, equal_nan=True)
+
     def test_norm_leahy(self):
         cs = Crossspectrum(self.lc1, self.lc2, norm='leahy')
         assert len(cs.power) == 4999
@@ -306,7 +341,9 @@ class TestAveragedCrossspectrum(object):
             assert len(coh[0]) == 4999
             assert len(coh[1]) == 4999
 
-            assert len(w) == 3
+            # Only the warning on the number of segments: the power spectra
+            # of the two light curves are not recomputed
+            assert len(w) == 1
             assert issubclass(w[-1].category, UserWarning)
 
     def test_failure_when_normalization_not_recognized(self):
@@ -315,6 +352,87 @@ class TestAveragedCrossspectrum(object):
                                             segment_size=1,
                                             norm="wrong")
 
+    @pytest.mark.parametrize('norm', ['none', 'leahy', 'frac', 'abs'])
+    def test_batched_same_as_save_all(self, norm):
+        time = np.arange(0.0005, 1, 0.001)
+        lc1 = Lightcurve(time, np.random.poisson(10, time.size))
+        lc2 = Lightcurve(time, np.random.poisson(10, time.size))
+        cs = AveragedCrossspectrum(lc1, lc2, segment_size=0.1, norm=norm)
+        cs_all = AveragedCrossspectrum(lc1, lc2, segment_size=0.1, norm=norm,
+                                       save_all=True)
+        assert not hasattr(cs, 'cs_all')
+        assert len(cs_all.cs_all) == cs_all.m
+        assert cs.m == cs_all.m
+        assert cs.n == cs_all.n
+        assert np.isclose(cs.df, cs_all.df)
+        assert np.isclose(cs.nphots1, cs_all.nphots1)
+        assert np.isclose(cs.nphots2, cs_all.nphots2)
+        assert np.allclose(cs.freq, cs_all.freq)
+        assert np.allclose(cs.power, cs_all.power)
+        assert np.allclose(cs.power_err, cs_all.power_err)
+        assert np.allclose(cs.unnorm_power, cs_all.unnorm_power)
+
+    @pytest.mark.parametrize('norm', ['none', 'leahy', 'frac', 'abs'])
+    def test_segment_powers(self, norm, tmpdir):
+        rng = np.random.RandomState(3)
+        time = np.arange(0.0005, 1, 0.001)
+        lc1 = Lightcurve(time, rng.poisson(10, time.size))
+        lc2 = Lightcurve(time, rng.poisson(10, time.size))
+        cs = AveragedCrossspectrum(lc1, lc2, segment_size=0.1, norm=norm)
+        cs_all = AveragedCrossspectrum(lc1, lc2, segment_size=0.1, norm=norm,
+                                       save_all=True)
+        powers = cs.segment_powers()
+        assert powers.shape == (cs.m, len(cs.freq))
+        assert np.allclose(powers, [c.power for c in cs_all.cs_all])
+        assert np.allclose(np.mean(powers, axis=0), cs.power)
+
+        filename = str(tmpdir.join('segment_powers.npy'))
+        cs.segment_powers(filename=filename)
+        assert np.allclose(np.load(filename, mmap_mode='r'), powers)
+
+    def test_segment_spectra(self):
+        rng = np.random.RandomState(4)
+        time = np.arange(0.0005, 1, 0.001)
+        lc1 = Lightcurve(time, rng.poisson(10, time.size))
+        lc2 = Lightcurve(time, rng.poisson(10, time.size))
+        cs = AveragedCrossspectrum([lc1, lc1], [lc2, lc2], segment_size=0.1)
+        cs_all = AveragedCrossspectrum([lc1, lc1], [lc2, lc2],
+                                       segment_size=0.1, save_all=True)
+        spectra = list(cs.segment_spectra())
+        assert len(spectra) == cs.m
+        for spec, spec_all in zip(spectra, cs_all.segment_spectra()):
+            assert np.allclose(spec.power, spec_all.power)
+
+    def test_coherence_same_as_save_all(self):
+        rng = np.random.RandomState(5)
+        time = np.arange(0.0005, 10, 0.001)
+        common = rng.poisson(10, time.size)
+        lc1 = Lightcurve(time, common + rng.poisson(10, time.size))
+        lc2 = Lightcurve(time, common + rng.poisson(10, time.size))
+        cs = AveragedCrossspectrum(lc1, lc2, segment_size=0.1)
+        cs_all = AveragedCrossspectrum(lc1, lc2, segment_size=0.1,
+                                       save_all=True)
+        assert not hasattr(cs_all, 'unnorm_power1')
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            coh, coh_err = cs.coherence()
+            coh_all, coh_err_all = cs_all.coherence()
+            lag, lag_err = cs.time_lag()
+            lag_all, lag_err_all = cs_all.time_lag()
+
+        assert np.allclose(cs.unnorm_power1, cs_all.unnorm_power1)
+        assert np.allclose(cs.unnorm_power2, cs_all.unnorm_power2)
+        assert np.allclose(coh, coh_all)
+        assert np.allclose(coh_err, coh_err_all)
+        assert np.allclose(lag, lag_all)
+        assert np.allclose(lag_err, lag_err_all)
+
+    def test_segment_powers_without_light_curves(self):
+        cs = AveragedCrossspectrum()
+        with pytest.raises(ValueError):
+            cs.segment_powers()
+
     def test_timelag(self):
         from ..simulator.simulator import Simulator
         dt = 0.1
@@ -7,9 +7,11 @@ import os
 
 from ..utils import contiguous_regions
 from ..gti import cross_gtis, append_gtis, load_gtis, get_btis, join_gtis
+from ..gti import cross_two_gtis, GTI, GTIScreening
 from ..gti import check_separate, create_gti_mask, check_gtis
 from ..gti import create_gti_from_condition, gti_len, gti_border_bins
 from ..gti import time_intervals_from_gtis, bin_intervals_from_gtis
+from ..exceptions import StingrayError
 
 curdir = os.path.abspath(os.path.dirname(__file__))
 datadir = os.path.join(curdir, 'data')
@@ -42,6 +44,38 @@ class TestGTI(object):
 
         assert np.all(newgti == gti1), \
             'GTIs do not coincide!'
+
+    def test_crossgti_many_lists(self):
+        """Intersection of more than two GTI lists at once."""
+        gti1 = np.array([[1, 4], [5, 10]])
+        gti2 = np.array([[2, 6], [7, 12]])
+        gti3 = np.array([[0, 3.5], [5.5, 8]])
+        newgti = cross_gtis([gti1, gti2, gti3])
+
+        assert np.all(newgti == [[2, 3.5], [5.5, 6], [7, 8]]), \
+            'GTIs do not coincide!'
+
+    def test_crossgti_touching(self):
+        """Touching GTIs do not produce zero-length intervals."""
+        newgti = cross_two_gtis([[0, 2]], [[2, 3]])
+        assert newgti.shape == (0, 2)
+
+    def test_crossgti_contiguous(self):
+        """Contiguous GTIs in one list are kept separate."""
+        newgti = cross_two_gtis([[0, 2], [2, 3]], [[1, 2.5]])
+        assert np.all(newgti == [[1, 2], [2, 2.5]])
+
+    def test_crossgti_same_as_pairwise(self):
+        rs = np.random.RandomState(12)
+        gtis = [np.sort(rs.uniform(0, 1000, 2 * n)).reshape(-1, 2)
+                for n in [100, 40, 70]]
+        newgti = cross_gtis(gtis)
+        expected = cross_two_gtis(cross_two_gtis(gtis[0], gtis[1]), gtis[2])
+        assert np.all(newgti == expected)
+        for g in gtis:
+            for start, stop in newgti:
+                assert np.any((g[:, 0] <= start) & (g[:, 1] >= stop))
+
     def test_bti(self):
         """Test the inversion of GTIs."""
         gti = np.array([[1, 2], [4, 5], [7, 10], [11, 11.2], [12.2, 13.2]])
@@ -58,6 +92,24 @@ class TestGTI(object):
         # bin at times 0, 2, 4 and 5 are not in.
         assert np.all(mask == np.array([0, 1, 0, 0, 0, 0, 0], dtype=bool))
 
+    def test_gti_mask_safe_interval_min_length(self):
+        arr = np.arange(20) + 0.5
+        gti = np.array([[0, 3], [5, 15], [16, 20]])
+        mask, new_gtis = create_gti_mask(arr, gti, return_new_gtis=True,
+                                         safe_interval=[1, 2], min_length=1)
+        assert np.all(new_gtis == [[6, 13], [17, 18]])
+        assert np.all(arr[mask] == [6.5, 7.5, 8.5, 9.5, 10.5, 11.5, 12.5,
+                                    17.5])
+
+    def test_gti_mask_unsorted_times(self):
+        rs = np.random.RandomState(5)
+        arr = np.arange(100) + 0.5
+        gti = np.array([[3, 20], [30.4, 60], [62, 90]])
+        mask = create_gti_mask(arr, gti)
+        order = rs.permutation(100)
+        mask_unsorted = create_gti_mask(arr[order], gti, dt=0.5)
+        assert np.all(mask_unsorted == mask[order])
+
     def test_gti_from_condition1(self):
         t = np.array([0, 1, 2, 3, 4, 5, 6])
         condition = np.array([1, 1, 0, 0, 1, 0, 0], dtype=bool)
@@ -70,6 +122,34 @@ class TestGTI(object):
         gti = create_gti_from_condition(t, condition, safe_interval=1)
         assert np.all(gti == np.array([[0.5, 2.5]]))
 
+    def test_gti_from_condition_min_length(self):
+        t = np.arange(10)
+        condition = np.array([1, 1, 0, 1, 1, 1, 0, 1, 1, 1], dtype=bool)
+        gti = create_gti_from_condition(t, condition, safe_interval=0.5,
+                                        min_length=1.5)
+        assert np.all(gti == np.array([[3, 5], [7, 9]]))
+
+    def test_gti_from_many_conditions(self):
+        t = np.arange(7)
+        cond1 = np.array([1, 1, 0, 0, 1, 1, 1], dtype=bool)
+        cond2 = np.array([0, 1, 1, 0, 1, 1, 0], dtype=bool)
+        gti = create_gti_from_condition(t, {"cond1": cond1, "cond2": cond2})
+        assert np.all(gti == np.array([[0.5, 1.5], [3.5, 5.5]]))
+        gti = create_gti_from_condition(t, [cond1, cond2], combine="or")
+        assert np.all(gti == np.array([[-0.5, 2.5], [3.5, 6.5]]))
+
+    def test_gti_from_many_conditions_wrong_length(self):
+        t = np.arange(7)
+        with pytest.raises(StingrayError):
+            create_gti_from_condition(t, {"a": t > 2, "b": t[:-1] > 2})
+        with pytest.raises(ValueError):
+            create_gti_from_condition(t, [t > 2, t > 3], combine="xor")
+
+    def test_gti_from_condition_none_good(self):
+        t = np.arange(7)
+        gti = create_gti_from_condition(t, t > 10)
+        assert gti.shape == (0, 2)
+
     def test_load_gtis(self):
         """Test event file reading."""
         fname = os.path.join(datadir, 'monol_testA.evt')
@@ -120,6 +200,51 @@ class TestGTI(object):
                                                          [10, 11], [12, 13]]))
 
 
+    def test_join_many_gtis(self):
+        gti0 = [[0, 1], [2, 3], [4, 8]]
+        gti1 = [[7, 8], [10, 11], [12, 13]]
+        gti2 = [[2.5, 5], [9, 10], [14, 15]]
+        assert np.all(join_gtis(gti0, gti1, gti2) ==
+                      [[0, 1], [2, 8], [9, 11], [12, 13], [14, 15]])
+
+    def test_join_gtis_touching(self):
+        gti0 = [[0, 1], [2, 3]]
+        gti1 = [[1, 2], [4, 5]]
+        expected = [[0, 3], [4, 5]]
+        assert np.all(join_gtis(gti0, gti1) == expected)
+        assert np.all(GTI(gti0).union(gti1) == expected)
+
+    def test_join_gtis_same_as_pairwise(self):
+        rs = np.random.RandomState(3)
+        gtis = [np.sort(rs.uniform(0, 100, 20)).reshape(-1, 2)
+                for i in range(5)]
+        joined = gtis[0]
+        for gti in gtis[1:]:
+            joined = join_gtis(joined, gti)
+        assert np.all(join_gtis(*gtis) == joined)
+
+    def test_append_many_gtis(self):
+        gti0 = [[6, 7], [8, 9]]
+        gti1 = [[1, 2], [4, 5]]
+        gti2 = [[10, 11]]
+        assert np.all(append_gtis(gti0, gti1, gti2) ==
+                      [[1, 2], [4, 5], [6, 7], [8, 9], [10, 11]])
+
+    def test_append_many_overlapping_gtis(self):
+        with pytest.raises(ValueError):
+            append_gtis([[1, 2]], [[4, 5]], [[1.5, 3]])
+
+    def test_append_empty_gtis(self):
+        assert np.all(append_gtis([[1, 2]], []) == [[1, 2]])
+
+    def test_bti_with_borders(self):
+        gti = np.array([[1, 2], [4, 5]])
+        bti = get_btis(gti, start_time=0, stop_time=10)
+        assert np.all(bti == [[0, 1], [2, 4], [5, 10]])
+
+    def test_bti_single_gti(self):
+        assert get_btis([[1, 2]]).shape == (0, 2)
+
     def test_time_intervals_from_gtis(self):
         """Test the division of start and end times to calculate spectra."""
         start_times, stop_times = \
@@ -137,6 +262,30 @@ class TestGTI(object):
         assert np.all(start_bins == np.array([0, 2, 6]))
         assert np.all(stop_bins == np.array([2, 4, 8]))
 
+    def test_bin_intervals_from_gtis_many_gtis(self):
+        times = np.arange(0.5, 10000)
+        gti_starts = np.arange(0, 10000, 100)
+        gtis = np.array([gti_starts + 1.5, gti_starts + 90]).T
+        start_bins, stop_bins = \
+            bin_intervals_from_gtis(gtis, 20, times, dt=1)
+
+        expected = (gti_starts[:, np.newaxis] + [2, 22, 42, 62]).flatten()
+        assert np.all(start_bins == expected)
+        assert np.all(stop_bins == expected + 20)
+
+    def test_bin_intervals_from_gtis_chunk_shorter_than_bin(self):
+        with pytest.raises(ValueError):
+            bin_intervals_from_gtis([[0, 5]], 0.5, np.arange(0.5, 5))
+
+    def test_time_intervals_from_gtis_many_gtis(self):
+        gti_starts = np.arange(0, 10000, 100)
+        gtis = np.array([gti_starts, gti_starts + 90]).T
+        start_times, stop_times = time_intervals_from_gtis(gtis, 20)
+
+        expected = (gti_starts[:, np.newaxis] + [0, 20, 40, 60]).flatten()
+        assert np.all(start_times == expected)
+        assert np.all(stop_times == expected + 20)
+
     def test_gti_border_bins(self):
         times = np.arange(0.5, 2.5)
 
@@ -173,3 +322,192 @@ class TestGTI(object):
 
         with pytest.raises(ValueError):
             check_gtis([[1, 0]])
+
+
+class TestGTIClass(object):
+
+    def setup_class(self):
+        self.gti = GTI([[0, 2], [4, 6], [6, 7], [10, 12]])
+
+    def test_invalid_gti(self):
+        with pytest.raises(ValueError):
+            GTI([[0, 2], [1, 3]])
+
+    def test_gti_is_read_only(self):
+        with pytest.raises(ValueError):
+            self.gti[0, 0] = 1
+
+    def test_gti_accepted_as_array(self):
+        assert np.all(cross_gtis([self.gti, [[1, 5]]]) == [[1, 2], [4, 5]])
+        assert np.all(get_btis(self.gti) == [[2, 4], [6, 6], [7, 10]])
+        shifted = self.gti + 1
+        assert not isinstance(shifted, GTI)
+        assert np.all(shifted[0] == [1, 3])
+        assert not isinstance(self.gti[:, 0], GTI)
+
+    def test_gti_copies_are_read_only(self):
+        import copy
+        gti = GTI([[0, 2], [3, 5]])
+        gti.exposure
+        for c in [gti.copy(), copy.copy(gti), copy.deepcopy(gti)]:
+            assert isinstance(c, GTI)
+            assert c is not gti
+            assert np.all(c == gti)
+            with pytest.raises(ValueError):
+                c[1, 1] = 100
+            assert c._cache == {}
+        c = np.copy(gti)
+        assert not isinstance(c, GTI) or not c.flags.writeable
+
+    def test_gti_reshaped_are_plain_arrays(self):
+        gti = GTI([[0, 2], [3, 5]])
+        flat = np.sort(gti, axis=None)
+        assert not isinstance(flat, GTI)
+        assert np.all(flat == [0, 2, 3, 5])
+        for arr in [gti.ravel(), gti.flatten(), gti.reshape(4), gti.T,
+                    gti.astype(float), gti.repeat(2), gti.take([0, 1])]:
+            assert not isinstance(arr, GTI)
+        sorted_gti = np.sort(gti)
+        assert np.all(sorted_gti == gti)
+
+    def test_gti_same_object(self):
+        assert GTI(self.gti) is self.gti
+
+    def test_exposure_and_btis(self):
+        assert self.gti.exposure == 7
+        assert np.all(self.gti.btis == [[2, 4], [6, 6], [7, 10]])
+        assert isinstance(self.gti.btis, GTI)
+
+    def test_contains(self):
+        assert np.all(self.gti.contains([-1, 0, 1, 3, 6, 6.5, 12, 13]) ==
+                      [False, True, True, False, True, True, True, False])
+        assert self.gti.contains(1)
+        assert not GTI([]).contains(1)
+
+    def test_covers(self):
+        assert np.all(self.gti.covers([0, 1, 4, 5], [2, 3, 6, 6.5]) ==
+                      [True, False, True, False])
+
+    def test_set_operations(self):
+        other = [[1, 5], [6.5, 11]]
+        assert np.all(self.gti.intersection(other) ==
+                      [[1, 2], [4, 5], [6.5, 7], [10, 11]])
+        assert np.all(self.gti.union(other) == [[0, 12]])
+        assert np.all(self.gti.difference(other) ==
+                      [[0, 1], [5, 6], [6, 6.5], [11, 12]])
+        assert np.all(self.gti.intersection(other, [[0, 4.5]]) ==
+                      [[1, 2], [4, 4.5]])
+
+    def test_border_bins_are_cached(self):
+        gti = GTI([[0, 10], [20, 40]])
+        times = np.arange(0.5, 50)
+        times.flags.writeable = False
+        start_bins, stop_bins = gti_border_bins(gti, times)
+        assert np.all(start_bins == [0, 20])
+        assert np.all(stop_bins == [10, 40])
+        cached = [c for c in gti._cache.values()]
+        assert len(cached) == 1
+        gti_border_bins(gti, times)
+        assert [c for c in gti._cache.values()] == cached
+        assert np.all(bin_intervals_from_gtis(gti, 10, times)[0] ==
+                      [0, 20, 30])
+
+    def test_border_bins_of_writeable_times_not_cached(self):
+        gti = GTI([[10, 20], [30, 40]])
+        times = np.arange(50.) + 0.5
+        start_bins, stop_bins = gti.border_bins(times, dt=1)
+        assert np.all(start_bins == [10, 30])
+        assert np.all(stop_bins == [20, 40])
+        times += 5
+        start_bins, stop_bins = gti.border_bins(times, dt=1)
+        assert np.all(start_bins == [5, 25])
+        assert np.all(stop_bins == [15, 35])
+        start_bins, stop_bins = gti_border_bins(gti, times, dt=1)
+        assert np.all(start_bins == [5, 25])
+
+    def test_lightcurve_with_gti_object(self):
+        from ..lightcurve import Lightcurve
+        gti = GTI([[0.5, 2.5], [2.5, 4.5]])
+        lc = Lightcurve([1, 2, 3, 4], [2, 2, 2, 2], gti=gti)
+        assert lc.gti is gti
+        lc0, lc1 = lc.split_by_gti()
+        assert np.all(lc1.time == [3, 4])
+
+
+class TestGTIScreening(object):
+
+    @classmethod
+    def setup_class(self):
+        self.fname = os.path.join(datadir, 'monol_testA.evt')
+
+    def test_screen_intervals(self):
+        times = np.arange(0.5, 100)
+        screening = GTIScreening(intervals=[[[5, 30], [50, 120]],
+                                            [[0, 60], [70, 80]]])
+        gtis, mask = screening.screen(times, [[0, 90]])
+        assert isinstance(gtis, GTI)
+        assert np.all(gtis == [[5, 30], [50, 60], [70, 80]])
+        assert np.all(mask == gtis.contains(times))
+
+    def test_screen_rate_filter(self):
+        times = np.concatenate([np.arange(0, 100, 0.1),
+                                np.arange(40, 50, 0.01)])
+        times.sort()
+        screening = GTIScreening(rate_bin=5, max_rate=50, min_length=10)
+        gtis, mask = screening.screen(times, [[0, 100]])
+        assert np.allclose(gtis, [[0, 40], [50, 100]])
+        assert not np.any(mask[(times > 40) & (times < 50)])
+
+    def test_screen_rate_filter_partial_bins(self):
+        # The bin around the GTI border has half the exposure, but the same
+        # rate
+        times = np.arange(0, 100, 0.1)
+        screening = GTIScreening(rate_bin=5, min_rate=9)
+        gtis, _ = screening.screen(times, [[0, 47.5], [60, 100]])
+        assert np.allclose(gtis, [[0, 47.5], [60, 100]])
+
+    def test_screen_nothing_good(self):
+        times = np.arange(0.5, 100)
+        screening = GTIScreening(rate_bin=10, min_rate=100)
+        gtis, mask = screening.screen(times, [[0, 100]])
+        assert gtis.shape == (0, 2)
+        assert not np.any(mask)
+
+    def test_recipe_hash(self):
+        interval = np.array([[0, 1]], dtype=np.longdouble)
+        screening = GTIScreening(intervals=[interval], safe_interval=1)
+        same = GTIScreening(intervals=[interval.copy()], safe_interval=1)
+        other = GTIScreening(intervals=[[[0, 2]]], safe_interval=1)
+        assert screening.recipe_hash() == same.recipe_hash()
+        assert screening.recipe_hash() != other.recipe_hash()
+
+    def test_screen_file(self):
+        from ..io import load_events_and_gtis
+        data = load_events_and_gtis(self.fname)
+        screening = GTIScreening(intervals=[[[80000100, 80000500]]],
+                                 safe_interval=10)
+        gtis, mask = screening.screen_file(self.fname)
+        expected_gtis, expected_mask = screening.screen(data.ev_list,
+                                                        data.gti_list)
+        assert np.all(gtis == expected_gtis)
+        assert np.all(mask == expected_mask)
+
+    def test_screen_file_cached(self, tmpdir):
+        cache_dir = str(tmpdir.join('cache'))
+        screening = GTIScreening(intervals=[[[80000100, 80000500]]],
+                                 safe_interval=10, cache_dir=cache_dir)
+        gtis, mask = screening.screen_file(self.fname)
+        cache_file = screening.cache_file(self.fname)
+        assert os.path.exists(cache_file)
+        assert os.listdir(cache_dir) == [os.path.basename(cache_file)]
+
+        cached_gtis, cached_mask = screening.screen_file(self.fname)
+        assert isinstance(cached_gtis, GTI)
+        assert cached_gtis.dtype == gtis.dtype
+        assert np.all(cached_gtis == gtis)
+        assert np.all(cached_mask == mask)
+
+        other = GTIScreening(intervals=[[[80000100, 80000400]]],
+                             safe_interval=10, cache_dir=cache_dir)
+        other.screen_file(self.fname)
+        assert len(os.listdir(cache_dir)) == 2
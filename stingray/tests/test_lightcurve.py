@@ -96,6 +96,56 @@ class TestLightcurve(object):
         assert np.allclose(lc.bin_lo, bin_lo)
         assert np.allclose(lc.bin_hi, bin_hi)
 
+    def test_errors_are_computed_lazily(self):
+        from astropy.stats import poisson_conf_interval
+        counts = np.array([0, 1, 2, 2, 10, 1])
+        lc = Lightcurve(np.arange(6) + 0.5, counts)
+        assert 'counts_err' not in vars(lc)
+        assert 'countrate' not in vars(lc)
+
+        err_low, err_high = poisson_conf_interval(
+            counts, interval='frequentist-confidence', sigma=1)
+        err = (err_high - err_low) / 2
+        assert np.allclose(lc.counts_err, err)
+        assert np.allclose(lc.countrate_err, err / lc.dt)
+        assert 'counts_err' in vars(lc)
+
+    def test_poisson_errors_from_table(self):
+        from astropy.stats import poisson_conf_interval
+        from ..lightcurve import _poisson_symmetrical_errors
+        counts = np.arange(2000)
+        err_low, err_high = poisson_conf_interval(
+            counts, interval='frequentist-confidence', sigma=1)
+        err = _poisson_symmetrical_errors(counts)
+        assert np.allclose(err, (err_high - err_low) / 2, rtol=1e-7)
+        assert np.allclose(_poisson_symmetrical_errors(counts * 1.),  err)
+
+    def test_poisson_errors_large_counts(self):
+        from ..lightcurve import _poisson_symmetrical_errors
+        err = _poisson_symmetrical_errors(np.array([10, 10 ** 6]))
+        assert np.allclose(err, [3.6878, 1000.5], rtol=1e-4)
+
+    def test_poisson_errors_non_integer_counts(self):
+        from astropy.stats import poisson_conf_interval
+        from ..lightcurve import _poisson_symmetrical_errors
+        counts = np.array([0.5, 2.5, 2.5, 3])
+        err_low, err_high = poisson_conf_interval(
+            counts, interval='frequentist-confidence', sigma=1)
+        err = _poisson_symmetrical_errors(counts)
+        assert np.allclose(err, (err_high - err_low) / 2)
+
+    def test_lazy_attributes_can_be_set(self):
+        lc = Lightcurve(self.times, self.counts)
+        lc.counts_err = np.ones(4)
+        assert np.all(lc.counts_err == 1)
+        assert np.all(lc.countrate_err == 1 / lc.dt)
+
+    def test_split_does_not_compute_errors(self):
+        lc = Lightcurve(self.times, self.counts, gti=[[0.5, 2.5], [2.5, 4.5]])
+        lcs = lc.split_by_gti()
+        assert 'counts_err' not in vars(lc)
+        assert np.allclose(lcs[1].counts_err, lc.counts_err[2:])
+
     def test_lightcurve_from_toa(self):
         lc = Lightcurve.make_lightcurve(self.times, self.dt)
 
@@ -575,6 +625,33 @@ class TestLightcurve(object):
         assert np.all(lc0.gti == [[0.5, 4.5]])
         assert np.all(lc1.gti == [[5.5, 7.5]])
 
+    def test_split_lc_by_gtis_shares_memory(self):
+        times = [1, 2, 3, 4, 5, 6, 7, 8]
+        counts = [1, 1, 1, 1, 2, 3, 3, 2]
+        gti = [[0.5, 4.5], [5.5, 7.5]]
+
+        lc = Lightcurve(times, counts, gti=gti, mjdref=55000,
+                        err_dist="gauss")
+        lc.countrate
+        lc0, lc1 = lc.split_by_gti()
+        assert np.may_share_memory(lc1.time, lc.time)
+        assert np.may_share_memory(lc1.counts, lc.counts)
+        assert np.may_share_memory(lc1.countrate, lc.countrate)
+        assert np.all(lc1.countrate == [3, 3])
+        assert lc1.n == 2
+        assert lc1.tseg == 2
+        assert lc1.mjdref == 55000
+        assert lc1.err_dist == "gauss"
+        assert np.all(lc1.counts_err == 0)
+
+    def test_truncate_shares_memory(self):
+        lc = Lightcurve(self.times, self.counts, gti=self.gti)
+        lc1 = lc.truncate(start=1, stop=3)
+        assert np.may_share_memory(lc1.counts, lc.counts)
+        assert np.allclose(lc1.counts_err, lc.counts_err[1:3])
+        assert lc1.meancounts == 2
+        assert lc1.tstart == 1.5
+
     def test_shift(self):
         times = [1, 2, 3, 4, 5, 6, 7, 8]
         counts = [1, 1, 1, 1, 2, 3, 3, 2]
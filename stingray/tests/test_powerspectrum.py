@@ -4,6 +4,7 @@ import numpy as np
 from astropy.tests.helper import pytest
 
 from stingray import Lightcurve
+from stingray.events import EventList
 from stingray import Powerspectrum, AveragedPowerspectrum
 from stingray.powerspectrum import classical_pvalue
 
@@ -297,6 +298,80 @@ class TestAveragedPowerspectrum(object):
         assert np.isclose(ps.segment_size, segment_size)
         assert ps.m == 2
 
+    @pytest.mark.parametrize('norm', ['leahy', 'frac', 'abs', 'none'])
+    def test_batched_same_as_save_all(self, norm):
+        ps = AveragedPowerspectrum(self.lc, 1, norm=norm)
+        ps_all = AveragedPowerspectrum(self.lc, 1, norm=norm, save_all=True)
+        assert not hasattr(ps, 'cs_all')
+        assert len(ps_all.cs_all) == ps_all.m
+        assert ps.m == ps_all.m
+        assert np.isclose(ps.nphots, ps_all.nphots)
+        assert np.allclose(ps.freq, ps_all.freq)
+        assert np.allclose(ps.power, ps_all.power)
+        assert np.allclose(ps.power_err, ps_all.power_err)
+
+    def test_segment_powers(self, tmpdir):
+        ps = AveragedPowerspectrum(self.lc, 1, norm="leahy")
+        ps_all = AveragedPowerspectrum(self.lc, 1, norm="leahy",
+                                       save_all=True)
+        powers = ps.segment_powers(filename=str(tmpdir.join('powers.npy')))
+        assert powers.shape == (ps.m, len(ps.freq))
+        assert np.allclose(powers, [p.power for p in ps_all.cs_all])
+
+        spectra = list(ps.segment_spectra())
+        assert len(spectra) == ps.m
+        assert isinstance(spectra[0], Powerspectrum)
+        assert np.allclose(spectra[0].power, ps_all.cs_all[0].power)
+
+    @pytest.mark.parametrize('norm', ['leahy', 'frac', 'none'])
+    def test_from_events_same_as_lightcurve(self, norm):
+        times = np.sort(np.random.RandomState(1).uniform(0, 100, 10000))
+        gti = [[0, 30.3], [31.7, 100]]
+        ev = EventList(times, gti=gti)
+        ps = AveragedPowerspectrum(ev.to_lc(0.01), 2, norm=norm)
+
+        chunks = (times[i:i + 777] for i in range(0, len(times), 777))
+        for events in [ev, times, chunks]:
+            ps_ev = AveragedPowerspectrum.from_events(events, 0.01, 2,
+                                                      norm=norm, gti=gti,
+                                                      chunk_size=1000)
+            assert ps_ev.m == ps.m
+            assert np.isclose(ps_ev.nphots, ps.nphots)
+            assert np.allclose(ps_ev.freq, ps.freq)
+            assert np.allclose(ps_ev.power, ps.power)
+            assert np.allclose(ps_ev.power_err, ps.power_err)
+
+    def test_from_events_segment_rounding(self):
+        times = np.sort(np.random.RandomState(1).uniform(0, 100, 10000))
+        gti = [[0, 30.3], [31.7, 100]]
+        ev = EventList(times, gti=gti)
+        ps_ev = AveragedPowerspectrum.from_events(ev, 0.1, 1, norm="leahy")
+        # Always int(segment_size / dt) bins per segment
+        assert np.isclose(ps_ev.df, 1)
+        assert ps_ev.m == 30 + 68
+        # The light curve path gets the same segments if the segment length
+        # does not round down to fewer bins
+        ps = AveragedPowerspectrum(ev.to_lc(0.1), 1.0001, norm="leahy")
+        assert ps_ev.m == ps.m
+        assert np.allclose(ps_ev.freq, ps.freq)
+        assert np.allclose(ps_ev.power, ps.power)
+
+    def test_from_events_iterable_needs_gti(self):
+        chunks = [np.arange(0, 5, 0.1), np.arange(5, 10, 0.1)]
+        with pytest.raises(ValueError):
+            AveragedPowerspectrum.from_events(iter(chunks), 0.1, 1)
+
+    def test_from_events_segment_longer_than_gtis(self):
+        times = np.arange(0, 10, 0.1)
+        with pytest.raises(ValueError):
+            AveragedPowerspectrum.from_events(times, 0.1, 20)
+
+    def test_from_events_segment_shorter_than_dt(self):
+        times = np.arange(0, 10, 0.1)
+        with pytest.raises(ValueError) as excinfo:
+            AveragedPowerspectrum.from_events(times, 0.1, 0.05)
+        assert "longer than the bin time" in str(excinfo.value)
+
     def test_init_without_segment(self):
         with pytest.raises(TypeError):
             assert AveragedPowerspectrum(self.lc)
@@ -511,3 +586,38 @@ class TestClassicalSignificances(object):
         nspec = 1
         pval = classical_pvalue(power, nspec)
         assert np.isclose(pval, 0.0)
+
+    def test_zero_power_has_unit_probability(self):
+        assert np.isclose(classical_pvalue(0.0, 3), 1.0)
+
+    def test_pvalue_is_chi2_survival_function(self):
+        from scipy.stats import chi2
+        power = np.array([0.5, 2.0, 5.0, 10.0])
+        for nspec in [1, 4, 50]:
+            assert np.allclose(classical_pvalue(power, nspec),
+                               chi2.sf(power * nspec, 2 * nspec))
+
+    def test_array_same_as_scalars(self):
+        power = np.array([1.0, 3.0, 8.0, 25.0])
+        pvals = classical_pvalue(power, 10)
+        assert isinstance(classical_pvalue(power[0], 10), float)
+        assert pvals.shape == power.shape
+        assert np.allclose(pvals, [classical_pvalue(p, 10) for p in power])
+
+    def test_array_with_invalid_power_fails(self):
+        with pytest.raises(ValueError):
+            classical_pvalue(np.array([2.0, -1.0]), 1)
+
+    def test_log_pvalue_in_far_tail(self):
+        # For nspec=1, the p-value is exp(-power / 2)
+        power = np.array([2.0, 1000.0, 31000.0])
+        log_pval = classical_pvalue(power, 1, return_log=True)
+        assert np.allclose(log_pval, -power / 2)
+
+    def test_log_pvalue_continuous_in_far_tail(self):
+        # Across the switch to the asymptotic sum, around pval ~ 1e-300
+        power = np.linspace(5, 30, 200)
+        log_pval = classical_pvalue(power, 100, return_log=True)
+        assert np.all(np.isfinite(log_pval))
+        assert np.all(np.diff(log_pval) < 0)
+        assert np.all(np.abs(np.diff(log_pval, 2)) < 1)
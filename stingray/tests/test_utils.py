@@ -58,6 +58,22 @@ class TestRebinData(object):
         ybin_test = np.zeros_like(xbin) + self.counts*dx_new/self.dx
         assert np.allclose(ybin_test, ybin)
 
+    def test_uneven_binned_errors(self):
+        dx_new = 1.5
+        xbin, ybin, yerr, step_size = utils.rebin_data(self.x, self.y, dx_new,
+                                                       self.yerr)
+        yerr_test = np.zeros_like(xbin) + np.sqrt(self.counts*dx_new/self.dx)
+        assert np.allclose(yerr_test, yerr)
+
+    def test_uneven_binned_counts_random(self):
+        y = np.random.poisson(10, 100)
+        x = np.arange(100) + 0.5
+        xbin, ybin, _, _ = utils.rebin_data(x, y, 2.5)
+        # Each pair of new bins covers exactly five old bins
+        assert np.allclose(ybin[::2] + ybin[1::2],
+                           np.sum(y[:len(ybin) // 2 * 5].reshape(-1, 5),
+                                  axis=1))
+
     def test_rebin_data_should_raise_error_when_method_is_different_than_allowed(self):
         dx_new = 2.0
         with pytest.raises(ValueError):
@@ -103,6 +119,15 @@ class TestUtils(object):
         assert np.all(cont == np.array([[1, 3], [4, 7]])), \
             'Contiguous region wrong'
 
+    def test_contiguous_min_length(self):
+        array = np.array([1, 0, 1, 1, 0, 1, 1, 1], dtype=bool)
+        cont = utils.contiguous_regions(array, min_length=2)
+        assert np.all(cont == np.array([[2, 4], [5, 8]]))
+
+    def test_contiguous_empty(self):
+        cont = utils.contiguous_regions(np.array([], dtype=bool))
+        assert cont.shape == (0, 2)
+
     def test_get_random_state(self):
         # Life, Universe and Everything
         lue = 42
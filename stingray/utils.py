@@ -47,6 +47,30 @@ def simon(message, **kwargs):
     warnings.warn("SIMON says: {0}".format(message), **kwargs)
 
 
+def _sum_fractional_bins(values, start_bin, end_bin, prev_frac, next_frac):
+    """Sum values over many intervals, with fractional first and last bins.
+
+    Each interval is made of the fraction ``prev_frac`` of bin
+    ``start_bin``, all the bins between ``start_bin`` and ``end_bin``, and
+    the fraction ``next_frac`` of bin ``end_bin`` (``end_bin`` can be equal
+    to ``len(values)``, in which case ``next_frac`` is ignored).
+    """
+    # Pad with a zero, so that end_bin == len(values) is a valid index
+    values = np.append(values, 0)
+
+    # reduceat sums between consecutive indices: the even elements are the
+    # sums of the full bins inside each interval, and the odd ones are the
+    # (unused) sums between intervals
+    indices = np.column_stack([start_bin + 1, end_bin]).ravel()
+    full_bins = np.add.reduceat(values, indices)[::2]
+
+    # With no full bins, reduceat returns the value at the index instead
+    full_bins[end_bin <= start_bin + 1] = 0
+
+    return prev_frac * values[start_bin] + full_bins + \
+        next_frac * values[end_bin]
+
+
 def rebin_data(x, y, dx_new, yerr=None, method='sum'):
 
     """Rebin some data to an arbitrary new data resolution. Either sum
@@ -97,32 +121,20 @@ def rebin_data(x, y, dx_new, yerr=None, method='sum'):
 
     step_size = dx_new / dx_old
 
-    output = []
-    outputerr = []
-    for i in np.arange(0, y.shape[0], step_size):
-        total = 0
-        totalerr = 0
-
-        int_i = int(i)
-        prev_frac = int_i + 1 - i
-        prev_bin = int_i
-        total += prev_frac * y[prev_bin]
-        totalerr += prev_frac * (yerr[prev_bin]**2)
-
-        if i + step_size < len(x):
-            # Fractional part of next bin:
-            next_frac = i + step_size - int(i + step_size)
-            next_bin = int(i + step_size)
-            total += next_frac * y[next_bin]
-            totalerr += next_frac * (yerr[next_bin]**2)
-
-        total += sum(y[int(i+1):int(i+step_size)])
-        totalerr += sum(yerr[int(i+1):int(step_size)]**2)
-        output.append(total)
-        outputerr.append(np.sqrt(totalerr))
-
-    output = np.asarray(output)
-    outputerr = np.asarray(outputerr)
+    # Edges of the new bins, in units of old bins. The first and last old
+    # bin of each new bin only contribute with the fraction inside it.
+    n = y.shape[0]
+    start = np.arange(0, n, step_size)
+    end = start + step_size
+    start_bin = start.astype(int)
+    end_bin = np.minimum(end, n).astype(int)
+    prev_frac = start_bin + 1 - start
+    next_frac = np.where(end < n, end - end_bin, 0)
+
+    output = _sum_fractional_bins(y, start_bin, end_bin, prev_frac,
+                                  next_frac)
+    outputerr = np.sqrt(_sum_fractional_bins(yerr ** 2, start_bin, end_bin,
+                                             prev_frac, next_frac))
 
     if method in ['mean', 'avg', 'average', 'arithmetic mean']:
         ybin = output / np.float(step_size)
@@ -194,7 +206,7 @@ def optimal_bin_time(fftlen, tbin):
     return fftlen / (2 ** np.ceil(np.log2(fftlen / tbin)))
 
 
-def contiguous_regions(condition):
+def contiguous_regions(condition, min_length=0):
     """Find contiguous True regions of the boolean array "condition".
 
     Return a 2D array where the first column is the start index of the region
@@ -204,6 +216,11 @@ def contiguous_regions(condition):
     ----------
     condition : boolean array
 
+    Other parameters
+    ----------------
+    min_length : int, default 0
+        Only return the regions containing at least this number of elements
+
     Returns
     -------
     idx : [[i0_0, i0_1], [i1_0, i1_1], ...]
@@ -217,6 +234,9 @@ def contiguous_regions(condition):
     """
 
     # NOQA
+    condition = np.asarray(condition, dtype=bool)
+    if condition.size == 0:
+        return np.zeros((0, 2), dtype=np.intp)
     # Find the indices of changes in "condition"
     diff = np.logical_xor(condition[1:], condition[:-1])
     idx, = diff.nonzero()
@@ -231,6 +251,8 @@ def contiguous_regions(condition):
         idx = np.r_[idx, condition.size]
     # Reshape the result into two columns
     idx.shape = (-1, 2)
+    if min_length > 0:
+        idx = idx[idx[:, 1] - idx[:, 0] >= min_length]
     return idx
 
 